@@ -14,13 +14,32 @@ options:
   file:
     description:
       - Perform actions on file instead of active CIB.
+      - Use M(community.pacemaker.pacemaker_shadow) to create the file and to push the changes made to it to the cluster at once.
     type: str
     default: null
   request_timeout:
     description:
       - Timeout for each outgoing request to another node in seconds.
+      - Passed to pcs with --request-timeout for the commands that contact other nodes, and used for requests to pcsd.
     type: int
     default: 60
+  task_timeout:
+    description:
+      - The time in seconds all the commands run by the module may take together.
+      - A command still running when the time runs out is killed, and the module fails.
+      - The request timeout of pcs is lowered to the time left.
+      - By default there is no limit.
+    type: int
+    version_added: "1.1.0"
+  retries:
+    description:
+      - The number of times a command is retried after a transient error, such as a busy CIB or a failed connection.
+      - Only the commands that read the cluster state and those that are safe to repeat, such as starting or
+        stopping the cluster, are retried. A command that changes the configuration may have been applied before it failed.
+      - Retries are spaced with exponential backoff and random jitter.
+    type: int
+    default: 0
+    version_added: "1.1.0"
   force:
     description:
       - Run commands with the --force flag.
@@ -32,4 +51,51 @@ options:
       - Run commands with the --debug flag and provide the output.
     type: bool
     default: false
+  profile:
+    description:
+      - Return the commands run and the pcsd requests sent by the module in I(pcs_timings), also when the module fails.
+      - I(pcs_timings) is a dict with the list of C(commands) and the totals C(total_commands), C(total_seconds),
+        C(total_stdout_bytes) and C(cache_hits).
+      - Each command has C(cmd), C(seconds), C(rc), C(stdout_bytes), C(stderr_bytes) and C(attempt), passwords are masked.
+        Each attempt of a retried command is listed.
+      - A pcsd request is listed with its method and URL as C(cmd), the HTTP status as C(rc), null when pcsd could not be reached,
+        and the size of the response as C(stdout_bytes).
+      - Read-only commands answered from the cache of the module run are not listed, they are counted in C(cache_hits).
+    type: bool
+    default: false
+    version_added: "1.1.0"
+  backend:
+    description:
+      - How the CIB is read.
+      - pcs uses the command line tools.
+      - pcsd requests the CIB from the local pcsd over HTTPS with the token in the pcsd tokens file,
+        see I(validate_certs) and I(ca_path) for its certificate.
+        Without I(ca_path) the certificate is verified against /var/lib/pcsd/pcsd.crt, the self signed certificate
+        pcsd created on the node. It is only valid for the host name, not when the tokens file addresses the node by IP.
+      - disk reads the copy of the CIB the CIB manager keeps in /var/lib/pacemaker/cib/cib.xml without running any command,
+        after checking it against its signature and that the CIB manager is running.
+        The copy on disk has no status section.
+      - When pcsd or the copy on disk can't be used the command line tools are used instead.
+        For pcsd the reason, such as a certificate that could not be verified, is returned in the warnings of the result.
+    type: str
+    choices:
+      - "pcs"
+      - "pcsd"
+      - "disk"
+    default: "pcs"
+    version_added: "1.1.0"
+  validate_certs:
+    description:
+      - Verify the certificate of pcsd for the requests made to it directly, such as with I(backend=pcsd).
+      - Only set this to false on trusted networks, the pcsd token is sent with each request.
+    type: bool
+    default: true
+    version_added: "1.1.0"
+  ca_path:
+    description:
+      - The CA certificate, or the certificate itself, to verify the certificate of pcsd against.
+      - pcsd uses a self signed certificate by default, found in /var/lib/pcsd/pcsd.crt on each node.
+        With I(backend=pcsd) that file is used when I(ca_path) is not set.
+    type: path
+    version_added: "1.1.0"
 '''
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Rhys Campbell (@rhysmeister) <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: pacemaker
+
+short_description: Pacemaker cluster nodes inventory source.
+
+description:
+  - Build the inventory from the node list of one or more Pacemaker clusters.
+  - The CIB of each cluster is fetched once, from the first seed host whose pcsd answers, and the nodes
+    and their state are read from it. Nothing needs to be known about the other nodes.
+  - Each cluster gets a group with all of its nodes, and groups for the designated controller,
+    the online, standby and offline nodes and the remote nodes.
+  - Enable the cache to reuse the node list for I(cache_timeout) seconds instead of contacting pcsd on every run.
+  - The configuration file name must end with C(pacemaker.yml) or C(pacemaker.yaml).
+
+author: Rhys Campbell (@rhysmeister)
+version_added: "1.1.0"
+
+extends_documentation_fragment:
+  - constructed
+  - inventory_cache
+
+options:
+  plugin:
+    description: The name of this plugin, it should always be set to C(community.pacemaker.pacemaker).
+    required: true
+    type: str
+    choices: ['community.pacemaker.pacemaker']
+  clusters:
+    description:
+      - The clusters to add to the inventory.
+      - Each cluster is a dict with I(seeds), the hosts to fetch the CIB from in order, and optionally a I(name),
+        I(token) and I(port) overriding the options of the same name.
+      - The name defaults to the cluster-name property of the cluster, then to the first seed.
+    required: true
+    type: list
+    elements: dict
+  token:
+    description:
+      - The pcsd token, from the known-hosts or tokens file of a node, used to fetch the CIB.
+      - Set I(username) and I(password) instead to authenticate to pcsd on each run.
+    type: str
+    env:
+      - name: PACEMAKER_PCSD_TOKEN
+  username:
+    description: The user to authenticate to pcsd with when no I(token) is given.
+    type: str
+    default: hacluster
+  password:
+    description: The password of I(username).
+    type: str
+    env:
+      - name: PACEMAKER_PCSD_PASSWORD
+  port:
+    description: The port pcsd listens on.
+    type: int
+    default: 2224
+  timeout:
+    description: Timeout in seconds for each request to pcsd.
+    type: int
+    default: 10
+  validate_certs:
+    description:
+      - Verify the certificate of pcsd, the token or password is sent to each seed tried.
+      - pcsd uses a self signed certificate by default, see I(ca_path).
+      - Only set this to false on trusted networks.
+    type: bool
+    default: true
+  ca_path:
+    description:
+      - The CA certificate that signed the certificates of pcsd, or a file with the certificates of the seeds.
+      - The self signed certificate of pcsd is /var/lib/pcsd/pcsd.crt on each node.
+    type: path
+  group_prefix:
+    description: Prefix of the groups created for each cluster.
+    type: str
+    default: pacemaker_
+
+notes:
+    - Requires pcsd on the seed hosts.
+'''
+
+EXAMPLES = r'''
+# pacemaker.yml
+plugin: community.pacemaker.pacemaker
+clusters:
+  - seeds:
+      - node1.example.com
+      - node2.example.com
+  - name: db
+    seeds:
+      - db1.example.com
+    port: 2225
+ca_path: /etc/pki/pcsd/seeds.crt
+cache: true
+cache_plugin: ansible.builtin.jsonfile
+cache_connection: /tmp/pacemaker_inventory
+cache_timeout: 300
+
+# Creates, for a cluster named web:
+#   pacemaker_web           all the nodes of the cluster
+#   pacemaker_web_dc        the designated controller
+#   pacemaker_web_online    the nodes that are online
+#   pacemaker_web_standby   the nodes in standby
+#   pacemaker_web_offline   the nodes that are offline
+#   pacemaker_web_remote    the remote and guest nodes
+# Each host gets pacemaker_cluster, pacemaker_node_id, pacemaker_node_type, pacemaker_online,
+# pacemaker_standby, pacemaker_maintenance and pacemaker_dc
+
+# Run a rolling update on the nodes that are not the DC first
+# - hosts: "pacemaker_web_online:!pacemaker_web_dc"
+#   serial: 1
+
+# Add a group per node type with the constructed options
+plugin: community.pacemaker.pacemaker
+clusters:
+  - seeds: [node1]
+keyed_groups:
+  - key: pacemaker_node_type
+    prefix: pacemaker_type
+'''
+
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_native
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    parse_cib,
+    cib_node_states
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    PcsdClient,
+    PcsdError
+)
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+
+    NAME = 'community.pacemaker.pacemaker'
+
+    def verify_file(self, path):
+        """
+        Only accept configuration files named for this plugin
+        """
+        if super(InventoryModule, self).verify_file(path):
+            return path.endswith(('pacemaker.yml', 'pacemaker.yaml'))
+        return False
+
+    def fetch_cib(self, seed, token, port):
+        """
+        Return the CIB xml of the cluster from the pcsd on the seed host.
+        @seed - The host to fetch the CIB from
+        @token - The pcsd token, None to authenticate with the username and password
+        @port - The port pcsd listens on
+        """
+        client = PcsdClient(seed, token, port, self.get_option('timeout'), validate_certs=self.get_option('validate_certs'),
+                            ca_path=self.get_option('ca_path'))
+        if token is None:
+            if self.get_option('password') is None:
+                raise PcsdError("Either token or password is required")
+            client.auth(self.get_option('username'), self.get_option('password'))
+        return client.get_cib()
+
+    def fetch_cluster(self, cluster):
+        """
+        Return the name, seed and node states of a cluster from the first seed that answers.
+        @cluster - An entry of the clusters option
+        """
+        seeds = cluster.get('seeds') or []
+        if len(seeds) == 0:
+            raise AnsibleError("Each cluster needs at least one seed host: {0}".format(cluster))
+        errors = []
+        for seed in seeds:
+            try:
+                xml = self.fetch_cib(seed, cluster.get('token', self.get_option('token')),
+                                     int(cluster.get('port', self.get_option('port'))))
+            except PcsdError as excep:
+                errors.append(to_native(excep))
+                continue
+            cib = parse_cib(xml, sections=["properties", "nodes"])
+            return {
+                "name": cluster.get('name') or cib['properties'].get('cluster-name') or seed,
+                "seed": seed,
+                "nodes": cib_node_states(cib),
+            }
+        raise AnsibleError("Failed to fetch the CIB from any of the seeds {0}: {1}".format(", ".join(seeds), "; ".join(errors)))
+
+    def populate(self, clusters):
+        """
+        Add the nodes of the clusters to the inventory with their groups and variables.
+        @clusters - The list returned by fetch_cluster for each cluster
+        """
+        strict = self.get_option('strict')
+        for cluster in clusters:
+            group = self.inventory.add_group(self._sanitize_group_name(self.get_option('group_prefix') + cluster['name']))
+            subgroups = {}
+            for name in ["dc", "online", "standby", "offline", "remote"]:
+                subgroups[name] = self.inventory.add_group("{0}_{1}".format(group, name))
+                self.inventory.add_child(group, subgroups[name])
+            for name, node in sorted(cluster['nodes'].items()):
+                self.inventory.add_host(name, group=group)
+                hostvars = {
+                    "pacemaker_cluster": cluster['name'],
+                    "pacemaker_node_id": node['id'],
+                    "pacemaker_node_type": node['type'],
+                    "pacemaker_online": node['online'],
+                    "pacemaker_standby": node['standby'],
+                    "pacemaker_maintenance": node['maintenance'],
+                    "pacemaker_dc": node['dc'],
+                }
+                for var, value in hostvars.items():
+                    self.inventory.set_variable(name, var, value)
+                if node['dc']:
+                    self.inventory.add_host(name, group=subgroups['dc'])
+                self.inventory.add_host(name, group=subgroups['online' if node['online'] else 'offline'])
+                if node['standby']:
+                    self.inventory.add_host(name, group=subgroups['standby'])
+                if node['type'] == "remote":
+                    self.inventory.add_host(name, group=subgroups['remote'])
+
+                hostvars = self.inventory.get_host(name).get_vars()
+                self._set_composite_vars(self.get_option('compose'), hostvars, name, strict=strict)
+                self._add_host_to_composed_groups(self.get_option('groups'), hostvars, name, strict=strict)
+                self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, name, strict=strict)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        # cache is false when the inventory is refreshed, e.g. with --flush-cache or meta: refresh_inventory
+        use_cache = self.get_option('cache') and cache
+        update_cache = self.get_option('cache') and not cache
+
+        clusters = None
+        if use_cache:
+            try:
+                clusters = self._cache[cache_key]
+            except KeyError:
+                update_cache = True  # missing or expired
+        if clusters is None:
+            clusters = [self.fetch_cluster(cluster) for cluster in self.get_option('clusters')]
+        if update_cache:
+            self._cache[cache_key] = clusters
+
+        self.populate(clusters)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Rhys Campbell (@rhysmeister) <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: pacemaker_cib
+
+short_description: Query the configuration and state of a Pacemaker cluster.
+
+description:
+  - Answer questions about a Pacemaker cluster, such as where a resource runs, the value of a property
+    or whether a constraint exists, from its CIB.
+  - The CIB is fetched once through the pcsd of I(host) and indexed into the same model as returned by
+    M(community.pacemaker.pacemaker_info). All the lookups in a task, such as in a loop or a template,
+    are answered from that model.
+  - Without I(cache) the model only lives as long as the task, each task fetches the CIB again.
+  - Enable I(cache) to share the model between the tasks of the play for I(cache_timeout) seconds.
+    Each play, and each run of the playbook, fetches the CIB again.
+  - A cached model goes stale when the cluster changes. Changes made by earlier tasks of the play,
+    with the modules of this collection or not, and by anyone else, are not seen unless I(refresh) is set.
+  - The current state is derived from the operation history in the status section of the CIB.
+    As with crm_mon, a resource whose operation failed is reported on that node until it is recovered.
+
+author: Rhys Campbell (@rhysmeister)
+version_added: "1.1.0"
+
+options:
+  _terms:
+    description:
+      - The queries, one result is returned for each of them.
+      - C(location:<id>) returns the nodes a resource, group, clone or fencing device runs on.
+      - C(promoted:<id>) returns the nodes a promotable clone, or the resource in it, is promoted on.
+      - C(property:<name>) returns the value of a cluster property set in the CIB, or I(default).
+      - C(constraint:<id>) returns true if the constraint exists.
+      - C(resource:<id>) returns a resource, fencing device, group or clone, or I(default).
+      - C(node:<name>) returns a node with its online, standby and dc state, or I(default).
+      - C(dc) returns the name of the designated controller.
+    required: true
+    type: list
+    elements: str
+  host:
+    description: The cluster node whose pcsd the CIB is fetched from.
+    required: true
+    type: str
+  token:
+    description:
+      - The pcsd token, from the known-hosts or tokens file of a node, used to fetch the CIB.
+      - Set I(username) and I(password) instead to authenticate to pcsd.
+    type: str
+    env:
+      - name: PACEMAKER_PCSD_TOKEN
+  username:
+    description: The user to authenticate to pcsd with when no I(token) is given.
+    type: str
+    default: hacluster
+  password:
+    description: The password of I(username).
+    type: str
+    env:
+      - name: PACEMAKER_PCSD_PASSWORD
+  port:
+    description: The port pcsd listens on.
+    type: int
+    default: 2224
+  timeout:
+    description: Timeout in seconds for the requests to pcsd.
+    type: int
+    default: 10
+  validate_certs:
+    description:
+      - Verify the certificate of pcsd, the token or password is sent to I(host).
+      - pcsd uses a self signed certificate by default, see I(ca_path).
+      - Only set this to false on trusted networks.
+    type: bool
+    default: true
+  ca_path:
+    description:
+      - The CA certificate that signed the certificates of pcsd, or a file with the certificate of I(host).
+      - The self signed certificate of pcsd is /var/lib/pcsd/pcsd.crt on each node.
+    type: path
+  default:
+    description: Returned for properties, resources and nodes that don't exist.
+    type: raw
+  refresh:
+    description:
+      - Fetch the CIB again instead of using the cached model, e.g. after a task changed the cluster.
+      - The cache is updated with the new model.
+    type: bool
+    default: false
+  cache:
+    description:
+      - Share the model between the tasks of the play through a cache plugin.
+      - The model is cached per play, identified by the ansible-playbook process, the name of the play and its hosts.
+    type: bool
+    default: false
+  cache_plugin:
+    description: The cache plugin to use, it must persist the model outside of the task.
+    type: str
+    default: ansible.builtin.jsonfile
+  cache_connection:
+    description: The cache connection data or path, i.e. the directory of the jsonfile cache plugin.
+    type: str
+    default: ~/.ansible/tmp/pacemaker_cib
+  cache_timeout:
+    description:
+      - The number of seconds the cached model is used for, at most, within the play.
+      - Lower it when the cluster may be changed outside of the play, models of earlier plays expire after it.
+    type: int
+    default: 300
+
+notes:
+    - Requires pcsd on I(host).
+    - The lookups run on the controller.
+    - Each task runs in its own worker process, so without I(cache) the CIB is fetched by every task using the lookup.
+    - A cached model is not invalidated by changes to the cluster, not even when a module of this collection
+      reports changed, set I(refresh) in the first lookup after tasks that change it.
+'''
+
+EXAMPLES = r'''
+- name: Show where httpd runs
+  ansible.builtin.debug:
+    msg: "httpd runs on {{ lookup('community.pacemaker.pacemaker_cib', 'location:httpd', host='node1') | join(', ') }}"
+
+- name: Only run on the node where the database is promoted
+  ansible.builtin.command: /usr/local/bin/backup
+  when: inventory_hostname in lookup('community.pacemaker.pacemaker_cib', 'promoted:db-clone', host='node1')
+
+- name: Several queries with a single fetch of the CIB
+  ansible.builtin.set_fact:
+    stonith_enabled: "{{ cluster[0] }}"
+    has_colocation: "{{ cluster[1] }}"
+    dc: "{{ cluster[2] }}"
+  vars:
+    cluster: "{{ query('community.pacemaker.pacemaker_cib', 'property:stonith-enabled', 'constraint:web-with-ip', 'dc',
+                       host='node1', default='true') }}"
+
+- name: Share the CIB between the tasks of the play
+  ansible.builtin.template:
+    src: haproxy.cfg.j2
+    dest: /etc/haproxy/haproxy.cfg
+  vars:
+    pacemaker: "{{ lookup('community.pacemaker.pacemaker_cib', 'resource:' ~ item, host='node1', cache=true, cache_timeout=600) }}"
+
+- name: Read the CIB again after changing it
+  ansible.builtin.debug:
+    msg: "{{ lookup('community.pacemaker.pacemaker_cib', 'location:httpd', host='node1', refresh=true) }}"
+'''
+
+RETURN = r'''
+_raw:
+  description:
+    - One result per query.
+    - A list of node names for location and promoted, the value for property, a bool for constraint,
+      a dict for resource and node and a node name for dc.
+  type: list
+  elements: raw
+'''
+
+import hashlib
+import multiprocessing
+import os
+
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_native
+from ansible.plugins.loader import cache_loader
+from ansible.plugins.lookup import LookupBase
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    CIB_SECTIONS,
+    parse_cib,
+    cib_status,
+    build_cluster_info
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    PcsdClient,
+    PcsdError
+)
+
+# The model of each cluster, keyed by the play and the pcsd it was fetched from, shared by the lookups of the task
+CIB_MODELS = {}
+
+QUERIES = ["location", "promoted", "property", "constraint", "resource", "node", "dc"]
+
+
+def resource_nodes(info, id, key="nodes"):
+    """
+    Return the nodes a resource, group or clone runs on, or is promoted on.
+    @info - The model returned by build_cluster_info
+    @id - The id of the resource, fencing device, group or clone
+    @key - nodes, or promoted for the nodes it is promoted on
+    """
+    if id in info['clones']:
+        return resource_nodes(info, info['clones'][id]['resource'], key)
+    if id in info['groups']:
+        nodes = []
+        for member in info['groups'][id]['members']:
+            nodes.extend(node for node in resource_nodes(info, member, key) if node not in nodes)
+        return nodes
+    resource = info['resources'].get(id) or info['stonith'].get(id)
+    if resource is None:
+        return []
+    if key == "promoted":
+        return [node for instance in resource['instances'] if instance['role'] in ["Promoted", "Master"]
+                for node in instance['nodes']]
+    return list(resource['nodes'])
+
+
+def query_cib(info, term, default=None):
+    """
+    Return the answer to a single query.
+    @info - The model returned by build_cluster_info
+    @term - The query, see the documentation of the _terms option
+    @default - Returned for properties, resources and nodes that don't exist
+    """
+    kind, sep, name = term.partition(':')
+    if kind not in QUERIES or (kind == "dc") == (sep != ""):
+        raise AnsibleError("Invalid query {0}, expected one of {1}:<name> or dc".format(term, ":<name>, ".join(QUERIES[:-1])))
+    if kind in ["location", "promoted"]:
+        return resource_nodes(info, name, "promoted" if kind == "promoted" else "nodes")
+    if kind == "property":
+        return info['properties'].get(name, default)
+    if kind == "constraint":
+        return name in info['constraints']
+    if kind == "resource":
+        for section in ["resources", "stonith", "groups", "clones"]:
+            if name in info[section]:
+                return info[section][name]
+        return default
+    if kind == "node":
+        return info['nodes'].get(name, default)
+    return info['dc']
+
+
+def play_scope(variables):
+    """
+    Return an identifier of the play the lookup runs in, to scope the cached models to.
+    There is no id of the play in the variables, so it is built from the ansible-playbook process,
+    which the tasks run in a child process of, the name of the play and its hosts.
+    @variables - The variables of the task
+    """
+    parent_process = getattr(multiprocessing, 'parent_process', lambda: None)()  # Python >= 3.8
+    pid = parent_process.pid if parent_process is not None else os.getpid()
+    variables = variables or {}
+    play = "{0}:{1}:{2}".format(pid, variables.get('ansible_play_name'), ",".join(variables.get('ansible_play_hosts_all') or []))
+    return hashlib.sha1(play.encode('utf-8')).hexdigest()[:16]
+
+
+class LookupModule(LookupBase):
+
+    def fetch_model(self, host, port):
+        """
+        Return the model of the cluster built from the CIB fetched through pcsd
+        @host - The node to fetch the CIB from
+        @port - The port pcsd listens on
+        """
+        token = self.get_option('token')
+        client = PcsdClient(host, token, port, self.get_option('timeout'), validate_certs=self.get_option('validate_certs'),
+                            ca_path=self.get_option('ca_path'))
+        try:
+            if token is None:
+                if self.get_option('password') is None:
+                    raise AnsibleError("Either token or password is required to fetch the CIB from {0}".format(host))
+                client.auth(self.get_option('username'), self.get_option('password'))
+            xml = client.get_cib()
+        except PcsdError as excep:
+            raise AnsibleError("Failed to fetch the CIB: {0}".format(to_native(excep)))
+        cib = parse_cib(xml, sections=CIB_SECTIONS + ["history"])
+        return build_cluster_info(cib, cib_status(cib))
+
+    def get_model(self, host, port, scope):
+        """
+        Return the model of the cluster from, in order, the models of this task,
+        the cache plugin when enabled, or pcsd.
+        @host - The node to fetch the CIB from
+        @port - The port pcsd listens on
+        @scope - The play the model is cached for, see play_scope
+        """
+        key = "{0}:{1}:{2}".format(scope, host, port)
+        refresh = self.get_option('refresh')
+        if not refresh and key in CIB_MODELS:
+            return CIB_MODELS[key]
+        cache = None
+        cache_key = "pacemaker_cib_{0}_{1}_{2}".format(scope, host, port)
+        if self.get_option('cache'):
+            cache = cache_loader.get(self.get_option('cache_plugin'),
+                                     _uri=os.path.expanduser(self.get_option('cache_connection')),
+                                     _timeout=self.get_option('cache_timeout'))
+            if cache is None:
+                raise AnsibleError("Unable to load the cache plugin {0}".format(self.get_option('cache_plugin')))
+            if not refresh:
+                try:
+                    CIB_MODELS[key] = cache.get(cache_key)
+                    return CIB_MODELS[key]
+                except KeyError:
+                    pass  # missing or expired
+        CIB_MODELS[key] = self.fetch_model(host, port)
+        if cache is not None:
+            cache.set(cache_key, CIB_MODELS[key])
+        return CIB_MODELS[key]
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        info = self.get_model(self.get_option('host'), self.get_option('port'), play_scope(variables))
+        return [query_cib(info, term, self.get_option('default')) for term in terms]
@@ -0,0 +1,696 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+import hashlib
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+
+# The copy of the CIB the CIB manager keeps on disk, and its signature
+CIB_DISK_FILE = "/var/lib/pacemaker/cib/cib.xml"
+
+# Names of the CIB manager process in Pacemaker 2 and 1
+CIB_MANAGER_PROCESSES = ["pacemaker-based", "cib"]
+
+CIB_SECTIONS = ["properties", "nodes", "resources", "constraints"]
+
+CONSTRAINT_TAGS = {
+    "rsc_location": "location",
+    "rsc_order": "order",
+    "rsc_colocation": "colocation",
+    "rsc_ticket": "ticket",
+}
+
+
+def new_cib_model():
+    """
+    Return an empty CIB model. Every section is a dict keyed by the id of the element
+    (nodes are keyed by uname as that is how pcs addresses them).
+    """
+    return {
+        "epoch": {"admin_epoch": 0, "epoch": 0, "num_updates": 0},
+        "dc_uuid": None,
+        "properties": {},
+        "nodes": {},
+        "resources": {},
+        "stonith": {},
+        "groups": {},
+        "clones": {},
+        "constraints": {},
+    }
+
+
+def get_nvpairs(element, tag):
+    """
+    Return the nvpairs of all the child elements with the given tag as a dict,
+    e.g. instance_attributes or meta_attributes.
+    """
+    nvpairs = {}
+    if element is None:
+        return nvpairs
+    for attributes in element.findall(tag):
+        for nvpair in attributes.findall('nvpair'):
+            nvpairs[nvpair.get('name')] = nvpair.get('value')
+    return nvpairs
+
+
+def parse_primitive(cib, element, parent):
+    resource = {
+        "id": element.get('id'),
+        "class": element.get('class'),
+        "provider": element.get('provider'),
+        "type": element.get('type'),
+        "parent": parent,
+        "instance_attributes": get_nvpairs(element, 'instance_attributes'),
+        "meta_attributes": get_nvpairs(element, 'meta_attributes'),
+    }
+    if resource['class'] == "stonith":
+        cib['stonith'][resource['id']] = resource
+    else:
+        cib['resources'][resource['id']] = resource
+
+
+def parse_group(cib, element, parent):
+    members = []
+    for primitive in element.findall('primitive'):
+        members.append(primitive.get('id'))
+        parse_primitive(cib, primitive, element.get('id'))
+    cib['groups'][element.get('id')] = {
+        "id": element.get('id'),
+        "parent": parent,
+        "members": members,
+        "meta_attributes": get_nvpairs(element, 'meta_attributes'),
+    }
+
+
+def parse_clone(cib, element):
+    child = None
+    for item in element:
+        if item.tag == "primitive":
+            child = item.get('id')
+            parse_primitive(cib, item, element.get('id'))
+        elif item.tag == "group":
+            child = item.get('id')
+            parse_group(cib, item, element.get('id'))
+    cib['clones'][element.get('id')] = {
+        "id": element.get('id'),
+        "kind": element.tag,
+        "resource": child,
+        "meta_attributes": get_nvpairs(element, 'meta_attributes'),
+    }
+
+
+def parse_constraint(cib, element):
+    constraint = dict(element.attrib)
+    constraint['type'] = CONSTRAINT_TAGS[element.tag]
+    constraint['resource_sets'] = []
+    for resource_set in element.findall('resource_set'):
+        constraint['resource_sets'].append([ref.get('id') for ref in resource_set.findall('resource_ref')])
+    constraint['rules'] = len(element.findall('rule'))
+    cib['constraints'][constraint['id']] = constraint
+
+
+def iterparse(data, events=('start', 'end')):
+    """
+    Return an iterator over the events of the xml. A file object is read in chunks
+    rather than as a whole. ET.iterparse is available on all the Python versions
+    Ansible supports on the managed nodes, unlike ET.XMLPullParser.
+    @data - xml as a string or a file object
+    @events - The events to yield
+    """
+    if not hasattr(data, 'read'):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        data = io.BytesIO(data)
+    return ET.iterparse(data, events=events)
+
+
+# The op-status of an operation in the status section, see enum pcmk_exec_status in Pacemaker
+OP_STATUS_PENDING = -1
+OP_STATUS_DONE = 0
+OP_STATUS_CANCELLED = 1
+OP_STATUS_NOT_INSTALLED = 7
+
+
+def parse_history(cib, node, resource, element):
+    """
+    Aggregate a lrm_rsc_op from the status section into a single small record per
+    resource and node, so the operation history is never held in memory.
+    Cancelled operations, i.e. recurring monitors that were stopped, are skipped and
+    pending operations, recorded when record-pending is set, are kept apart from the
+    last completed operation as they have no result yet.
+    """
+    history = cib['history'].setdefault(resource, {}).setdefault(node, {
+        "operations": 0,
+        "failures": 0,
+        "last_operation": None,
+        "last_rc": None,
+        "last_status": None,
+        "last_call_id": -1,
+        "pending": None,
+    })
+    op_status = int(element.get('op-status', OP_STATUS_DONE))
+    if op_status == OP_STATUS_CANCELLED:
+        return
+    if op_status == OP_STATUS_PENDING:
+        history['pending'] = element.get('operation')
+        return
+    history['operations'] += 1
+    rc = int(element.get('rc-code', 0))
+    if op_status != OP_STATUS_DONE or rc not in [0, 7, 8]:  # ok, not running, running promoted
+        history['failures'] += 1
+    call_id = int(element.get('call-id', -1))
+    if call_id >= history['last_call_id']:
+        history['last_call_id'] = call_id
+        history['last_operation'] = element.get('operation')
+        history['last_rc'] = rc
+        history['last_status'] = op_status
+
+
+def parse_cib(data, sections=None):
+    """
+    Parse the output of cibadmin --query into an indexed model.
+    See new_cib_model for the structure of the returned dict.
+    The xml is parsed incrementally and each element is dropped once it has been
+    handled, so memory does not grow with the size of the status section.
+    @data - The CIB xml as a string or a file object
+    @sections - Only parse these sections: properties, nodes, resources (including stonith,
+                groups and clones) and constraints. Defaults to all of them.
+                Add history to aggregate the resource operation history from the status section.
+    """
+    if sections is None:
+        sections = CIB_SECTIONS
+    cib = new_cib_model()
+    if "history" in sections:
+        cib['history'] = {}
+    path = []
+    elements = []
+    for event, element in iterparse(data):
+        if event == 'start':
+            if len(path) == 0:
+                for key in cib['epoch'].keys():
+                    cib['epoch'][key] = int(element.get(key, 0))
+                cib['dc_uuid'] = element.get('dc-uuid')
+            elif path == ["cib", "status"] and element.tag == "node_state" and "nodes" in sections:
+                node = cib['nodes'].get(element.get('uname'))
+                if node is None and is_true(element.get('remote_node')):  # guest nodes are not in the nodes section
+                    node = cib['nodes'][element.get('uname')] = {
+                        "id": element.get('id'),
+                        "uname": element.get('uname'),
+                        "type": "remote",
+                        "attributes": {},
+                        "online": False,
+                    }
+                if node is not None:
+                    node['online'] = node_state_online(element)
+            path.append(element.tag)
+            elements.append(element)
+            continue
+
+        path.pop()
+        elements.pop()
+        parent = "/".join(path)
+        if parent == "cib/configuration/crm_config":
+            if "properties" in sections and element.tag == "cluster_property_set":
+                for nvpair in element.findall('nvpair'):
+                    cib['properties'][nvpair.get('name')] = nvpair.get('value')
+        elif parent == "cib/configuration/nodes":
+            if "nodes" in sections and element.tag == "node":
+                cib['nodes'][element.get('uname')] = {
+                    "id": element.get('id'),
+                    "uname": element.get('uname'),
+                    "type": element.get('type', 'member'),
+                    "attributes": get_nvpairs(element, 'instance_attributes'),
+                    "online": False,
+                }
+        elif parent == "cib/configuration/resources":
+            if "resources" in sections:
+                if element.tag == "primitive":
+                    parse_primitive(cib, element, None)
+                elif element.tag == "group":
+                    parse_group(cib, element, None)
+                elif element.tag in ["clone", "master", "bundle"]:
+                    parse_clone(cib, element)
+        elif parent == "cib/configuration/constraints":
+            if "constraints" in sections and element.tag in CONSTRAINT_TAGS:
+                parse_constraint(cib, element)
+        elif element.tag == "lrm_rsc_op":
+            if "history" in sections:
+                parse_history(cib, elements[2].get('uname'), elements[-1].get('id'), element)
+        elif parent != "cib/status" and not parent.startswith("cib/status/node_state/lrm"):
+            continue  # keep the element until its parent has been handled
+        if len(elements) > 0:
+            elements[-1].remove(element)
+    return cib
+
+
+def is_true(value):
+    return value == "true"
+
+
+# The values Pacemaker accepts as true in node attributes, e.g. standby="on"
+CIB_TRUE_VALUES = ["true", "on", "yes", "y", "1"]
+
+
+def node_state_online(element):
+    """
+    Return true if the node_state from the status section reports the node as online.
+    Remote nodes are online when their connection is up, cluster nodes when the
+    controller is up and the node has joined. Pacemaker 2.1.7+ records the time
+    the node came up in place of "true" and "online", and 0 when it is down.
+    @element - The node_state element
+    """
+    if is_true(element.get('remote_node')):
+        return element.get('in_ccm', "false") not in ["false", "0"]
+    return element.get('crmd', "offline") not in ["offline", "0"] and element.get('join') == "member"
+
+
+def cib_node_states(cib):
+    """
+    Return the state of the nodes from the CIB alone, for when crm_mon can't be run
+    such as when the CIB was read through pcsd from another host.
+    Returns {node: {"id", "type", "online", "standby", "maintenance", "dc"}}
+    @cib - The parsed CIB model, with the status section
+    """
+    nodes = {}
+    for name, node in cib['nodes'].items():
+        nodes[name] = {
+            "id": node['id'],
+            "type": node['type'],
+            "online": node['online'],
+            "standby": str(node['attributes'].get('standby', "")).lower() in CIB_TRUE_VALUES,
+            "maintenance": str(node['attributes'].get('maintenance', "")).lower() in CIB_TRUE_VALUES,
+            "dc": node['id'] is not None and node['id'] == cib['dc_uuid'],
+        }
+    return nodes
+
+
+def is_promotable(cib, id):
+    """
+    Return true if the resource is an instance of a promotable clone
+    @cib - The parsed CIB model
+    @id - The id of the primitive
+    """
+    parent = cib['resources'].get(id, {}).get('parent')
+    if parent in cib['groups']:
+        parent = cib['groups'][parent]['parent']
+    clone = cib['clones'].get(parent)
+    if clone is None:
+        return False
+    return clone['kind'] == "master" or str(clone['meta_attributes'].get('promotable', "")).lower() in CIB_TRUE_VALUES
+
+
+def cib_status(cib):
+    """
+    Return the current state of the nodes and resources from the status section of the
+    CIB, in the form returned by parse_crm_mon, for when crm_mon can't be run such as
+    when the CIB was read through pcsd from another host.
+    A resource is active on an online node when its last operation there succeeded and
+    did not stop it, or failed, as crm_mon does since its state is unknown until it is
+    recovered, unless the resource agent is not installed on the node. It is also active
+    while an operation other than a monitor is pending.
+    Clone instances are collected under the id of the cloned resource.
+    @cib - The model returned by parse_cib with the nodes, resources and history sections
+    """
+    status = {"dc": None, "nodes": {}, "resources": {}}
+    for name, node in cib_node_states(cib).items():
+        status['nodes'][name] = {
+            "id": node['id'],
+            "online": node['online'],
+            "standby": node['standby'],
+            "maintenance": node['maintenance'],
+            "is_dc": node['dc'],
+            "type": node['type'],
+            "resources_running": 0,
+        }
+        if node['dc']:
+            status['dc'] = name
+    for rsc_id, history in sorted(cib['history'].items()):
+        id = rsc_id.split(':')[0]  # Unique clone instances are recorded as <id>:<n>
+        primitive = cib['resources'].get(id) or cib['stonith'].get(id) or {"meta_attributes": {}}
+        resource = status['resources'].setdefault(id, {
+            "id": id,
+            "agent": ":".join([primitive[key] for key in ["class", "provider", "type"] if primitive.get(key)]) or None,
+            "role": "Stopped",
+            "active": False,
+            "managed": str(primitive['meta_attributes'].get('is-managed', "true")).lower() in CIB_TRUE_VALUES,
+            "failed": False,
+            "nodes": [],
+            "instances": [],
+        })
+        for name, operations in sorted(history.items()):
+            node = status['nodes'].get(name)
+            if node is None or not node['online']:
+                continue
+            pending = operations['pending'] not in [None, "monitor"]
+            if operations['last_operation'] is None and not pending:
+                continue
+            failed = not pending and (operations['last_status'] != OP_STATUS_DONE or operations['last_rc'] not in [0, 7, 8])
+            if failed:
+                resource['failed'] = True
+                if operations['last_rc'] == 5 or operations['last_status'] == OP_STATUS_NOT_INSTALLED:
+                    continue
+            elif not pending and (operations['last_rc'] == 7 or operations['last_operation'] in ["stop", "migrate_to"]):
+                continue
+            if pending:
+                promoted = operations['pending'] in ["promote", "demote"]
+            else:
+                promoted = operations['last_rc'] in [8, 9] or operations['last_operation'] == "promote" or \
+                    (failed and operations['last_operation'] == "demote")
+            if promoted:
+                role = "Promoted"
+            elif is_promotable(cib, id):
+                role = "Unpromoted"
+            else:
+                role = "Started"
+            if resource['role'] == "Stopped":
+                resource['role'] = role
+            resource['active'] = True
+            resource['nodes'].append(name)
+            resource['instances'].append({"role": role, "nodes": [name]})
+            node['resources_running'] += 1
+    return status
+
+
+def parse_crm_mon_resource(status, element):
+    id = element.get('id').split(':')[0]  # Unique clone instances are reported as <id>:<n>
+    resource = status['resources'].setdefault(id, {
+        "id": id,
+        "agent": element.get('resource_agent'),
+        "role": "Stopped",
+        "active": False,
+        "managed": is_true(element.get('managed')),
+        "failed": False,
+        "nodes": [],
+        "instances": [],
+    })
+    nodes = [node.get('name') for node in element.findall('node')]
+    resource['active'] = resource['active'] or is_true(element.get('active'))
+    resource['failed'] = resource['failed'] or is_true(element.get('failed'))
+    if resource['role'] == "Stopped":
+        resource['role'] = element.get('role')
+    resource['nodes'].extend(nodes)
+    resource['instances'].append({"role": element.get('role'), "nodes": nodes})
+
+
+def parse_crm_mon(data):
+    """
+    Parse the output of crm_mon --as-xml, or crm_mon --output-as=xml, into the current
+    state of the nodes and resources.
+    Clone instances are collected under the id of the cloned resource.
+    @data - The crm_mon xml as a string
+    """
+    status = {"dc": None, "quorate": False, "nodes": {}, "resources": {}}
+    root = ET.fromstring(data)
+    current_dc = root.find('summary/current_dc')
+    if current_dc is not None and is_true(current_dc.get('present')):
+        status['dc'] = current_dc.get('name')
+        status['quorate'] = is_true(current_dc.get('with_quorum'))
+    for node in root.findall('nodes/node'):
+        status['nodes'][node.get('name')] = {
+            "id": node.get('id'),
+            "online": is_true(node.get('online')),
+            "standby": is_true(node.get('standby')),
+            "maintenance": is_true(node.get('maintenance')),
+            "is_dc": is_true(node.get('is_dc')),
+            "type": node.get('type'),
+            "resources_running": int(node.get('resources_running', 0)),
+        }
+    for element in root.iter('resource'):
+        parse_crm_mon_resource(status, element)
+    return status
+
+
+def build_cluster_info(cib, status):
+    """
+    Combine the CIB model with the state reported by crm_mon.
+    Resources and fencing devices get their current role and the nodes
+    they run on, nodes get their online, standby and dc state.
+    @cib - The parsed CIB model
+    @status - The parsed crm_mon state
+    """
+    info = {
+        "epoch": cib['epoch'],
+        "dc": status['dc'],
+        "properties": cib['properties'],
+        "nodes": {},
+        "resources": {},
+        "stonith": {},
+        "groups": cib['groups'],
+        "clones": cib['clones'],
+        "constraints": cib['constraints'],
+    }
+    for name, node in cib['nodes'].items():
+        info['nodes'][name] = dict(node)
+        info['nodes'][name].update(status['nodes'].get(name, {}))
+    for name, node in status['nodes'].items():  # i.e. remote nodes not in the nodes section
+        if name not in info['nodes']:
+            info['nodes'][name] = dict(node, uname=name, attributes={})
+    for section in ["resources", "stonith"]:
+        for id, resource in cib[section].items():
+            state = status['resources'].get(id, {})
+            info[section][id] = dict(resource)
+            info[section][id].update({
+                "role": state.get('role', "Stopped"),
+                "active": state.get('active', False),
+                "managed": state.get('managed', True),
+                "failed": state.get('failed', False),
+                "nodes": state.get('nodes', []),
+                "instances": state.get('instances', []),
+            })
+    return info
+
+
+# A planned action in the Transition Summary of crm_simulate, i.e.
+#   * Move       res1     ( node1 -> node2 )
+#   * Stop       res2     ( node2 )  due to node availability
+#   * Fence (reboot) node2 'peer is no longer part of the cluster'
+CRM_SIMULATE_ACTION = re.compile(r"^\*\s+(\w+)\s+(\S+)\s+\(\s*(.*?)\s*\)\s*(.*)$")
+CRM_SIMULATE_FENCE = re.compile(r"^\*\s+Fence\s+\((\w+)\)\s+(\S+)\s*(.*)$")
+
+# Actions that move a resource between nodes, the other actions report role changes
+CRM_SIMULATE_MOVES = ["move", "migrate"]
+
+
+def parse_crm_simulate(out):
+    """
+    Parse the Transition Summary of crm_simulate into the actions the cluster
+    would take, with the resource, the node it runs on after the action, the
+    node it left for moves and the reason given by the scheduler.
+    Returns {"actions": [...], "counts": {action: number}}
+    @out - The text output of crm_simulate --simulate
+    """
+    transition = {"actions": [], "counts": {}}
+    in_summary = False
+    for line in out.splitlines():
+        if line.strip() == "Transition Summary:":
+            in_summary = True
+            continue
+        if in_summary and line.strip() != "" and not line[0].isspace():
+            break  # The next section
+        if not in_summary:
+            continue
+        line = line.strip()
+        fence = CRM_SIMULATE_FENCE.match(line)
+        match = CRM_SIMULATE_ACTION.match(line)
+        if fence is not None:
+            action = {"action": "fence", "resource": None, "node": fence.group(2), "from_node": None,
+                      "reason": fence.group(3).strip("'") or fence.group(1)}
+        elif match is not None:
+            name = match.group(1).lower()
+            before, arrow, after = match.group(3).rpartition("->")
+            node = after.split()[-1] if after.split() else None
+            action = {"action": name, "resource": match.group(2), "node": node, "from_node": None,
+                      "reason": re.sub(r"^due to\s+", "", match.group(4).strip()) or None}
+            if arrow and name in CRM_SIMULATE_MOVES and before.split():
+                action['from_node'] = before.split()[-1]
+        else:
+            continue
+        transition['actions'].append(action)
+        transition['counts'][action['action']] = transition['counts'].get(action['action'], 0) + 1
+    return transition
+
+
+def build_cluster_status(services, corosync=None, crm_mon=None):
+    """
+    Combine the state of the cluster services, corosync.conf and crm_mon into
+    the status of the cluster as seen from this node.
+    The cluster is configured when corosync.conf exists, started when corosync
+    and pacemaker are active and enabled when both start at boot.
+    @services - As returned by pacemaker_common.get_cluster_services
+    @corosync - As returned by pacemaker_common.corosync_cluster_info, None without corosync.conf
+    @crm_mon - The crm_mon xml, None when pacemaker is not running
+    """
+    status = {
+        "configured": corosync is not None,
+        "started": services['corosync']['active'] and services['pacemaker']['active'],
+        "enabled": services['corosync']['enabled'] and services['pacemaker']['enabled'],
+        "services": services,
+        "cluster_name": corosync['cluster_name'] if corosync is not None else None,
+        "nodes": [node['name'] for node in corosync['nodes']] if corosync is not None else [],
+        "online_nodes": [],
+        "quorate": None,
+        "dc": None,
+    }
+    if crm_mon is not None:
+        state = parse_crm_mon(crm_mon)
+        status['online_nodes'] = sorted(name for name, node in state['nodes'].items() if node['online'])
+        status['quorate'] = state['quorate']
+        status['dc'] = state['dc']
+    return status
+
+
+def resource_config_diff(resource, instance_attributes=None, meta_attributes=None):
+    """
+    Compare the desired attributes of a resource against the CIB model.
+    Only keys that are supplied and differ are returned, attributes that are
+    not supplied are left alone.
+    Returns a dict like {"instance_attributes": {"ip": {"before": "10.0.0.1", "after": "10.0.0.2"}}, "meta_attributes": {}}
+    @resource - The resource from the CIB model
+    @instance_attributes - dict of the desired instance attributes
+    @meta_attributes - dict of the desired meta attributes
+    """
+    diff = {"instance_attributes": {}, "meta_attributes": {}}
+    for section, desired in [("instance_attributes", instance_attributes), ("meta_attributes", meta_attributes)]:
+        for k, v in (desired or {}).items():
+            if isinstance(v, bool):  # Ansible turns yaml booleans into True and False
+                v = str(v).lower()
+            v = str(v)
+            if resource[section].get(k) != v:
+                diff[section][k] = {"before": resource[section].get(k), "after": v}
+    return diff
+
+
+# How Pacemaker escapes attribute values when it serialises the CIB, with pcmk__xml_escape
+# since 2.1.7 and with crm_xml_escape before
+XML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "\n": "&#x0A;", "\r": "&#x0D;", "\t": "&#x09;"}
+XML_ESCAPES_LEGACY = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&apos;", "\n": "\\n", "\r": "\\r", "\t": "    "}
+XML_ESCAPED_CHARS = re.compile(r"[&<>\"'\x00-\x1f\x7f]")
+
+
+def xml_escape(value, legacy=False):
+    """
+    Escape an attribute value as Pacemaker does when it serialises the CIB.
+    The other control characters are escaped as &#xXX;, or as \\ooo before Pacemaker 2.1.7.
+    @value - The attribute value
+    @legacy - Escape as Pacemaker before 2.1.7
+    """
+    escapes = XML_ESCAPES_LEGACY if legacy else XML_ESCAPES
+
+    def replace(match):
+        char = match.group(0)
+        if char in escapes:
+            return escapes[char]
+        if char == "'":
+            return char
+        return "\\{0:03o}".format(ord(char)) if legacy else "&#x{0:02X};".format(ord(char))
+    return XML_ESCAPED_CHARS.sub(replace, value)
+
+
+def cib_digests(data):
+    """
+    Return the digests Pacemaker writes to cib.xml.sig for the CIB, the md5 of the
+    xml serialised without any formatting, with the attributes in document order.
+    The attribute values are escaped differently since Pacemaker 2.1.7, so both
+    digests are computed in a single pass, the current one first.
+    @data - The CIB xml as a string or a file object
+    """
+    digests = [hashlib.md5(), hashlib.md5()]
+
+    def update(chunk, legacy_chunk=None):
+        digests[0].update(chunk.encode('utf-8'))
+        digests[1].update((chunk if legacy_chunk is None else legacy_chunk).encode('utf-8'))
+
+    open_tag = False
+    try:
+        events = iterparse(data, events=('start', 'end', 'comment'))
+    except ValueError:  # comment events need Python 3.8, a CIB with comments then won't match its signature
+        events = iterparse(data, events=('start', 'end'))
+    for event, element in events:
+        if event == 'start':
+            if open_tag:
+                update(">")
+            attributes = "".join(' {0}="{1}"'.format(k, xml_escape(v)) for k, v in element.attrib.items())
+            legacy = None
+            if any(XML_ESCAPED_CHARS.search(v) for v in element.attrib.values()):
+                legacy = "".join(' {0}="{1}"'.format(k, xml_escape(v, legacy=True)) for k, v in element.attrib.items())
+                legacy = "<{0}{1}".format(element.tag, legacy)
+            update("<{0}{1}".format(element.tag, attributes), legacy)
+            open_tag = True
+        elif event == 'end':
+            update("/>" if open_tag else "</{0}>".format(element.tag))
+            open_tag = False
+            element.clear()
+        else:
+            if open_tag:
+                update(">")
+            update("<!--{0}-->".format(element.text))
+            open_tag = False
+    return [digest.hexdigest() for digest in digests]
+
+
+def cib_manager_running(proc="/proc"):
+    """
+    Returns true if the CIB manager runs on this node, without it the CIB on disk
+    is not kept up to date with the cluster.
+    """
+    for pid in os.listdir(proc):
+        if pid.isdigit():
+            try:
+                with open(os.path.join(proc, pid, "comm"), 'r') as f:
+                    if f.read().strip() in CIB_MANAGER_PROCESSES:
+                        return True
+            except (IOError, OSError):
+                pass  # The process has gone
+    return False
+
+
+def read_disk_cib(cib_file=CIB_DISK_FILE, proc="/proc"):
+    """
+    Return the CIB xml the CIB manager keeps on disk, after checking the file is
+    complete and current. The file is checked and read through the same file object,
+    the CIB manager replaces it rather than writing to it in place.
+    Raises ValueError with the reason when the file can't be used.
+    The CIB on disk has no status section.
+    @cib_file - Path to cib.xml, its signature is read from cib.xml.sig
+    @proc - Path to the proc filesystem, mainly for testing
+    """
+    if not cib_manager_running(proc):
+        raise ValueError("The CIB manager is not running so {0} may be stale".format(cib_file))
+    try:
+        with open("{0}.sig".format(cib_file), 'r') as f:
+            signature = f.read().strip()
+        cib = open(cib_file, 'rb')
+    except (IOError, OSError) as excep:
+        raise ValueError("Can't read {0}: {1}".format(cib_file, excep))
+    with cib:
+        try:
+            digests = cib_digests(cib)
+        except ET.ParseError as excep:
+            raise ValueError("Can't parse {0}: {1}".format(cib_file, excep))
+        if signature not in digests:
+            raise ValueError("The digest of {0} does not match its signature, it may be being written".format(cib_file))
+        cib.seek(0)
+        root = next(iterparse(cib, events=('start',)))[1]
+        if not root.get('epoch', '').isdigit() or not root.get('admin_epoch', '').isdigit():
+            raise ValueError("{0} has no valid epoch".format(cib_file))
+        cib.seek(0)
+        return cib.read().decode('utf-8')
+
+
+def disk_get_cib(module, cib_file=CIB_DISK_FILE):
+    """
+    Return the CIB xml from disk when the backend option is disk, or None so the caller
+    falls back to querying the CIB, which it also does when the file is stale or unreadable.
+    A CIB file set with the file option is always read instead.
+    @module - Ansible module object
+    @cib_file - Path to cib.xml
+    """
+    if module.params.get('backend') != "disk" or module.params.get('file') is not None:
+        return None
+    try:
+        return read_disk_cib(cib_file)
+    except ValueError as excep:
+        if module.params.get('debug'):
+            module.warn("{0}, querying the CIB instead".format(excep))
+        return None
@@ -2,8 +2,283 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 import os
 import json
+import shutil
+import fcntl
+import tempfile
+import time
+import random
+import re
+import shlex
+import socket
 import getpass as gt
 
+# When the module started, task_timeout is counted from here
+TASK_START = time.time()
+
+
+# The commands run by the module, see run_pcs_command
+PCS_TIMINGS = []
+
+# pcs commands that contact other nodes and accept --request-timeout
+PCS_REQUEST_TIMEOUT_COMMANDS = [
+    "cluster auth",
+    "cluster setup",
+    "cluster start",
+    "cluster stop",
+    "cluster enable",
+    "cluster disable",
+    "cluster node",
+    "cluster reload",
+    "cluster sync",
+    "host auth",
+    "pcsd status",
+]
+
+# Errors after which a command is retried, a busy CIB or a failed connection
+TRANSIENT_ERRORS = [
+    "Resource temporarily unavailable",
+    "Device or resource busy",
+    "Timer expired",
+    "Transport endpoint is not connected",
+    "Connection refused",
+    "Connection timed out",
+    "Unable to connect to",
+    "Error connecting to",
+]
+
+# Seconds, doubled with each retry
+RETRY_BACKOFF = 0.5
+
+# Commands that only read the cluster state, their output is reused until a
+# command that may change the cluster is run, see run_pcs_command.
+# pcs --version is cached across runs by get_pcs_capabilities instead.
+READ_ONLY_COMMANDS = [
+    "pcs status",
+    "pcs cluster status",
+    "pcs property list",
+    "pcs property show",
+    "pcs property config",
+    "pcs resource status",
+    "pcs resource show",
+    "pcs resource config",
+    "pcs resource describe",
+    "pcs stonith describe",
+    "pcs stonith status",
+    "pcs stonith config",
+    "pcs constraint list",
+    "pcs constraint show",
+    "pcs constraint config",
+    "cibadmin --query",
+    "crm_mon",
+]
+
+# Output of the read-only commands run by the module
+PCS_CACHE = {}
+PCS_CACHE_STATS = {"hits": 0}
+
+# Commands that change the cluster but are safe to run again after a transient
+# error, as they only bring it to a state. Only these and the read-only commands
+# are retried, a command such as resource create may have been applied before it failed.
+RETRY_SAFE_COMMANDS = [
+    "pcs --version",
+    "pcs cluster start",
+    "pcs cluster stop",
+    "pcs cluster enable",
+    "pcs cluster disable",
+    "pcs cluster reload",
+    "pcs pcsd status",
+]
+
+
+def mask_command(module, cmd):
+    """
+    Return the command with the values of no_log parameters, i.e. passwords, masked
+    @module - Ansible module object
+    @cmd - The command as a string or a list
+    """
+    if isinstance(cmd, list):
+        cmd = " ".join(cmd)
+    for value in getattr(module, 'no_log_values', []):
+        if value:
+            cmd = cmd.replace(value, "********")
+    return cmd
+
+
+def task_time_left(module):
+    """
+    Return the seconds left of the task_timeout shared by all the commands of the module,
+    or None when there is no task_timeout
+    """
+    if module.params.get('task_timeout') is None:
+        return None
+    return TASK_START + module.params['task_timeout'] - time.time()
+
+
+def pcs_subcommand(args):
+    """
+    Return the pcs command without its options, e.g. "cluster auth" for pcs -f cib.xml cluster auth node1
+    """
+    words = []
+    skip = False
+    for arg in args[1:]:
+        if skip:
+            skip = False
+        elif arg == "-f":
+            skip = True
+        elif not arg.startswith("-"):
+            words.append(arg)
+    return " ".join(words[:2])
+
+
+def command_with_deadline(module, cmd, time_left=None):
+    """
+    Return the command as a list with the request_timeout passed to pcs commands
+    that contact other nodes and, when there is a deadline, run under timeout so it is
+    killed when the deadline passes. Other commands are returned unchanged.
+    @module - Ansible module object
+    @cmd - The command as a string or a list
+    @time_left - Seconds until the deadline, or None
+    """
+    args = shlex.split(cmd) if not isinstance(cmd, list) else list(cmd)
+    request_timeout = module.params.get('request_timeout')
+    if time_left is not None:
+        request_timeout = int(min(request_timeout or time_left, time_left)) or 1
+    pcs_utils = [os.path.basename(module.params.get('pcs_util') or "pcs"), "pcs"]
+    if os.path.basename(args[0]) in pcs_utils and pcs_subcommand(args) in PCS_REQUEST_TIMEOUT_COMMANDS and request_timeout:
+        args.insert(1, "--request-timeout={0}".format(request_timeout))
+    elif time_left is None:
+        return cmd
+    timeout_bin = module.get_bin_path("timeout") if time_left is not None else None
+    if timeout_bin is not None:
+        args = [timeout_bin, "--kill-after=5", "{0:.1f}".format(max(time_left, 0.1))] + args
+    return args
+
+
+def command_name(module, args):
+    """
+    Return the command as it is listed in READ_ONLY_COMMANDS and RETRY_SAFE_COMMANDS,
+    e.g. "pcs resource create" for pcs -f cib.xml resource create res1 ocf:heartbeat:Dummy
+    @module - Ansible module object
+    @args - The command as a list
+    """
+    tool = os.path.basename(args[0])
+    if tool in [os.path.basename(module.params.get('pcs_util') or "pcs"), "pcs"]:
+        return "pcs --version" if "--version" in args else "pcs {0}".format(pcs_subcommand(args))
+    elif tool == "cibadmin" and ("--query" in args or "-Q" in args):
+        return "cibadmin --query"
+    return tool
+
+
+def read_only_cache_key(module, cmd, kwargs):
+    """
+    Return the key the output of the command is cached under, or None if the command may change the cluster
+    """
+    args = shlex.split(cmd) if not isinstance(cmd, list) else list(cmd)
+    if command_name(module, args) not in READ_ONLY_COMMANDS:
+        return None
+    return (tuple(args), repr(sorted(kwargs.items())))
+
+
+def is_retry_safe(module, cmd):
+    """
+    Return true if the command can be run again after a transient error, see RETRY_SAFE_COMMANDS
+    """
+    args = shlex.split(cmd) if not isinstance(cmd, list) else list(cmd)
+    return command_name(module, args) in READ_ONLY_COMMANDS + RETRY_SAFE_COMMANDS
+
+
+def is_transient_error(rc, out, err):
+    if rc == 0:
+        return False
+    return any(error in "{0}{1}".format(out, err) for error in TRANSIENT_ERRORS)
+
+
+def run_pcs_command(module, cmd, use_cache=True, **kwargs):
+    """
+    Run a command with module.run_command.
+    Read-only and idempotent commands, see RETRY_SAFE_COMMANDS, that fail with a transient
+    error, such as a busy CIB or a connection failure, are retried up to the retries
+    option with jittered exponential backoff.
+    When the task_timeout option is set the command is killed once the task runs out of time.
+    When the profile option is set the command, its duration, exit code and
+    output size are recorded and returned by pcs_timings.
+    The output of read-only commands, see READ_ONLY_COMMANDS, is returned from a cache
+    when the same command is run again, any other command empties the cache.
+    @module - Ansible module object
+    @cmd - The command as a string or a list
+    @use_cache - Set to False to always run a read-only command, i.e. when polling
+    """
+    cache_key = read_only_cache_key(module, cmd, kwargs)
+    if cache_key is None:
+        PCS_CACHE.clear()
+    elif use_cache and cache_key in PCS_CACHE:
+        PCS_CACHE_STATS['hits'] += 1
+        return PCS_CACHE[cache_key]
+    retries = module.params.get('retries') or 0
+    if retries > 0 and not is_retry_safe(module, cmd):
+        retries = 0
+    attempt = 0
+    while True:
+        time_left = task_time_left(module)
+        if time_left is not None and time_left <= 0:
+            pcs_fail_json(module, msg="The task_timeout of {0} seconds was exceeded before running: {1}".format(
+                module.params['task_timeout'], mask_command(module, cmd)))
+        start = time.time()
+        rc, out, err = module.run_command(command_with_deadline(module, cmd, time_left), **kwargs)
+        if time_left is not None and rc in [124, 137]:  # exit codes of timeout
+            err = "{0}The command was killed after the task_timeout of {1} seconds".format(err, module.params['task_timeout'])
+        if module.params.get('profile'):
+            PCS_TIMINGS.append({
+                "cmd": mask_command(module, cmd),
+                "seconds": round(time.time() - start, 3),
+                "rc": rc,
+                "stdout_bytes": len(out or ""),
+                "stderr_bytes": len(err or ""),
+                "attempt": attempt + 1,
+            })
+        if rc == 0 and cache_key is not None:
+            PCS_CACHE[cache_key] = (rc, out, err)
+        if attempt >= retries or not is_transient_error(rc, out, err):
+            return rc, out, err
+        backoff = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+        time_left = task_time_left(module)
+        if time_left is not None:
+            backoff = min(backoff, max(time_left, 0))
+        time.sleep(backoff)
+        attempt += 1
+
+
+def pcs_timings():
+    """
+    Return the commands recorded by run_pcs_command and their totals, for the pcs_timings result key
+    """
+    return {
+        "commands": PCS_TIMINGS,
+        "total_commands": len(PCS_TIMINGS),
+        "total_seconds": round(sum(c["seconds"] for c in PCS_TIMINGS), 3),
+        "total_stdout_bytes": sum(c["stdout_bytes"] for c in PCS_TIMINGS),
+        "cache_hits": PCS_CACHE_STATS['hits'],
+    }
+
+
+def pcs_exit_json(module, **result):
+    """
+    module.exit_json, adding pcs_timings to the result when the profile option is set
+    """
+    if module.params.get('profile'):
+        result['pcs_timings'] = pcs_timings()
+    module.exit_json(**result)
+
+
+def pcs_fail_json(module, **result):
+    """
+    module.fail_json, adding pcs_timings to the result when the profile option is set,
+    so the commands run before the failure are returned too
+    """
+    if module.params.get('profile'):
+        result['pcs_timings'] = pcs_timings()
+    module.fail_json(**result)
+
 
 def file_exists(file):
     return os.path.exists(file)
@@ -59,6 +334,70 @@ def pcsd_tokens_file(user=None):
     return token_file
 
 
+def pcsd_known_hosts_file(tokens_file):
+    """
+    Return the path of the known-hosts file pcs 0.10+ uses in place of the tokens file of pcs 0.9
+    @tokens_file - Path to the pcsd tokens file, see pcsd_tokens_file
+    """
+    return os.path.join(os.path.dirname(os.path.expanduser(tokens_file)), "known-hosts")
+
+
+def update_pcsd_tokens_file(tokens_file, tokens, remove=None, known_hosts=None):
+    """
+    Merge tokens into the pcsd tokens file and remove members from it.
+    The file is locked while it is read and merged, so concurrent updates are not lost,
+    and the new file is renamed over the old one, so it is never left half written.
+    The file is created if it does not exist.
+    Returns the new content of the file.
+    @tokens_file - Path to the pcsd tokens file
+    @tokens - dict of the tokens to add {node: {"token": token, "port": port}}
+    @remove - members to remove from the file
+    @known_hosts - Update the known-hosts file of pcs 0.10+ rather than the tokens file of pcs 0.9,
+                   by default the known-hosts file is updated when it exists
+    """
+    tokens_file = os.path.expanduser(tokens_file)
+    if known_hosts is None:
+        known_hosts = file_exists(pcsd_known_hosts_file(tokens_file))
+    if known_hosts:
+        tokens_file = pcsd_known_hosts_file(tokens_file)
+    tokens_dir = os.path.dirname(tokens_file)
+    if not os.path.isdir(tokens_dir):
+        os.makedirs(tokens_dir, 0o700)
+    with open("{0}.lock".format(tokens_file), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if file_exists(tokens_file):
+            json_data = get_json_file(tokens_file)
+        elif known_hosts:
+            json_data = {"format_version": 1, "data_version": 0, "known_hosts": {}}
+        else:
+            json_data = {"format_version": 3, "data_version": 0, "tokens": {}, "ports": {}}
+        for node, token in tokens.items():
+            if known_hosts:
+                json_data["known_hosts"][node] = {"dest_list": [{"addr": token.get("addr", node), "port": token["port"]}],
+                                                  "token": token["token"]}
+            else:
+                json_data["tokens"][node] = token["token"]
+                json_data["ports"][node] = token["port"]
+        for node in remove or []:
+            if known_hosts:
+                json_data["known_hosts"].pop(node, None)
+            else:
+                json_data["tokens"].pop(node, None)
+                json_data["ports"].pop(node, None)
+        json_data["data_version"] += 1
+        fd, tmp_file = tempfile.mkstemp(dir=tokens_dir, prefix=".tokens")  # mode 0600
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps(json_data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_file, tokens_file)
+        except Exception:
+            os.remove(tmp_file)
+            raise
+    return json_data
+
+
 def build_cluster_auth_cmd(module, members_list, port=None):
     """
     Build the command to auth instances for pcsd
@@ -103,17 +442,380 @@ def build_cluster_setup_cmd(module, members_list):
     return cmd_base
 
 
+def build_cluster_node_cmds(module, diff, capabilities):
+    """
+    Return the pcs commands that add and remove the nodes in diff from a running cluster.
+    pcs adds one node per command, each is started and joins the running cluster.
+    pcs 0.10 and later remove many nodes with a single command.
+    @module - Ansible module object
+    @diff - As returned by corosync_nodes_diff
+    @capabilities - As returned by get_pcs_capabilities
+    """
+    cmds = []
+    for node in diff['add']:
+        cmd = "{0} cluster node add {1} --start".format(module.params['pcs_util'], node)
+        if module.params['wait'] is not None:
+            cmd = "{0} --wait={1}".format(cmd, module.params['wait'])
+        if module.params['enabled']:
+            cmd = "{0} --enable".format(cmd)
+        cmds.append(cmd)
+    if len(diff['remove']) > 0:
+        if pcs_version_at_least(capabilities, [0, 10]):
+            cmds.append("{0} cluster node remove {1}".format(module.params['pcs_util'], " ".join(diff['remove'])))
+        else:
+            cmds.extend("{0} cluster node remove {1}".format(module.params['pcs_util'], node) for node in diff['remove'])
+    return cmds
+
+
+# Sections of corosync.conf that can appear more than once in their parent section
+COROSYNC_REPEATED_SECTIONS = ["node", "interface", "logger_subsys"]
+
+# totem settings, in milliseconds or counts, that tune the membership protocol
+COROSYNC_TOTEM_TIMINGS = [
+    "token",
+    "token_coefficient",
+    "token_retransmit",
+    "token_retransmits_before_loss_const",
+    "hold",
+    "join",
+    "send_join",
+    "consensus",
+    "merge",
+    "downcheck",
+    "fail_recv_const",
+    "seqno_unchanged_const",
+    "max_messages",
+    "max_network_delay",
+    "window_size",
+    "knet_pmtud_interval",
+]
+
+# Parsed corosync.conf files keyed by path, with the mtime and size they were parsed at
+COROSYNC_CACHE = {}
+
+
+def parse_corosync_conf(data):
+    """
+    Parse corosync.conf into a dict per section, i.e. conf['totem']['cluster_name'].
+    Sections that can be repeated, see COROSYNC_REPEATED_SECTIONS, are lists of dicts.
+    Values are kept as strings. Raises ValueError if the sections are not balanced.
+    @data - The content of corosync.conf
+    """
+    conf = {}
+    stack = [conf]
+    for number, line in enumerate(data.splitlines(), 1):
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        if line.endswith("{"):
+            name = line[:-1].strip()
+            if name in COROSYNC_REPEATED_SECTIONS:
+                section = {}
+                stack[-1].setdefault(name, []).append(section)
+            else:
+                section = stack[-1].setdefault(name, {})
+            stack.append(section)
+        elif line == "}":
+            if len(stack) == 1:
+                raise ValueError("Unexpected }} on line {0} of corosync.conf".format(number))
+            stack.pop()
+        elif ":" in line:
+            key, value = line.split(":", 1)  # IPv6 addresses contain colons
+            stack[-1][key.strip()] = value.strip()
+        else:
+            raise ValueError("Invalid line {0} of corosync.conf: {1}".format(number, line))
+    if len(stack) != 1:
+        raise ValueError("A section of corosync.conf is not closed")
+    return conf
+
+
+def load_corosync_conf(corosync_file="/etc/corosync/corosync.conf"):
+    """
+    Return the parsed corosync.conf, see parse_corosync_conf.
+    The file is only parsed again when its mtime or size changes.
+    @corosync_file - Path to the corosync conf file
+    """
+    stat = os.stat(corosync_file)
+    version = (stat.st_mtime, stat.st_size)
+    cached = COROSYNC_CACHE.get(corosync_file)
+    if cached is None or cached[0] != version:
+        with open(corosync_file) as f:
+            cached = (version, parse_corosync_conf(f.read()))
+        COROSYNC_CACHE[corosync_file] = cached
+    return cached[1]
+
+
+def corosync_cluster_info(conf):
+    """
+    Return the cluster name, transport, totem timings, nodes, quorum and logging
+    settings from a parsed corosync.conf.
+    Each node has its name, nodeid and ring addresses in ring order.
+    @conf - As returned by parse_corosync_conf
+    """
+    totem = conf.get('totem', {})
+    nodes = []
+    for node in conf.get('nodelist', {}).get('node', []):
+        rings = sorted((int(k[4:-5]), v) for k, v in node.items() if re.match(r"^ring[0-9]+_addr$", k))
+        addrs = [addr for ring, addr in rings]
+        nodes.append({
+            "name": node.get('name', addrs[0] if addrs else None),
+            "nodeid": int(node['nodeid']) if node.get('nodeid', "").isdigit() else None,
+            "addrs": addrs,
+        })
+    return {
+        "cluster_name": totem.get('cluster_name'),
+        "version": totem.get('version'),
+        "transport": totem.get('transport'),
+        "timings": dict((k, int(v)) for k, v in totem.items() if k in COROSYNC_TOTEM_TIMINGS and v.isdigit()),
+        "interfaces": totem.get('interface', []),
+        "nodes": nodes,
+        "quorum": conf.get('quorum', {}),
+        "logging": conf.get('logging', {}),
+    }
+
+
+def is_ip_address(name):
+    """
+    Return true if name is an IPv4 or IPv6 address
+    """
+    for family in [socket.AF_INET, socket.AF_INET6]:
+        try:
+            socket.inet_pton(family, name)
+            return True
+        except (socket.error, ValueError):
+            pass
+    return False
+
+
+def node_names_match(name, other):
+    """
+    Return true if the names are the same host, ignoring case, or one is the
+    short name of the other, e.g. node1 and node1.example.com.
+    """
+    name, other = name.lower(), other.lower()
+    if name == other:
+        return True
+    if is_ip_address(name) or is_ip_address(other) or ("." in name) == ("." in other):
+        return False
+    return name.split('.')[0] == other.split('.')[0]
+
+
+def resolve_host(name):
+    """
+    Return the set of addresses a host name or address resolves to, empty when it doesn't resolve
+    """
+    try:
+        return set(info[4][0] for info in socket.getaddrinfo(name, None))
+    except (socket.error, UnicodeError):
+        return set()
+
+
+def corosync_nodes_diff(info, members):
+    """
+    Compare the nodes of corosync.conf with the expected members.
+    A member matches a node by name or by any of its addresses, a short name matching the
+    fully qualified name. Otherwise they match when they resolve to a common address, e.g.
+    a member given by its IP address and a node by its name, so no node is removed and
+    added again under another name.
+    Returns {"add": [members not in corosync.conf], "remove": [nodes that are not members]}
+    @info - As returned by corosync_cluster_info
+    @members - The expected node names or addresses
+    """
+    matched = set()
+    unmatched = []
+    for node in info['nodes']:
+        names = [node['name']] + node['addrs']
+        found = [m for m in members if any(node_names_match(m, n) for n in names)]
+        matched.update(found)
+        if len(found) == 0:
+            unmatched.append(node)
+    add = [m for m in members if m not in matched]
+    if len(unmatched) > 0 and len(add) > 0:
+        addrs = dict((m, resolve_host(m)) for m in add)
+        for node in list(unmatched):
+            node_addrs = set()
+            for name in [node['name']] + node['addrs']:
+                node_addrs.update(resolve_host(name))
+            found = [m for m in add if not addrs[m].isdisjoint(node_addrs)]
+            if len(found) > 0:
+                unmatched.remove(node)
+                add = [m for m in add if m not in found]
+    return {"add": add, "remove": [node['name'] for node in unmatched]}
+
+
+# The systemd units of a cluster node
+CLUSTER_SERVICES = ["corosync", "pacemaker", "pcsd"]
+
+
+def parse_systemctl_show(out):
+    """
+    Parse the Id, ActiveState and UnitFileState properties printed by systemctl show
+    into {service: {"active": bool, "enabled": bool}} for the CLUSTER_SERVICES.
+    Services that are not installed are neither active nor enabled.
+    @out - The output of systemctl show, one block of properties per unit
+    """
+    services = dict((service, {"active": False, "enabled": False}) for service in CLUSTER_SERVICES)
+    unit = {}
+    for line in out.splitlines() + [""]:
+        if "=" in line:
+            key, value = line.split("=", 1)
+            unit[key.strip()] = value.strip()
+        elif len(unit) > 0:
+            service = unit.get('Id', "").replace(".service", "")
+            if service in services:
+                services[service] = {"active": unit.get('ActiveState') == "active",
+                                     "enabled": unit.get('UnitFileState') == "enabled"}
+            unit = {}
+    return services
+
+
+def get_cluster_services(module):
+    """
+    Return the state of the cluster services on this node from a single systemctl call,
+    see parse_systemctl_show. Unlike pcs status no other node is contacted.
+    @module - Ansible module object
+    """
+    cmd = [module.get_bin_path("systemctl", required=True), "show", "--property=Id,ActiveState,UnitFileState"]
+    cmd.extend("{0}.service".format(service) for service in CLUSTER_SERVICES)
+    rc, out, err = run_pcs_command(module, cmd)
+    if rc != 0:
+        pcs_fail_json(module, msg="Failed getting the state of the cluster services: {0}".format(err))
+    return parse_systemctl_show(out)
+
+
+def local_corosync_node(info):
+    """
+    Return the name of this host in the corosync.conf nodelist, or None.
+    A node matches by its name or addresses, otherwise when they resolve to an address of
+    this host, such as a node named localhost.
+    @info - As returned by corosync_cluster_info
+    """
+    names = [socket.gethostname(), socket.getfqdn(), socket.gethostname().split('.')[0]]
+    for node in info['nodes']:
+        if not set(names).isdisjoint([node['name']] + node['addrs']):
+            return node['name']
+    local_addrs = set(["127.0.0.1", "::1"])
+    for name in names:
+        local_addrs.update(resolve_host(name))
+    for node in info['nodes']:
+        for name in [node['name']] + node['addrs']:
+            if not resolve_host(name).isdisjoint(local_addrs):
+                return node['name']
+    return None
+
+
+def online_corosync_nodes(info, crm_mon_nodes):
+    """
+    Return the names of the corosync.conf nodes crm_mon reports as online, in nodelist order.
+    corosync.conf may name a node by its ring0_addr or another form of its name than the
+    uname crm_mon reports, so a node matches the crm_mon node with its nodeid, otherwise
+    the one whose name matches its name or an address, see node_names_match.
+    @info - As returned by corosync_cluster_info
+    @crm_mon_nodes - The nodes as returned by pacemaker_cib.parse_crm_mon
+    """
+    online = []
+    for node in info['nodes']:
+        names = [name for name in [node['name']] + node['addrs'] if name is not None]
+        matches = [n for n in crm_mon_nodes.values() if node['nodeid'] is not None and n.get('id') == str(node['nodeid'])]
+        matches = matches or [n for uname, n in crm_mon_nodes.items() if any(node_names_match(name, uname) for name in names)]
+        if len(matches) > 0 and matches[0]['online']:
+            online.append(node['name'])
+    return online
+
+
+def node_batches(nodes, batch_size=None, order=None):
+    """
+    Split the nodes into the batches they are started or stopped in.
+    Nodes in order come first, in that order, followed by the rest in their original order.
+    Returns a list of lists of nodes, a single batch when batch_size is not set.
+    @nodes - The node names
+    @batch_size - Maximum number of nodes in a batch
+    @order - Node names to handle first
+    """
+    ordered = [n for n in (order or []) if n in nodes]
+    ordered.extend(n for n in nodes if n not in ordered)
+    if not batch_size or batch_size >= len(ordered):
+        return [ordered] if len(ordered) > 0 else []
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
 def get_cluster_name(corosync_file="/etc/corosync/corosync.conf"):
     """
     Return the cluster name from a corosync config file
     @corosync_file - Path to the corosync conf file
     """
-    with open(corosync_file) as f:
-        for line in f:
-            if "cluster_name" in line and line.startswith("#") is False:
-                cluster_name = line.split(": ")[1].strip()
-                break
-    return cluster_name
+    return load_corosync_conf(corosync_file).get('totem', {}).get('cluster_name')
+
+
+PCS_CAPABILITIES_CACHE = "~/.cache/community.pacemaker/pcs_capabilities.json"
+
+
+def parse_pcs_version(out):
+    """
+    Return the output of pcs --version --full as a dict with the version as a list of ints
+    and the capabilities pcs reports, older versions of pcs only report the version.
+    @out - Output of pcs --version --full
+    """
+    lines = out.strip().split('\n')
+    version = [int(v) for v in lines[0].strip().split('.') if v.isdigit()]
+    capabilities = " ".join(lines[1:]).split()
+    return {"version": version, "capabilities": capabilities}
+
+
+def get_pcs_capabilities(module, cache_file=PCS_CAPABILITIES_CACHE):
+    """
+    Return the version and capabilities of pcs. The probe is only run once, the result is
+    cached on the host and keyed by the path and mtime of the pcs binary so an upgrade
+    of pcs invalidates it.
+    @module - Ansible module object
+    @cache_file - Path to the cache file
+    """
+    pcs_path = module.get_bin_path(module.params['pcs_util'], required=True)
+    pcs_path = os.path.realpath(pcs_path)
+    mtime = os.path.getmtime(pcs_path)
+    cache_file = os.path.expanduser(cache_file)
+    cache = {}
+    if file_exists(cache_file):
+        try:
+            cache = get_json_file(cache_file)
+        except ValueError:
+            cache = {}  # A corrupt cache is simply rebuilt
+        if pcs_path in cache and cache[pcs_path]['mtime'] == mtime:
+            return cache[pcs_path]
+    rc, out, err = run_pcs_command(module, "{0} --version --full".format(pcs_path))
+    if rc != 0:
+        pcs_fail_json(module, msg="Failed getting the pcs version: {0}".format(err))
+    cache[pcs_path] = parse_pcs_version(out)
+    cache[pcs_path]['mtime'] = mtime
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        tmp_file = "{0}.{1}".format(cache_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError):
+        pass  # The cache is an optimisation, pcs will just be probed again next time
+    return cache[pcs_path]
+
+
+def pcs_version_at_least(capabilities, version):
+    """
+    Returns true if the pcs version is at least the one given
+    @capabilities - as returned by get_pcs_capabilities
+    @version - list of ints, e.g. [0, 10]
+    """
+    return capabilities['version'] >= version
+
+
+def pcs_has_capability(capabilities, capability):
+    """
+    Returns true if pcs reports the capability, e.g. pcmk.resource.config.output-formats
+    for JSON output from pcs resource config. See pcs --version --full for the full list.
+    @capabilities - as returned by get_pcs_capabilities
+    @capability - The capability id
+    """
+    return capability in capabilities['capabilities']
 
 
 # TODO This needs a rethink... conditional data testing stuff is not really in sync with the rest of the code
@@ -122,21 +824,202 @@ def get_cluster_resources(module, data):
     Return a dict containing the cluster resource(s)
     """
     results = []
-    cmd = "pcs resource show"
     if data is None:
-        rc, out, err = module.run_command(cmd)
-        if any("This command has been replaced with 'pcs resource status'" in s for s in [out, err]):
-            cmd = "pcs resource status"
-            rc, out, err = module.run_command(cmd)
+        cmd = "{0} resource show".format(module.params['pcs_util'])
+        if pcs_version_at_least(get_pcs_capabilities(module), [0, 10]):
+            cmd = "{0} resource status".format(module.params['pcs_util'])
+        rc, out, err = run_pcs_command(module, cmd)
     else:
         rc = 0
         out = data.strip()
         err = None
     if rc != 0:
-        module.fail_json(msg="Failed getting cluster resources: {0}".format(err))
+        pcs_fail_json(module, msg="Failed getting cluster resources: {0}".format(err))
     for line in out.split('\n'):
         if len(line.split('\t')) == 3:
             resource_name, resource_type, resource_state = line.split('\t')
             resource_name = resource_name.replace('*', '').strip()
             results.append({"resource_name": resource_name, "resource_type": resource_type.strip(), "resource_state": resource_state.strip()})
     return results
+
+
+def get_cib(module, backend_cib=None, data=None):
+    """
+    Return the CIB xml with a single cibadmin query.
+    The result should be parsed once with pacemaker_cib.parse_cib and
+    passed around rather than asking pcs for each piece of information.
+    With the local option the CIB of this node is read.
+    @module - Ansible module object
+    @backend_cib - CIB xml read by the pcsd or disk backend, see pcsd_get_cib and disk_get_cib,
+                   None when the backend is not enabled or could not be used
+    @data - CIB xml to use instead of querying the cluster, mainly for testing
+    """
+    if data is not None:
+        return data.strip()
+    if backend_cib is not None:
+        return backend_cib
+    cib_file = module.params.get('file')
+    if cib_file is not None:
+        if not file_exists(cib_file):
+            pcs_fail_json(module, msg="The CIB file {0} does not exist".format(cib_file))
+        with open(cib_file, 'r') as f:
+            return f.read()
+    cmd = "cibadmin --query"
+    if module.params.get('local'):
+        cmd = "cibadmin --query --local"  # The CIB of this node, without a round trip to the DC
+    rc, out, err = run_pcs_command(module, cmd)
+    if rc != 0:
+        pcs_fail_json(module, msg="Failed querying the cluster CIB: {0}".format(err))
+    return out
+
+
+def pcs_base_cmd(module, cib_file=None):
+    """
+    Return the pcs command to prefix CIB changes with.
+    When the file option is set pcs modifies that file, usually a shadow copy
+    of the CIB, instead of the live cluster.
+    @module - Ansible module object
+    @cib_file - CIB file to use instead of the file option
+    """
+    cmd = module.params['pcs_util']
+    if cib_file is None:
+        cib_file = module.params.get('file')
+    if cib_file is not None:
+        cmd = "{0} -f {1}".format(cmd, cib_file)
+    return cmd
+
+
+def shadow_cib_original(shadow_file):
+    """
+    Return the path of the untouched copy of a shadow CIB that cib-push diffs against
+    @shadow_file - Path to the shadow CIB
+    """
+    return "{0}.orig".format(shadow_file)
+
+
+def create_shadow_cib(module, shadow_file):
+    """
+    Write the live CIB to shadow_file, plus a copy to diff against when pushing
+    @module - Ansible module object
+    @shadow_file - Path to the shadow CIB
+    """
+    cmd = "{0} cluster cib {1}".format(module.params['pcs_util'], shadow_file)
+    rc, out, err = run_pcs_command(module, cmd)
+    if rc != 0:
+        pcs_fail_json(module, msg="Failed creating the shadow CIB {0}: {1}".format(shadow_file, err))
+    shutil.copyfile(shadow_file, shadow_cib_original(shadow_file))
+
+
+def shadow_cib_changed(shadow_file):
+    """
+    Returns true if the shadow CIB was modified since it was created
+    @shadow_file - Path to the shadow CIB
+    """
+    with open(shadow_file, 'r') as shadow, open(shadow_cib_original(shadow_file), 'r') as original:
+        return shadow.read() != original.read()
+
+
+def push_shadow_cib(module, shadow_file, wait=None):
+    """
+    Push the changes made to a shadow CIB to the cluster with a single cib-push.
+    Only the difference to the original copy is pushed so the cluster computes one transition.
+    @module - Ansible module object
+    @shadow_file - Path to the shadow CIB
+    @wait - Wait up to 'n' seconds for the changes to be applied
+    """
+    cmd = "{0} cluster cib-push {1} diff-against={2}".format(module.params['pcs_util'],
+                                                             shadow_file,
+                                                             shadow_cib_original(shadow_file))
+    if wait is not None:
+        cmd = "{0} --wait={1}".format(cmd, wait)
+    rc, out, err = run_pcs_command(module, cmd)
+    if rc != 0:
+        pcs_fail_json(module, msg="Failed pushing the shadow CIB {0}: {1}".format(shadow_file, err))
+    return True
+
+
+def remove_shadow_cib(shadow_file):
+    """
+    Remove a shadow CIB and its original copy
+    @shadow_file - Path to the shadow CIB
+    """
+    for f in [shadow_file, shadow_cib_original(shadow_file)]:
+        if file_exists(f):
+            os.remove(f)
+
+
+def run_cib_commands(module, cmds):
+    """
+    Run a batch of pcs commands that modify the CIB as a single change.
+    When there is more than one command they are run against a shadow CIB that is
+    pushed once at the end, so the cluster computes one transition for the batch.
+    When the file option is set the commands are only run against that file.
+    @module - Ansible module object
+    @cmds - pcs arguments without the pcs command, i.e. "resource delete myFS"
+    """
+    shadow_file = None
+    if module.params.get('file') is None and len(cmds) > 1:
+        shadow_file = os.path.join(module.tmpdir, "cib-batch.xml")
+        create_shadow_cib(module, shadow_file)
+    for cmd in cmds:
+        cmd = "{0} {1}".format(pcs_base_cmd(module, shadow_file), cmd)
+        rc, out, err = run_pcs_command(module, cmd)
+        if rc != 0:
+            if shadow_file is not None:
+                remove_shadow_cib(shadow_file)
+            pcs_fail_json(module, msg="Failed running {0}: {1}".format(cmd, err))
+    if shadow_file is not None:
+        push_shadow_cib(module, shadow_file)
+        remove_shadow_cib(shadow_file)
+    return True
+
+
+def simulate_cib_commands(module, cib_xml, cmds):
+    """
+    Run a batch of pcs commands against a copy of the CIB and return the output of
+    crm_simulate for the result, so check mode can report the transition the
+    cluster would run. Nothing is sent to the cluster.
+    Returns None unless the module is in check mode with the simulate option set
+    and there are commands to simulate.
+    @module - Ansible module object
+    @cib_xml - The current CIB, including the status section
+    @cmds - pcs arguments without the pcs command, as for run_cib_commands
+    """
+    if module.check_mode is False or not module.params.get('simulate') or len(cmds) == 0:
+        return None
+    shadow_file = os.path.join(module.tmpdir, "cib-simulate.xml")
+    with open(shadow_file, 'w') as f:
+        f.write(cib_xml)
+    try:
+        for cmd in cmds:
+            cmd = "{0} {1}".format(pcs_base_cmd(module, shadow_file), cmd)
+            rc, out, err = run_pcs_command(module, cmd)
+            if rc != 0:
+                pcs_fail_json(module, msg="Failed simulating {0}: {1}".format(cmd, err))
+        rc, out, err = run_pcs_command(module, "crm_simulate --simulate --xml-file {0}".format(shadow_file))
+        if rc != 0:
+            pcs_fail_json(module, msg="Failed simulating the transition: {0}".format(err))
+    finally:
+        remove_shadow_cib(shadow_file)
+    return out
+
+
+def get_crm_mon(module, data=None, required=True, use_cache=True):
+    """
+    Return the current cluster state as xml from a single crm_mon call.
+    Older versions of pacemaker only support --as-xml.
+    @module - Ansible module object
+    @data - crm_mon xml to use instead of querying the cluster, mainly for testing
+    @required - Fail when crm_mon fails, otherwise None is returned
+    @use_cache - Set to False to read the state again rather than reuse the last read
+    """
+    if data is not None:
+        return data.strip()
+    rc, out, err = run_pcs_command(module, "crm_mon --one-shot --output-as=xml", use_cache=use_cache)
+    if rc != 0:
+        rc, out, err = run_pcs_command(module, "crm_mon --one-shot --as-xml", use_cache=use_cache)
+    if rc != 0:
+        if required is False:
+            return None
+        pcs_fail_json(module, msg="Failed getting the cluster status: {0}".format(err))
+    return out
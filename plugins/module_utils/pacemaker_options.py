@@ -7,7 +7,13 @@ def pacemaker_common_argument_spec():
         pcs_util=dict(type='str', default="pcs"),
         file=dict(type='str', default=None),
         request_timeout=dict(type='int', default=60),
+        task_timeout=dict(type='int', default=None),
+        retries=dict(type='int', default=0),
         force=dict(type='bool', default=False),
         debug=dict(type='bool', default=False),
+        profile=dict(type='bool', default=False),
+        backend=dict(type='str', choices=["pcs", "pcsd", "disk"], default="pcs"),
+        validate_certs=dict(type='bool', default=True),
+        ca_path=dict(type='path', default=None),
     )
     return options
@@ -0,0 +1,300 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+import json
+import os
+import socket
+import threading
+import time
+
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.urls import Request, ConnectionError as UrlsConnectionError
+
+PCSD_PORT = 2224
+PCSD_CERT_FILE = "/var/lib/pcsd/pcsd.crt"
+
+
+class PcsdError(Exception):
+    pass
+
+
+def load_pcsd_tokens(json_data):
+    """
+    Return the tokens and ports from the pcsd tokens file as {node: {"token": token, "port": port}}.
+    Supports both the tokens file of pcs 0.9 and the known-hosts file of pcs 0.10+
+
+    {
+        "format_version": 1,
+        "data_version": 1,
+        "known_hosts": {
+            "node1": {
+                "dest_list": [{"addr": "node1", "port": 2224}],
+                "token": "bff36ce9-13f4-4589-943e-dfaea6c3d98c"
+            }
+        }
+    }
+    """
+    tokens = {}
+    if "known_hosts" in json_data:
+        for node, host in json_data["known_hosts"].items():
+            dest = (host.get("dest_list") or [{}])[0]
+            tokens[node] = {"token": host["token"],
+                            "addr": dest.get("addr", node),
+                            "port": int(dest.get("port", PCSD_PORT))}
+    else:
+        for node, token in json_data.get("tokens", {}).items():
+            tokens[node] = {"token": token,
+                            "addr": node,
+                            "port": int(json_data.get("ports", {}).get(node) or PCSD_PORT)}
+    return tokens
+
+
+def local_node_name(tokens):
+    """
+    Return the name of this host as it appears in the tokens, or None
+    """
+    for name in [socket.gethostname(), socket.getfqdn(), socket.gethostname().split('.')[0]]:
+        if name in tokens:
+            return name
+    return None
+
+
+class PcsdClient(object):
+    """
+    A minimal client for the pcsd remote API, authenticated with a token from the
+    pcsd tokens file.
+    The certificate of pcsd is verified unless validate_certs is false. pcsd uses a
+    self signed certificate by default, pass it, or the CA that signed it, as ca_path.
+    When timings is a list each request is recorded in it like the commands in
+    pacemaker_common.PCS_TIMINGS, with the HTTP status as rc.
+    """
+
+    def __init__(self, addr, token, port=PCSD_PORT, timeout=60, validate_certs=True, ca_path=None, use_ssl=True, timings=None):
+        self.addr = addr
+        self.token = token
+        self.port = port
+        self.timeout = timeout
+        self.use_ssl = use_ssl
+        self.validate_certs = validate_certs
+        self.ca_path = ca_path
+        self.timings = timings
+
+    def url(self, path):
+        host = "[{0}]".format(self.addr) if ":" in self.addr else self.addr  # IPv6 addresses
+        return "{0}://{1}:{2}{3}".format("https" if self.use_ssl else "http", host, self.port, path)
+
+    def request(self, method, path, params=None):
+        """
+        Send a request to pcsd and return the status and body.
+        """
+        body = None
+        headers = {}
+        if self.token is not None:
+            headers["Cookie"] = "token={0}".format(self.token)
+        if params is not None:
+            body = urlencode(params)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request = Request(headers=headers, timeout=self.timeout, validate_certs=self.validate_certs,
+                          ca_path=self.ca_path, follow_redirects='none')
+        status, out, error = None, "", None
+        start = time.time()
+        try:
+            response = request.open(method, self.url(path), data=body)
+            status, out = response.getcode(), response.read().decode('utf-8')
+        except HTTPError as excep:
+            status, out = excep.code, excep.read().decode('utf-8')
+        except (URLError, UrlsConnectionError, http_client.HTTPException, socket.error) as excep:
+            error = PcsdError("Request to pcsd on {0}:{1} failed: {2}".format(self.addr, self.port, excep))
+        if self.timings is not None:
+            self.timings.append({
+                "cmd": "{0} {1}".format(method, self.url(path)),
+                "seconds": round(time.time() - start, 3),
+                "rc": status,
+                "stdout_bytes": len(out),
+                "stderr_bytes": len(str(error or "")),
+                "attempt": 1,
+            })
+        if error is not None:
+            raise error
+        return status, out
+
+    def check_auth(self):
+        """
+        Returns true if the token is accepted by pcsd
+        """
+        status, body = self.request("GET", "/remote/check_auth")
+        return status == 200
+
+    def auth(self, username, password):
+        """
+        Authenticate to pcsd and return the new token, which is also used for
+        the following requests.
+        pcsd returns an empty body when the credentials are rejected.
+        """
+        status, body = self.request("POST", "/remote/auth", {"username": username, "password": password})
+        if status != 200 or body.strip() == "":
+            raise PcsdError("pcsd on {0} rejected the authentication of {1}".format(self.addr, username))
+        self.token = body.strip()
+        return self.token
+
+    def get_cib(self):
+        """
+        Return the CIB xml of the node
+        """
+        status, body = self.request("GET", "/remote/get_cib")
+        if status != 200:
+            raise PcsdError("pcsd on {0} returned {1} for get_cib: {2}".format(self.addr, status, body))
+        return body
+
+    def status(self):
+        """
+        Return the node status reported by pcsd as a dict
+        """
+        status, body = self.request("GET", "/remote/status?version=2")
+        if status != 200:
+            raise PcsdError("pcsd on {0} returned {1} for status: {2}".format(self.addr, status, body))
+        return json.loads(body)
+
+
+def auth_node(node, username, password, port=PCSD_PORT, timeout=60, **kwargs):
+    """
+    Authenticate to the pcsd on a single node.
+    Returns {"token": token, "port": port, "latency": seconds, "error": None}
+    with token None and the reason in error when the node could not be authenticated.
+    """
+    result = {"token": None, "port": port, "latency": None, "error": None}
+    client = PcsdClient(node, None, port, timeout, **kwargs)
+    start = time.time()
+    try:
+        result['token'] = client.auth(username, password)
+    except PcsdError as excep:
+        result['error'] = str(excep)
+    result['latency'] = round(time.time() - start, 3)
+    return result
+
+
+def check_node_token(node, token, port=PCSD_PORT, timeout=60, **kwargs):
+    """
+    Check whether the pcsd on a single node accepts a token.
+    Returns {"valid": valid, "port": port, "latency": seconds, "error": None}
+    valid is None, with the reason in error, when pcsd could not be reached.
+    """
+    result = {"valid": None, "port": port, "latency": None, "error": None}
+    client = PcsdClient(node, token, port, timeout, **kwargs)
+    start = time.time()
+    try:
+        result['valid'] = client.check_auth()
+    except PcsdError as excep:
+        result['error'] = str(excep)
+    result['latency'] = round(time.time() - start, 3)
+    return result
+
+
+def run_on_nodes(func, nodes, forks=10):
+    """
+    Call func(node) for the nodes concurrently, so a slow or unreachable node
+    only costs its own timeout.
+    An exception raised by func is raised again once the calls in progress have finished.
+    Returns {node: result}
+    @func - Function called with the node
+    @nodes - The nodes
+    @forks - Maximum number of nodes handled at the same time
+    """
+    results = {}
+    errors = []
+    queue = list(nodes)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if len(queue) == 0 or len(errors) > 0:
+                    return
+                node = queue.pop(0)
+            try:
+                results[node] = func(node)
+            except Exception as excep:
+                errors.append(excep)
+
+    threads = [threading.Thread(target=worker) for i in range(min(forks, len(nodes)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if len(errors) > 0:
+        raise errors[0]
+    return results
+
+
+def auth_nodes(nodes, username, password, port=PCSD_PORT, timeout=60, forks=10, **kwargs):
+    """
+    Authenticate to pcsd on the nodes concurrently.
+    Returns {node: result} with the result of auth_node for each node.
+    @nodes - The nodes to authenticate to
+    @port - pcsd port
+    @timeout - Timeout in seconds for each node
+    @forks - Maximum number of nodes authenticated at the same time
+    """
+    return run_on_nodes(lambda node: auth_node(node, username, password, port, timeout, **kwargs), nodes, forks)
+
+
+def check_tokens(tokens, timeout=60, forks=10, **kwargs):
+    """
+    Check the stored tokens against the pcsd of each node concurrently.
+    Returns {node: result} with the result of check_node_token for each node.
+    @tokens - dict {node: {"token": token, "port": port}}
+    @timeout - Timeout in seconds for each node
+    @forks - Maximum number of nodes checked at the same time
+    """
+    return run_on_nodes(lambda node: check_node_token(node, tokens[node]['token'], tokens[node]['port'], timeout, **kwargs),
+                        list(tokens.keys()), forks)
+
+
+def read_pcsd_tokens(tokens_file):
+    """
+    Return the tokens for the user, as returned by load_pcsd_tokens, preferring the
+    known-hosts file of pcs 0.10+ that lives alongside the tokens file.
+    Returns an empty dict when neither file exists.
+    @tokens_file - Path to the pcsd tokens file, see pacemaker_common.pcsd_tokens_file
+    """
+    tokens_file = os.path.expanduser(tokens_file)
+    for f in [os.path.join(os.path.dirname(tokens_file), "known-hosts"), tokens_file]:
+        if os.path.exists(f):
+            with open(f, 'r') as json_file:
+                return load_pcsd_tokens(json.load(json_file))
+    return {}
+
+
+def pcsd_get_cib(module, tokens_file, timings=None, cert_file=PCSD_CERT_FILE):
+    """
+    Return the CIB xml from the local pcsd, or None when the pcsd backend is
+    not enabled or pcsd can't be used, so the caller falls back to the command line.
+    The reason pcsd could not be used is returned as a warning.
+    A CIB file set with the file option is always read from disk, and with
+    the local option the CIB is read by cibadmin without going through pcsd.
+    Without the ca_path option the certificate of pcsd is verified against the
+    self signed certificate pcsd created on this node, when it exists.
+    @module - Ansible module object
+    @tokens_file - Path to the pcsd tokens file, see pacemaker_common.pcsd_tokens_file
+    @timings - The list the request is recorded in when the profile option is set, see pacemaker_common.PCS_TIMINGS
+    @cert_file - Path to the certificate of the local pcsd
+    """
+    if module.params.get('backend') != "pcsd" or module.params.get('file') is not None or module.params.get('local'):
+        return None
+    tokens = read_pcsd_tokens(tokens_file)
+    node = local_node_name(tokens)
+    if node is None:
+        module.warn("No pcsd token for this node, falling back to the command line")
+        return None
+    ca_path = module.params.get('ca_path')
+    if ca_path is None and os.path.exists(cert_file):
+        ca_path = cert_file
+    client = PcsdClient(tokens[node]['addr'], tokens[node]['token'], tokens[node]['port'],
+                        module.params['request_timeout'], validate_certs=module.params.get('validate_certs', True),
+                        ca_path=ca_path, timings=timings if module.params.get('profile') else None)
+    try:
+        return client.get_cib()
+    except PcsdError as excep:
+        module.warn("{0}, falling back to the command line".format(excep))
+        return None
@@ -20,8 +20,8 @@ description:
   - Using the local parameter only authenticates the local node but by default all nodes are authenticated to each other.
   - Using the force parameter forces re-authentication to occur.
   - Supports removal of hosts from the pcsd tokens file. We simply remove the data. No other action is performed.
-  - It's possible the module could be non-atomic when adding new and removing members at the same time.\
-    Perform these actions individually to minimise that risk.
+  - Updates made by the module to the tokens file are locked and atomic, so concurrent runs do not corrupt it.
+  - Without I(parallel=true) the tokens are added by pcs, so adding new and removing members at the same time is not a single update.
 
 author: Rhys Campbell (@rhysmeister)
 version_added: "1.0.0"
@@ -75,6 +75,34 @@ options:
       - Only perform auth on the local node.
     type: bool
     default: false
+  parallel:
+    description:
+      - Authenticate to pcsd on each member concurrently instead of with a single pcs cluster auth command.
+      - Each member has its own timeout of I(request_timeout) seconds, so a slow or unreachable member does not hold up the others.
+      - The tokens are obtained from pcsd directly and the tokens file is written once when all members have been authenticated.
+        The known-hosts file next to it is written instead when it exists or pcs is 0.10 or later, as those versions only read it.
+      - Only the tokens file of this host is updated, as with I(local=true).
+      - The latency and result of each member is returned in I(nodes).
+      - The certificate of each pcsd is verified, see I(validate_certs) and I(ca_path).
+    type: bool
+    default: false
+    version_added: "1.1.0"
+  forks:
+    description:
+      - The maximum number of members authenticated, or whose tokens are validated, at the same time.
+    type: int
+    default: 10
+    version_added: "1.1.0"
+  validate_tokens:
+    description:
+      - Check the stored token of each member against its pcsd, concurrently, and authenticate the members whose token is rejected.
+      - Without it only members missing from the tokens file are authenticated.
+      - A stale token is otherwise only replaced with I(force=true), which authenticates all the members.
+      - Members whose pcsd can't be reached keep their token and a warning is returned.
+      - The result of each check is returned in I(tokens).
+    type: bool
+    default: false
+    version_added: "1.1.0"
 
 notes:
     - Requires the pcs utility on the remote host.
@@ -98,6 +126,16 @@ EXAMPLES = r'''
     username: "hacluster"
     password: "MySecretPassword2023!@$"
     state: "absent"
+
+- name: Authenticate to all the members concurrently
+  community.pacemaker.pacemaker_authentication:
+    members: "{{ groups['pacemaker'] }}"
+    username: "hacluster"
+    password: "MySecretPassword2023!@$"
+    parallel: true
+    validate_tokens: true
+    forks: 16
+    request_timeout: 10
 '''
 
 RETURN = r'''
@@ -109,6 +147,22 @@ msg:
   description: Status message.
   returned: always
   type: str
+nodes:
+  description: The result of authenticating each member when I(parallel=true). The token is not returned.
+  returned: when parallel is true and members were authenticated
+  type: dict
+  sample: {"node1": {"port": 2224, "latency": 0.212, "error": null}}
+tokens:
+  description: The result of checking the stored token of each member when I(validate_tokens=true).
+  returned: when validate_tokens is true
+  type: dict
+  sample: {"node1": {"valid": true, "port": 2224, "latency": 0.034, "error": null}}
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
@@ -123,14 +177,114 @@ from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_comm
     get_json_file,
     valid_pcsd_tokens_data,
     pcsd_tokens_file,
-    build_cluster_auth_cmd
+    pcsd_known_hosts_file,
+    update_pcsd_tokens_file,
+    get_pcs_capabilities,
+    pcs_version_at_least,
+    build_cluster_auth_cmd,
+    run_pcs_command,
+    pcs_exit_json,
+    pcs_fail_json,
+    PCS_TIMINGS
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    PCSD_PORT,
+    auth_nodes,
+    check_tokens,
+    load_pcsd_tokens,
+    read_pcsd_tokens
 )
 
 import os
-import json
 import traceback
 
 
+def stale_members(module, tokens, members, result):
+    """
+    Check the stored tokens of the members against their pcsd concurrently when
+    validate_tokens is true and return the members whose token was rejected.
+    Members whose pcsd can't be reached are left alone.
+    The result of each check is added to the module result as tokens.
+    @module - Ansible module object
+    @tokens - The stored tokens, as returned by load_pcsd_tokens
+    @members - members without a port
+    @result - The module result
+    """
+    if module.params["validate_tokens"] is False:
+        return []
+    tokens = dict((m, tokens[m]) for m in members if m in tokens)
+    checks = check_tokens(tokens, module.params["request_timeout"], module.params["forks"],
+                          validate_certs=module.params["validate_certs"], ca_path=module.params["ca_path"],
+                          timings=PCS_TIMINGS if module.params["profile"] else None)
+    for m, check in checks.items():
+        if check["valid"] is None:
+            module.warn("Could not check the token of {0}: {1}".format(m, check["error"]))
+    result["tokens"] = checks
+    return sorted(m for m, check in checks.items() if check["valid"] is False)
+
+
+def parallel_auth(module, tokens_file, pcsd_file_exists, members, port):
+    """
+    Authenticate to the members concurrently and update the tokens file once.
+    Returns the module result.
+    @module - Ansible module object
+    @tokens_file - Path to the pcsd tokens file
+    @pcsd_file_exists - Whether the tokens file exists
+    @members - members without a port
+    @port - pcsd port, if not default
+    """
+    result = {}
+    if module.params["password"] is None:
+        pcs_fail_json(module, msg="password parameter is required when parallel is true")
+    members_to_add = members
+    members_to_remove = []
+    known_hosts = file_exists(pcsd_known_hosts_file(tokens_file))
+    if (known_hosts or pcsd_file_exists) and module.params["force"] is False:
+        if known_hosts:
+            tokens = read_pcsd_tokens(tokens_file)
+        else:
+            tokens_data = get_json_file(tokens_file)
+            if not valid_pcsd_tokens_data(tokens_data):
+                pcs_fail_json(module, msg="The pcsd token file is not valid {0}".format(tokens_file))
+            tokens = load_pcsd_tokens(tokens_data)
+        members_to_add = sorted(set(members) - set(tokens.keys()))
+        members_to_add += stale_members(module, tokens, members, result)
+        members_to_remove = sorted(set(tokens.keys()) - set(members))
+    if len(members_to_add) == 0 and len(members_to_remove) == 0:
+        result["changed"] = False
+        result["msg"] = "All members have tokens in {0}".format(pcsd_known_hosts_file(tokens_file) if known_hosts else tokens_file)
+        return result
+    if module.check_mode is False:
+        nodes = auth_nodes(members_to_add,
+                           module.params["username"],
+                           module.params["password"],
+                           int(port or PCSD_PORT),
+                           module.params["request_timeout"],
+                           module.params["forks"],
+                           validate_certs=module.params["validate_certs"],
+                           ca_path=module.params["ca_path"],
+                           timings=PCS_TIMINGS if module.params["profile"] else None)
+        tokens = dict((node, r) for node, r in nodes.items() if r["error"] is None)
+        if not known_hosts and not pcsd_file_exists:
+            known_hosts = pcs_version_at_least(get_pcs_capabilities(module), [0, 10])  # pcs 0.10+ only reads known-hosts
+        update_pcsd_tokens_file(tokens_file, tokens, members_to_remove, known_hosts)
+        for r in nodes.values():
+            r.pop("token")
+        result["nodes"] = nodes
+        failed = sorted(node for node, r in nodes.items() if r["error"] is not None)
+        if len(failed) > 0:
+            pcs_fail_json(module, msg="The following members could not be authenticated {0}".format(' '.join(failed)), **result)
+    result["changed"] = True
+    msg = []
+    if len(members_to_add) > 0:
+        msg.append("The following members were authenticated {0}".format(' '.join(sorted(members_to_add))))
+    if len(members_to_remove) > 0:
+        msg.append("The following members were removed {0}".format(' '.join(members_to_remove)))
+    result["msg"] = ", ".join(msg)
+    return result
+
+
 def main():
     argument_spec = pacemaker_common_argument_spec()
     argument_spec.update(
@@ -140,6 +294,9 @@ def main():
         username=dict(type='str', default="hacluster", aliases=["user", "u"]),
         password=dict(type='str', aliases=["p"], no_log=True),
         local=dict(type='bool', default=False),
+        parallel=dict(type='bool', default=False),
+        forks=dict(type='int', default=10),
+        validate_tokens=dict(type='bool', default=False),
     )
     module = AnsibleModule(
         argument_spec=argument_spec,
@@ -149,7 +306,7 @@ def main():
     result = {}
     state = module.params["state"]
     if state == "present" and module.params['members'] is None:
-        module.fail_json(msg="members parameter is required when state is present")
+        pcs_fail_json(module, msg="members parameter is required when state is present")
     tokens_file = module.params["pcsd_tokens_file"]
     if tokens_file is None:
         tokens_file = pcsd_tokens_file()  # Set to default root or user specific
@@ -161,11 +318,13 @@ def main():
             port = None
             if len(module.params['members']) > 0 and ':' in module.params['members'][0]:
                 port = module.params['members'][0].split(':')[1]
-            if pcsd_file_exists:
+            if module.params["parallel"]:
+                result = parallel_auth(module, tokens_file, pcsd_file_exists, members_without_port, port)
+            elif pcsd_file_exists:
                 if module.params["force"]:  # auth everything regardless of current state
                     cmd = build_cluster_auth_cmd(module, members_without_port, port)
                     if module.check_mode is False:
-                        (rc, out, err) = module.run_command(cmd)
+                        (rc, out, err) = run_pcs_command(module, cmd)
                     if rc == 0 or module.check_mode is True:
                         result["changed"] = True
                         result["msg"] = "All provided members were authenticated"
@@ -173,32 +332,27 @@ def main():
                         if module.params["debug"] is True:
                             result["err"] = err
                             result["out"] = out
-                        module.fail_json(msg="An error was encountered rc {0}".format(rc), **result)
+                        pcs_fail_json(module, msg="An error was encountered rc {0}".format(rc), **result)
                 else:
                     tokens_data = get_json_file(tokens_file)
                     if valid_pcsd_tokens_data(tokens_data):
-                        if sorted(members_without_port) == sorted(tokens_data["tokens"].keys()):
+                        stale = stale_members(module, load_pcsd_tokens(tokens_data), members_without_port, result)
+                        if sorted(members_without_port) == sorted(tokens_data["tokens"].keys()) and len(stale) == 0:
                             result["changed"] = False
                             result["msg"] = "All members have tokens in {0}".format(tokens_file)
                         else:
-                            members_to_add = list(set(members_without_port) - set(tokens_data["tokens"].keys()))
+                            members_to_add = list(set(members_without_port) - set(tokens_data["tokens"].keys())) + stale
                             members_to_remove = list(set(tokens_data["tokens"].keys()) - set(members_without_port))
                             cmd = build_cluster_auth_cmd(module, members_to_add, port)
                             if len(members_to_add) > 0:
                                 if module.check_mode is False:
-                                    (rc, out, err) = module.run_command(cmd)
+                                    (rc, out, err) = run_pcs_command(module, cmd)
                                 if rc == 0 or module.check_mode is True:
                                     result["changed"] = True
                                     result["msg"] = "The following members were authenticated {0}".format(' '.join(sorted(members_to_add)))
-                            # Next bit to remove keys from members and ports dicts, this could be non-atomic, rethink later
-                            json_data = get_json_file(tokens_file)  # get new data
                             if len(members_to_remove) > 0:
                                 if module.check_mode is False:
-                                    for m in members_to_remove:
-                                        json_data["tokens"].pop(m)
-                                        json_data["ports"].pop(m)
-                                    with open(tokens_file, 'w') as f:
-                                        f.write(json.dumps(json_data))
+                                    update_pcsd_tokens_file(tokens_file, {}, members_to_remove, known_hosts=False)
                                 result["changed"] = True
                                 prepend_msg = ""
                                 if 'msg' in result:
@@ -207,11 +361,11 @@ def main():
                                                                                                       prepend_msg,
                                                                                                       ' '.join(sorted(members_to_remove)))
                     else:
-                        module.fail_json(msg="The pcsd token file is not valid {0}".format(tokens_file))
+                        pcs_fail_json(module, msg="The pcsd token file is not valid {0}".format(tokens_file))
             else:
                 cmd = build_cluster_auth_cmd(module, members_without_port, port)
                 if module.check_mode is False:
-                    (rc, out, err) = module.run_command(cmd)
+                    (rc, out, err) = run_pcs_command(module, cmd)
                 if rc == 0 or module.check_mode is True:
                     result["changed"] = True
                     result["msg"] = "All provided members were authenticated"
@@ -219,7 +373,7 @@ def main():
                     if module.params["debug"] is True:
                         result["err"] = err
                         result["out"] = out
-                    module.fail_json(msg="An error was encountered rc {0}".format(rc), **result)
+                    pcs_fail_json(module, msg="An error was encountered rc {0}".format(rc), **result)
         elif state == "absent":
             if pcsd_file_exists:
                 if module.check_mode is False:
@@ -232,9 +386,9 @@ def main():
     except Exception as excep:
         if module.params["debug"]:
             excep = traceback.format_exc()
-        module.fail_json(msg='Error: %s' % to_native(excep))
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
 
-    module.exit_json(**result)
+    pcs_exit_json(module, **result)
 
 
 if __name__ == '__main__':
@@ -26,8 +26,14 @@ extends_documentation_fragment:
 options:
   members:
     description:
-      - Hosts in the .
+      - Hosts in the cluster.
       - Required when I(state=present).
+      - Once the cluster is set up this is the full membership, with I(state=started) the nodes missing from the
+        corosync_file nodelist are added with pcs cluster node add, and with I(manage_membership) the nodes that are
+        not members are removed.
+      - A member matches a node by its name or addresses, a short name matches the fully qualified name, or
+        when both resolve to the same address.
+      - Corosync is then reloaded once.
     type: list
     elements: str
     aliases:
@@ -44,6 +50,7 @@ options:
   corosync_file:
     description:
       - Path to the corosync configuration file.
+      - When it exists the cluster name is checked against it and its settings are returned in I(corosync).
     type: str
     default: /etc/corosync/corosync.conf
   name:
@@ -65,6 +72,7 @@ options:
   wait:
     description:
       - Wait up to 'n' seconds for the nodes to start
+      - With I(batch_size), the time each batch may take to be ready, 300 seconds by default.
     type: int
     aliases:
       - timeout
@@ -74,9 +82,39 @@ options:
       - Only perform auth on the local node.
     type: bool
     default: false
+  manage_membership:
+    description:
+      - Remove the nodes of the cluster that are not in I(members).
+      - Without it those nodes are left in the cluster with a warning, nodes are only added.
+      - The node the module runs on is never removed, run the task on another node to remove it.
+    type: bool
+    default: false
+    version_added: "1.1.0"
+  batch_size:
+    description:
+      - Start or stop the nodes in batches of this many nodes, with pcs cluster start or stop <nodes>.
+      - The nodes of a batch are started or stopped in parallel by pcs.
+      - After each batch the module waits, up to I(wait) seconds, until the nodes are online, and the cluster is quorate
+        once a majority of the nodes is online, or until the nodes are offline when stopping, before the next batch.
+      - With I(state=started) the nodes of a configured cluster that are not online are started.
+        Without I(batch_size), I(state=started) does not start the nodes of a configured cluster.
+      - Without I(batch_size), I(state=stopped) stops all the nodes with pcs cluster stop --all.
+      - Must be at least 1.
+    type: int
+    version_added: "1.1.0"
+  order:
+    description:
+      - The nodes to start or stop first, in this order, when I(batch_size) is set.
+      - The other nodes follow in the order of the corosync_file nodelist.
+      - The readiness of a batch is read with crm_mon on this node, so this node is started in the first batch and stopped in the last.
+    type: list
+    elements: str
+    version_added: "1.1.0"
 
 notes:
     - Requires the pcs utility on the remote host.
+    - Which nodes are online is read with crm_mon on this node. When pacemaker is not running on this node with I(state=started)
+      and I(batch_size), this node is started first, and once it is online only the nodes crm_mon reports as offline are started.
 '''
 
 EXAMPLES = r'''
@@ -89,6 +127,37 @@ EXAMPLES = r'''
     state: "started"
     enabled: yes
     name: AMZ
+
+- name: Add amazonlinux4 to the running cluster
+  community.pacemaker.pacemaker_cluster:
+    members:
+      - amazonlinux1.pacemaker
+      - amazonlinux2.pacemaker
+      - amazonlinux3.pacemaker
+      - amazonlinux4.pacemaker
+    state: "started"
+    enabled: yes
+    name: AMZ
+
+- name: Remove amazonlinux4 from the running cluster
+  community.pacemaker.pacemaker_cluster:
+    members:
+      - amazonlinux1.pacemaker
+      - amazonlinux2.pacemaker
+      - amazonlinux3.pacemaker
+    manage_membership: true
+    state: "started"
+    name: AMZ
+
+- name: Start the nodes four at a time, the quorum nodes first
+  community.pacemaker.pacemaker_cluster:
+    name: AMZ
+    state: started
+    batch_size: 4
+    order:
+      - amazonlinux1.pacemaker
+      - amazonlinux2.pacemaker
+    wait: 120
 '''
 
 RETURN = r'''
@@ -100,6 +169,49 @@ msg:
   description: Status message.
   returned: always
   type: str
+corosync:
+  description:
+    - The settings parsed from I(corosync_file), the cluster name, transport, totem timings, interfaces, nodes, quorum and logging.
+    - Each node has its name, nodeid and ring addresses.
+  returned: when corosync_file exists
+  type: dict
+  sample: {"cluster_name": "AMZ", "version": "2", "transport": "knet", "timings": {"token": 3000},
+           "interfaces": [], "nodes": [{"name": "amazonlinux1.pacemaker", "nodeid": 1, "addrs": ["amazonlinux1.pacemaker"]}],
+           "quorum": {"provider": "corosync_votequorum"}, "logging": {"to_syslog": "yes"}}
+status:
+  description:
+    - The status of the cluster on this node, from the systemd units, corosync.conf and crm_mon, without contacting other nodes.
+    - The cluster is configured when corosync_file exists, started when corosync and pacemaker are active and enabled when both start at boot.
+    - quorate, dc and online_nodes come from crm_mon and are only known when pacemaker is running.
+  returned: on success
+  type: dict
+  sample: {"configured": true, "started": true, "enabled": true, "cluster_name": "AMZ",
+           "services": {"corosync": {"active": true, "enabled": true}, "pacemaker": {"active": true, "enabled": true},
+                        "pcsd": {"active": true, "enabled": true}},
+           "nodes": ["amazonlinux1.pacemaker", "amazonlinux2.pacemaker"], "online_nodes": ["amazonlinux1.pacemaker", "amazonlinux2.pacemaker"],
+           "quorate": true, "dc": "amazonlinux1.pacemaker"}
+batches:
+  description:
+    - The batches of nodes started or stopped, with the seconds until the batch was ready.
+    - time_to_quorum is the number of seconds until crm_mon reported quorum after starting the batch, null if it was not seen.
+  returned: when nodes were started or stopped in batches, or this node was started first as pacemaker was not running on it
+  type: list
+  elements: dict
+  sample: [{"action": "start", "nodes": ["amazonlinux1.pacemaker", "amazonlinux2.pacemaker"], "seconds": 12.4, "time_to_quorum": 9.1,
+            "quorate": true}]
+members_diff:
+  description:
+    - The members missing from corosync_file and the nodes in it that are not members.
+    - With I(state=started) these nodes are added, and removed with I(manage_membership).
+  returned: when corosync_file exists and members is provided
+  type: dict
+  sample: {"add": ["amazonlinux3.pacemaker"], "remove": []}
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
@@ -112,11 +224,125 @@ from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_opti
 from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
     file_exists,
     build_cluster_setup_cmd,
-    get_cluster_name
+    build_cluster_node_cmds,
+    load_corosync_conf,
+    corosync_cluster_info,
+    corosync_nodes_diff,
+    get_cluster_services,
+    get_crm_mon,
+    get_pcs_capabilities,
+    local_corosync_node,
+    online_corosync_nodes,
+    node_batches,
+    run_pcs_command,
+    pcs_exit_json,
+    pcs_fail_json
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    build_cluster_status,
+    parse_crm_mon
 )
 
+import time
 import traceback
 
+# Seconds a batch may take to be ready when wait is not set
+BATCH_WAIT = 300
+
+# First and maximum interval between the readiness checks, in seconds
+POLL_INTERVAL = 1
+POLL_MAX_INTERVAL = 10
+
+
+def update_membership(module, diff):
+    """
+    Add and remove the nodes in diff, then reload corosync once so every node
+    runs with the final nodelist.
+    @diff - As returned by corosync_nodes_diff
+    """
+    for cmd in build_cluster_node_cmds(module, diff, get_pcs_capabilities(module)):
+        rc, out, err = run_pcs_command(module, cmd)
+        if rc != 0:
+            pcs_fail_json(module, msg="Failed running {0}: {1}".format(cmd, err), members_diff=diff)
+    rc, out, err = run_pcs_command(module, "{0} cluster reload corosync".format(module.params['pcs_util']))
+    if rc != 0:
+        pcs_fail_json(module, msg="Failed reloading corosync: {0}".format(err), members_diff=diff)
+
+
+def wait_for_batch(module, nodes, online, timeout, corosync):
+    """
+    Poll crm_mon on this node, with an increasing interval, until the nodes are online,
+    or until the nodes are offline.
+    Once a majority of the nodes is online the cluster must be quorate too, the first
+    batches of a rolling start may not have enough votes for quorum on their own.
+    When this node is stopped crm_mon fails and the nodes are considered offline.
+    Returns {"seconds": seconds, "time_to_quorum": seconds or None, "quorate": bool, "ready": bool}
+    @nodes - The nodes of the batch
+    @online - Wait for the nodes to be online, otherwise offline
+    @timeout - Maximum number of seconds to wait
+    @corosync - As returned by corosync_cluster_info, the nodes are matched to crm_mon with online_corosync_nodes
+    """
+    cluster_size = len(corosync['nodes'])
+    start = time.time()
+    interval = POLL_INTERVAL
+    result = {"seconds": None, "time_to_quorum": None, "quorate": False, "ready": False}
+    while True:
+        crm_mon = get_crm_mon(module, required=False, use_cache=False)
+        elapsed = time.time() - start
+        state = parse_crm_mon(crm_mon) if crm_mon is not None else None
+        result['quorate'] = state is not None and state['quorate']
+        if result['quorate'] and result['time_to_quorum'] is None:
+            result['time_to_quorum'] = round(elapsed, 3)
+        online_nodes = online_corosync_nodes(corosync, state['nodes']) if state is not None else []
+        if online:
+            result['ready'] = state is not None and all(n in online_nodes for n in nodes)
+            if result['ready'] and len(online_nodes) * 2 > cluster_size:
+                result['ready'] = result['quorate']
+        else:
+            result['ready'] = not any(n in online_nodes for n in nodes)
+        if result['ready'] or elapsed + interval > timeout:
+            result['seconds'] = round(elapsed, 3)
+            return result
+        time.sleep(interval)
+        interval = min(interval * 2, POLL_MAX_INTERVAL)
+
+
+def rolling_action(module, action, nodes, local_node, corosync):
+    """
+    Start or stop the nodes in batches, see node_batches, waiting for each batch
+    to be ready before the next one.
+    Fails, with the batches done so far, when a batch is not ready in time, and before
+    any batch when this node is not in the nodelist as the batches are checked with crm_mon here.
+    Returns a list with the nodes and timings of each batch.
+    @action - start or stop
+    @nodes - The nodes to start or stop
+    @local_node - The name of this node, started first and stopped last
+    @corosync - As returned by corosync_cluster_info
+    """
+    if local_node is None:
+        pcs_fail_json(module, msg="This host is not in the nodelist of {0}, unable to check the batches with crm_mon".format(module.params['corosync_file']))
+    batch_size = module.params['batch_size']
+    order = [n for n in module.params['order'] or [] if n != local_node]
+    if local_node not in nodes:
+        batches = node_batches(nodes, batch_size, order)
+    elif action == "start":
+        batches = node_batches(nodes, batch_size, [local_node] + order)
+    else:
+        batches = node_batches([n for n in nodes if n != local_node], batch_size, order) + [[local_node]]
+    results = []
+    for batch in batches:
+        cmd = "{0} cluster {1} {2}".format(module.params['pcs_util'], action, " ".join(batch))
+        rc, out, err = run_pcs_command(module, cmd)
+        if rc != 0:
+            pcs_fail_json(module, msg="Failed to {0} {1}: {2}".format(action, ", ".join(batch), err), batches=results)
+        ready = wait_for_batch(module, batch, action == "start", module.params['wait'] or BATCH_WAIT, corosync)
+        results.append(dict(ready, action=action, nodes=batch))
+        if ready['ready'] is False:
+            pcs_fail_json(module, msg="Timed out after {0} seconds waiting for {1} to {2}".format(ready['seconds'], ", ".join(batch), action),
+                          batches=results)
+    return results
+
 
 def main():
     argument_spec = pacemaker_common_argument_spec()
@@ -128,6 +354,9 @@ def main():
         enabled=dict(type='bool', default=False),
         wait=dict(type='int', default=None, aliases=["timeout"]),
         local=dict(type='bool', default=False),
+        manage_membership=dict(type='bool', default=False),
+        batch_size=dict(type='int'),
+        order=dict(type='list', elements='str'),
     )
     module = AnsibleModule(
         argument_spec=argument_spec,
@@ -138,60 +367,97 @@ def main():
     state = module.params["state"]
     corosync_file = module.params["corosync_file"]
     if state == "present" and module.params['members'] is None:
-        module.fail_json(msg="members parameter is required when state is present")
+        pcs_fail_json(module, msg="members parameter is required when state is present")
+    if module.params['batch_size'] is not None and module.params['batch_size'] < 1:
+        pcs_fail_json(module, msg="batch_size must be at least 1, got {0}".format(module.params['batch_size']))
 
     try:
         result = {}
         rc, out, err = None, None, None
-        corosync_file_exists = file_exists(corosync_file)
-        if corosync_file_exists:
-            current_cluster_name = get_cluster_name()
-            if current_cluster_name != module.params["name"]:
-                module.fail_json(msg="The expected cluster name is {0} but {1} was found".format(module.params['name'], current_cluster_name))
-        rc, out, err = module.run_command("pcs status")
-        cluster_started = None
-        cluster_enabled = None
-
-        if rc == 0:  # assume cluster is started
-            cluster_started = True
-            if "corosync: active/enabled" in out\
-                    and "pacemaker: active/enabled" in out\
-                    and "pcsd: active/enabled" in out:
-                cluster_enabled = True
-            else:
-                cluster_enabled = False
-        else:
-            cluster_started = False
-
-        pcsd_status = None
-        rc, out, err = module.run_command("pcs cluster status")
-        if rc == 0:
-            pcsd_status = True
-        else:
-            pcsd_status = False
+        corosync = None
+        if file_exists(corosync_file):
+            corosync = corosync_cluster_info(load_corosync_conf(corosync_file))
+            result["corosync"] = corosync
+            if corosync["cluster_name"] != module.params["name"]:
+                pcs_fail_json(module, msg="The expected cluster name is {0} but {1} was found".format(module.params['name'], corosync["cluster_name"]))
+            if module.params['members'] is not None:
+                result["members_diff"] = corosync_nodes_diff(corosync, module.params['members'])
+        # A single local probe, pcs status contacts every node and can hang on a degraded cluster
+        services = get_cluster_services(module)
+        crm_mon = get_crm_mon(module, required=False) if services['pacemaker']['active'] else None
+        status = build_cluster_status(services, corosync, crm_mon)
+        result["status"] = status
 
         if state == "started":
-            if pcsd_status:  # nodes are configured
-                pass
+            if status['configured']:
+                msgs = []
+                diff = result.get("members_diff", {"add": [], "remove": []})
+                remove = diff['remove']
+                if len(remove) > 0:
+                    if len(remove) == len(status['nodes']):
+                        pcs_fail_json(module, msg="None of the members are nodes of the cluster {0}, refusing to remove every node".format(
+                            module.params['name']), **result)
+                    if not module.params['manage_membership']:
+                        module.warn("{0} not in members, set manage_membership to remove them".format(", ".join(remove)))
+                        remove = []
+                    else:
+                        local_node = local_corosync_node(corosync)
+                        if local_node is None:
+                            pcs_fail_json(module, msg="This host is not in the nodelist of {0}, refusing to remove nodes".format(corosync_file), **result)
+                        if local_node in remove:
+                            pcs_fail_json(module, msg="Refusing to remove {0}, the node this task runs on, run it on another node".format(local_node),
+                                          **result)
+                if len(diff['add']) + len(remove) > 0:
+                    if module.check_mode is False:
+                        update_membership(module, {"add": diff['add'], "remove": remove})
+                    if len(diff['add']) > 0:
+                        msgs.append("Added {0}".format(", ".join(diff['add'])))
+                    if len(remove) > 0:
+                        msgs.append("Removed {0}".format(", ".join(remove)))
+                started = []
+                if module.params['batch_size']:  # Only a rolling start starts the nodes of a configured cluster
+                    online = online_corosync_nodes(corosync, parse_crm_mon(crm_mon)['nodes'] if crm_mon is not None else {})
+                    nodes = [n for n in status['nodes'] if n not in online and n not in remove]
+                    if len(nodes) > 0 and crm_mon is None and module.check_mode is False:
+                        # Which of the other nodes are online is only known once this node runs pacemaker
+                        local_node = local_corosync_node(corosync)
+                        result["batches"] = rolling_action(module, "start", [local_node], local_node, corosync)
+                        started.append(local_node)
+                        crm_mon = get_crm_mon(module, required=False, use_cache=False)
+                        online = online_corosync_nodes(corosync, parse_crm_mon(crm_mon)['nodes'] if crm_mon is not None else {})
+                        nodes = [n for n in nodes if n != local_node and n not in online]
+                    if len(nodes) > 0:
+                        if module.check_mode is False:
+                            batches = rolling_action(module, "start", nodes, local_corosync_node(corosync), corosync)
+                            result["batches"] = result.get("batches", []) + batches
+                        started.extend(nodes)
+                if len(started) > 0:
+                    msgs.append("Started {0}".format(", ".join(started)))
+                result["changed"] = len(msgs) > 0
+                result["msg"] = "; ".join(msgs) or "All the nodes of the cluster {0} are online".format(module.params['name'])
             else:
                 setup_cluster_cmd = build_cluster_setup_cmd(module, module.params['members'])
                 if module.params["debug"]:
                     result["cmd"] = setup_cluster_cmd
                 if module.check_mode is False:
-                    rc, out, err = module.run_command(setup_cluster_cmd)
-                if rc != 0:
-                    if module.params['debug']:
-                        result["err"] = err
-                        result["out"] = out
-                    module.fail_json(msg="Failed creating cluster rc = {0}".format(rc), **result)
+                    rc, out, err = run_pcs_command(module, setup_cluster_cmd)
+                    if rc != 0:
+                        if module.params['debug']:
+                            result["err"] = err
+                            result["out"] = out
+                        pcs_fail_json(module, msg="Failed creating cluster rc = {0}".format(rc), **result)
                 result["changed"] = True
                 result["msg"] = "The cluster {0} was created successfully".format(module.params['name'])
         elif state == "stopped":
-            if cluster_started:
+            if services['corosync']['active'] or services['pacemaker']['active']:
                 if module.check_mode is False:
-                    rc, out, err = module.run_command("{0} cluster stop --all".format(module.params['pcs_util']))
-                if rc != 0:
-                    module.fail_json(msg="Failed stopping cluster rc = {0}".format(rc))
+                    if module.params['batch_size'] and status['configured']:
+                        online = online_corosync_nodes(corosync, parse_crm_mon(crm_mon)['nodes'] if crm_mon is not None else {})
+                        result["batches"] = rolling_action(module, "stop", online or status['nodes'], local_corosync_node(corosync), corosync)
+                    else:
+                        rc, out, err = run_pcs_command(module, "{0} cluster stop --all".format(module.params['pcs_util']))
+                        if rc != 0:
+                            pcs_fail_json(module, msg="Failed stopping cluster rc = {0}".format(rc))
                 result["changed"] = True
                 result["msg"] = "Successfully stopped cluster"
             else:
@@ -209,9 +475,9 @@ def main():
     except Exception as excep:
         if module.params["debug"]:
             excep = traceback.format_exc()
-        module.fail_json(msg='Error: %s' % to_native(excep))
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
 
-    module.exit_json(**result)
+    pcs_exit_json(module, **result)
 
 
 if __name__ == '__main__':
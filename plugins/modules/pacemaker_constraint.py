@@ -32,10 +32,11 @@ options:
       - By convention this should be the resource name, or group
       - Note that a unique id with the type will be created, e.g. <name>_<type>.
       - Example, when name is httpd and the constraint type is location the id will be httpd_location.
+      - Required unless I(constraints) is provided.
+      - Mutually exclusive with constraints.
     type: str
     aliases:
       - constraint_name
-    required: true
   type:
     description:
       - The type of constraint.
@@ -88,12 +89,90 @@ options:
       - "present"
       - "absent"
     default: "present"
+  constraints:
+    description:
+      - Manage many constraints in a single task.
+      - The existing constraints are read once from the CIB and indexed by id.
+      - Only the required adds and removes are run, and pushed to the cluster together with a single cib-push.
+      - Each item accepts the same keys as the options of the same name.
+      - The ids of the items, <name>_<type>, must be unique.
+      - Mutually exclusive with name.
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - The name of the constraint, the id will be <name>_<type>.
+        type: str
+        required: true
+      type:
+        description:
+          - The type of constraint.
+        type: str
+        required: true
+        choices:
+          - location
+          - order
+          - colocation
+      prefers:
+        description:
+          - Nodes the resource is prefered to run on.
+        type: list
+        elements: raw
+      avoids:
+        description:
+          - Nodes the resource should avoid.
+        type: list
+        elements: raw
+      order:
+        description:
+          - The order resources should be started, stopped or otherwise managed.
+        type: list
+        elements: raw
+      set:
+        description:
+          - A chain of ordered resources.
+        type: list
+        elements: str
+      resources:
+        description:
+          - Resources that should be colocated.
+        type: list
+        elements: str
+      state:
+        description:
+          - The desired state of the constraint.
+          - Defaults to the value of the state option.
+        type: str
+        choices:
+          - "present"
+          - "absent"
+    version_added: "1.1.0"
+  purge:
+    description:
+      - Remove any location, order or colocation constraint that is not in I(constraints).
+      - This includes constraints created by pcs resource move or ban.
+      - Only used with I(constraints).
+    type: bool
+    default: false
+    version_added: "1.1.0"
   local:
     description:
-      - Execute cmd with the --local flag.
-      - Only perform auth on the local node.
+      - Read the cluster state from the CIB of this node only, with cibadmin --local.
+      - The existence and idempotency checks then don't contact the DC, other nodes or pcsd.
+      - Changes are still made through pcs as usual.
     type: bool
     default: false
+  simulate:
+    description:
+      - In check mode, apply the changes to a copy of the CIB and run crm_simulate against it.
+      - The transition the cluster would run is returned in I(transition), i.e. the resources that would start, stop or move and where.
+      - The copy is changed locally with pcs -f, nothing is sent to the cluster.
+      - The CIB read with I(backend=disk) has no status section, so the prediction then assumes every resource is stopped.
+      - Ignored when not in check mode.
+    type: bool
+    default: false
+    version_added: "1.1.0"
 
 notes:
     - Requires the pcs utility on the remote host.
@@ -114,6 +193,16 @@ EXAMPLES = r'''
     avoids:
       - node5: INFINITY
 
+- name: Preview where myResource would move to, without changing the cluster
+  community.pacemaker.pacemaker_constraint:
+    name: myResource
+    type: location
+    prefers:
+      - node1: INFINITY
+    simulate: true
+  check_mode: true
+  register: preview
+
 - name: Start resources in a specific order
   community.pacemaker.pacemaker_constraint:
     name: startResources
@@ -153,6 +242,25 @@ EXAMPLES = r'''
   community.pacemaker.pacemaker_constraint:
     name: myResource
     state: absent
+
+- name: Manage all constraints of the cluster in a single task
+  community.pacemaker.pacemaker_constraint:
+    constraints:
+      - name: myFS
+        type: location
+        prefers:
+          - node1: 100
+      - name: startResources
+        type: order
+        order:
+          - start: mounts
+          - start: mysql
+      - name: myResource
+        type: colocation
+        resources:
+          - httpd
+          - mysql
+    purge: true
 '''
 
 RETURN = r'''
@@ -164,6 +272,26 @@ msg:
   description: Status message.
   returned: always
   type: str
+constraints:
+  description: The result for each constraint when the constraints option is used.
+  returned: when constraints is provided
+  type: list
+  elements: dict
+  sample: [{"id": "myFS_location", "changed": true, "msg": "The constraint myFS_location was successfully created"}]
+transition:
+  description:
+    - The transition predicted by crm_simulate, the actions in the order of the Transition Summary and the number of each action.
+    - I(node) is where the resource runs after the action, I(from_node) the node a moved resource leaves.
+  returned: in check mode when simulate is true and a change is required
+  type: dict
+  sample: {"actions": [{"action": "move", "resource": "myResource", "node": "node1", "from_node": "node2", "reason": null}],
+           "counts": {"move": 1}}
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
@@ -173,34 +301,51 @@ from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_opti
     pacemaker_common_argument_spec
 )
 
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
+    get_cib,
+    pcsd_tokens_file,
+    pcs_base_cmd,
+    run_cib_commands,
+    run_pcs_command,
+    simulate_cib_commands,
+    pcs_exit_json,
+    pcs_fail_json,
+    PCS_TIMINGS
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    pcsd_get_cib
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    parse_cib,
+    parse_crm_simulate,
+    disk_get_cib
+)
+
 import traceback
 
 # TODO Refactor to common and add unit tests?
 
 
-def get_constraint_id(module):
+def get_constraint_id(module, spec=None):
     """
     Returns the constraint id that we always want this module to create/manage.
     TODO - We need to change this is, it is not unique
+    @spec - constraint definition from the constraints option, defaults to the module params
     """
-    return "{0}_{1}".format(module.params['name'], module.params['type'])
+    spec = spec or module.params
+    return "{0}_{1}".format(spec['name'], spec['type'])
 
 
-def is_constraint_configured(module):
+def is_constraint_configured(module, cib):
     """
     Returns true if the given constraint is configured.
-    We only check the name of the constraint. Configuration
+    We only check the id of the constraint. Configuration
     is not checked at all.
+    @cib - The parsed CIB model
     """
-    status = False
-    cmd = "{0} constraint show --full".format(module.params['pcs_util'])
-    rc, out, err = module.run_command(cmd)
-    if rc == 0:
-        if get_constraint_id(module) in out:
-            status = True
-    else:
-        module.fail_json(msg="Failed checking constraint: {0}".format(err + " : " + out))
-    return status
+    return get_constraint_id(module) in cib['constraints']
 
 
 def delete_constraint(module):
@@ -209,68 +354,76 @@ def delete_constraint(module):
     """
     id = get_constraint_id(module)
     status = False
-    cmd = "{0} constraint remove {1}".format(module.params['pcs_util'], id)
-    rc, out, err = module.run_command(cmd)
+    cmd = "{0} constraint remove {1}".format(pcs_base_cmd(module), id)
+    rc, out, err = run_pcs_command(module, cmd)
     if rc == 0:
         status = True
     else:
-        module.fail_json(msg="Failed to delete the constraint {0}: {1}".format(id, err))
+        pcs_fail_json(module, msg="Failed to delete the constraint {0}: {1}".format(id, err))
     return status
 
 
-def create_constraint(module):
+def build_constraint_cmd(module, spec=None):
     """
-    This function creates the constraint by first building the appropriate command.
+    Build the pcs arguments, without the pcs command itself, to create the constraint.
     pcs provides a huge amount of richness when it comes to configuraing constraints.
     We should not attempt to support them all, just the basic use cases.
+    @spec - constraint definition from the constraints option, defaults to the module params
     """
-    status = False  # Have we been successful?
-    id = get_constraint_id(module)
-    constraint_type = module.params['type']
-    cmd = "{0} constraint {1} add {2} {3}".format(module.params['pcs_util'],
-                                                  constraint_type,
-                                                  id,
-                                                  module.params['name'])
+    spec = spec or module.params
+    id = get_constraint_id(module, spec)
+    constraint_type = spec['type']
+    cmd = "constraint {0} add {1} {2}".format(constraint_type,
+                                              id,
+                                              spec['name'])
     if constraint_type == "location":
         # These two commands are supposed to work with multiple nodes but don't seem to... perhaps a version thing?
         # Had to remove the prefers and avoids keywords... these are documented in the help for v0.9.169 but don't seem to work
         # revisit this when we upgrade to a newer version?
-        if module.params['prefers'] is not None:
-            node_config = ' '.join(["{0} {1}".format(key, value) for d in module.params['prefers'] for key, value in d.items()]).strip()
+        if spec['prefers'] is not None:
+            node_config = ' '.join(["{0} {1}".format(key, value) for d in spec['prefers'] for key, value in d.items()]).strip()
             cmd = "{0} {1}".format(cmd, node_config)
-        elif module.params['avoids'] is not None:
+        elif spec['avoids'] is not None:
             # The minus turns it into an avoid
-            node_config = ' '.join(["{0} -{1}".format(key, value) for d in module.params['avoids'] for key, value in d.items()]).strip()
+            node_config = ' '.join(["{0} -{1}".format(key, value) for d in spec['avoids'] for key, value in d.items()]).strip()
             cmd = "{0} {1}".format(cmd, node_config)
         else:
-            module.fail_json(msg="invalid verb with location constraint")
+            pcs_fail_json(module, msg="invalid verb with location constraint")
     elif constraint_type == "order":
-        if module.params['order'] is not None:
-            res = module.params['order']  # limited to 2 resources
+        if spec['order'] is not None:
+            res = spec['order']  # limited to 2 resources
             r1_action = list(res[0].keys())[0]
             r1_name = res[0][r1_action]
             r2_action = list(res[1].keys())[0]
-            r2_name = res[1][r1_action]
-            cmd = "{0} constraint order".format(module.params['pcs_util'])
+            r2_name = res[1][r2_action]
+            cmd = "constraint order"
             cmd = "{0} {1}".format(cmd, "{0} {1} then {2} {3}".format(r1_action, r1_name, r2_action, r2_name))
             cmd = "{0} id={1}".format(cmd, id)
-        elif module.params['set']:
-            cmd = "{0} constraint {1} set {2} setoptions id={3}".format(module.params['pcs_util'],
-                                                                        constraint_type,
-                                                                        " ".join(resource for resource in module.params['set']),
-                                                                        id)
+        elif spec['set']:
+            cmd = "constraint {0} set {1} setoptions id={2}".format(constraint_type,
+                                                                    " ".join(resource for resource in spec['set']),
+                                                                    id)
         else:
-            module.fail_json(msg="either the order or set config keys must be provided when type is order")
+            pcs_fail_json(module, msg="either the order or set config keys must be provided when type is order")
     elif constraint_type == "colocation":
-        if module.params['resources']:
-            cmd = "{0} constraint colocation add".format(module.params['pcs_util'])
-            cmd = "{0} {1}".format(cmd, " with ".join(resource for resource in module.params['resources']))
+        if spec['resources']:
+            cmd = "constraint colocation add"
+            cmd = "{0} {1}".format(cmd, " with ".join(resource for resource in spec['resources']))
             cmd = "{0} id={1}".format(cmd, id)
         else:
-            module.fail_json(msg="the resources config key must be provided when type is order")
+            pcs_fail_json(module, msg="the resources config key must be provided when type is order")
+    return cmd
+
+
+def create_constraint(module):
+    """
+    This function creates the constraint by first building the appropriate command.
+    """
+    status = False  # Have we been successful?
+    cmd = "{0} {1}".format(pcs_base_cmd(module), build_constraint_cmd(module))
 
     # Execute the cmd and set status to True if successful
-    rc, out, stderr = module.run_command(cmd)
+    rc, out, stderr = run_pcs_command(module, cmd)
     if module.params['debug']:
         module.warn(cmd)  # TODO clean this up
         module.warn(out)
@@ -280,10 +433,51 @@ def create_constraint(module):
     return status
 
 
+def manage_constraints(module, cib):
+    """
+    Compare the constraints option against the constraints in the CIB, indexed by id,
+    and apply only the required adds and removes as a single batch.
+    When purge is set constraints not in the constraints option are removed.
+    Returns a list with the result for each constraint and the pcs arguments of the batch.
+    @cib - The parsed CIB model
+    """
+    results = []
+    cmds = []
+    managed = set()
+    for spec in module.params['constraints']:
+        state = spec['state'] or module.params['state']
+        id = get_constraint_id(module, spec)
+        managed.add(id)
+        constraint_result = {"id": id, "changed": False}
+        if state == "present":
+            if id in cib['constraints']:
+                constraint_result['msg'] = "The constraint {0} already exists".format(id)
+            else:
+                cmds.append(build_constraint_cmd(module, spec))
+                constraint_result['changed'] = True
+                constraint_result['msg'] = "The constraint {0} was successfully created".format(id)
+        else:
+            if id in cib['constraints']:
+                cmds.append("constraint remove {0}".format(id))
+                constraint_result['changed'] = True
+                constraint_result['msg'] = "The constraint {0} was successfully deleted".format(id)
+            else:
+                constraint_result['msg'] = "The constraint {0} does not exist".format(id)
+        results.append(constraint_result)
+    if module.params['purge']:
+        for id, constraint in cib['constraints'].items():
+            if id not in managed and constraint['type'] in ["location", "order", "colocation"]:
+                cmds.append("constraint remove {0}".format(id))
+                results.append({"id": id, "changed": True, "msg": "The unmanaged constraint {0} was purged".format(id)})
+    if len(cmds) > 0 and module.check_mode is False:
+        run_cib_commands(module, cmds)
+    return results, cmds
+
+
 def main():
     argument_spec = pacemaker_common_argument_spec()
     argument_spec.update(
-        name=dict(type='str', required=True, aliases=["constraint_name"]),
+        name=dict(type='str', aliases=["constraint_name"]),
         type=dict(type='str', choices=["location", "order", "colocation"], aliases=["constraint_type"]),
         prefers=dict(type='list', elements='raw'),
         avoids=dict(type='list', elements='raw'),
@@ -291,21 +485,53 @@ def main():
         set=dict(type='list', elements='str'),
         resources=dict(type='list', elements='str'),
         state=dict(type='str', choices=["present", "absent"], default="present"),
+        constraints=dict(type='list', elements='dict', options=dict(
+            name=dict(type='str', required=True),
+            type=dict(type='str', required=True, choices=["location", "order", "colocation"]),
+            prefers=dict(type='list', elements='raw'),
+            avoids=dict(type='list', elements='raw'),
+            order=dict(type='list', elements='raw'),
+            set=dict(type='list', elements='str'),
+            resources=dict(type='list', elements='str'),
+            state=dict(type='str', choices=["present", "absent"]),
+        )),
+        purge=dict(type='bool', default=False),
         local=dict(type='bool', default=False),
+        simulate=dict(type='bool', default=False),
     )
     module = AnsibleModule(
         argument_spec=argument_spec,
+        required_one_of=[['name', 'constraints']],
+        mutually_exclusive=[['name', 'constraints']],
         supports_check_mode=True,
     )
     result = {}
     state = module.params["state"]
 
-    if len(module.params['order'] or []) > 2:
-        module.fail_json(msg="Use the 'pcs constraint order set' command if you want to create a constraint for more than two resources.")
+    for spec in module.params['constraints'] or [module.params]:
+        if len(spec['order'] or []) > 2:
+            pcs_fail_json(module, msg="Use the 'pcs constraint order set' command if you want to create a constraint for more than two resources.")
+    ids = [get_constraint_id(module, spec) for spec in module.params['constraints'] or []]
+    duplicates = sorted(set(id for id in ids if ids.count(id) > 1))
+    if len(duplicates) > 0:
+        pcs_fail_json(module, msg="The constraints option has more than one constraint with the id {0}, "
+                                  "the id is the name followed by the type".format(", ".join(duplicates)))
 
     try:
+        cib_xml = get_cib(module, backend_cib=pcsd_get_cib(module, pcsd_tokens_file(), PCS_TIMINGS) or disk_get_cib(module))
+        cib = parse_cib(cib_xml, ["constraints"])
+        cib_cmds = []
+        if module.params['constraints'] is not None:
+            result['constraints'], cib_cmds = manage_constraints(module, cib)
+            result['changed'] = any(c['changed'] for c in result['constraints'])
+            result['msg'] = "{0} of {1} constraints changed".format(len([c for c in result['constraints'] if c['changed']]),
+                                                                    len(result['constraints']))
+            simulation = simulate_cib_commands(module, cib_xml, cib_cmds)
+            if simulation is not None:
+                result['transition'] = parse_crm_simulate(simulation)
+            pcs_exit_json(module, **result)
         constraint_id = get_constraint_id(module)
-        exists = is_constraint_configured(module)
+        exists = is_constraint_configured(module, cib)
 
         if state == "present":
             if exists:
@@ -314,23 +540,28 @@ def main():
             else:
                 if module.check_mode is False:
                     create_constraint(module)
+                cib_cmds.append(build_constraint_cmd(module))
                 result['changed'] = True
                 result['msg'] = "The constraint {0} was successfully created".format(constraint_id)
         elif state == "absent":
             if exists:
                 if module.check_mode is False:
                     delete_constraint(module)
+                cib_cmds.append("constraint remove {0}".format(constraint_id))
                 result['changed'] = True
                 result['msg'] = "The constraint {0} was successfully deleted".format(constraint_id)
             else:
                 result['changed'] = False
                 result['msg'] = "The constraint {0} does not exist".format(constraint_id)
+        simulation = simulate_cib_commands(module, cib_xml, cib_cmds)
+        if simulation is not None:
+            result['transition'] = parse_crm_simulate(simulation)
     except Exception as excep:
         if module.params["debug"]:
             excep = traceback.format_exc()
-        module.fail_json(msg='Error: %s' % to_native(excep))
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
 
-    module.exit_json(**result)
+    pcs_exit_json(module, **result)
 
 
 if __name__ == '__main__':
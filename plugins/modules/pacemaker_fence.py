@@ -57,8 +57,9 @@ options:
     default: "present"
   local:
     description:
-      - Execute cmd with the --local flag.
-      - Only perform auth on the local node.
+      - Read the cluster state from the CIB of this node only, with cibadmin --local.
+      - The existence and idempotency checks then don't contact the DC, other nodes or pcsd.
+      - Changes are still made through pcs as usual.
     type: bool
     default: false
 
@@ -92,6 +93,12 @@ msg:
   description: Status message.
   returned: always
   type: str
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
@@ -101,6 +108,25 @@ from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_opti
     pacemaker_common_argument_spec
 )
 
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
+    get_cib,
+    pcsd_tokens_file,
+    pcs_base_cmd,
+    run_pcs_command,
+    pcs_exit_json,
+    pcs_fail_json,
+    PCS_TIMINGS
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    pcsd_get_cib
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    parse_cib,
+    disk_get_cib
+)
+
 import traceback
 
 # TODO Refactor to common and add unit tests?
@@ -113,25 +139,20 @@ def fence_agent_exists(module):
     status = False
     cmd = "{0} stonith describe {1}".format(module.params['pcs_util'],
                                             module.params['agent'])
-    rc, out, err = module.run_command(cmd)
+    rc, out, err = run_pcs_command(module, cmd)
     if rc == 0:
         status = True
     return status
 
 
-def is_fence_configured(module):
+def is_fence_configured(module, cib):
     """
     Returns true if the given fence is configured.
     We only check the name of the fence. Configuration
     is not checked at all.
+    @cib - The parsed CIB model
     """
-    status = False
-    cmd = "{0} stonith show {1}".format(module.params['pcs_util'],
-                                        module.params['name'])
-    rc, out, err = module.run_command(cmd)
-    if rc == 0:
-        status = True
-    return status
+    return module.params['name'] in cib['stonith']
 
 
 def delete_fence(module):
@@ -139,30 +160,30 @@ def delete_fence(module):
     Returns true if the fence was deleted
     """
     status = False
-    cmd = "{0} stonith delete {1}".format(module.params['pcs_util'],
+    cmd = "{0} stonith delete {1}".format(pcs_base_cmd(module),
                                           module.params['name'])
-    rc, out, err = module.run_command(cmd)
+    rc, out, err = run_pcs_command(module, cmd)
     if rc == 0:
         status = True
     else:
-        module.fail_json(msg="Failed to delete the fence {0}: {1}".format(module.params['name'],
-                                                                          err))
+        pcs_fail_json(module, msg="Failed to delete the fence {0}: {1}".format(module.params['name'],
+                                                                               err))
     return status
 
 
 def create_fence(module):
     options = ''.join(["{0}={1} ".format(k, v) for k, v in module.params['config'].items()])
-    cmd = "{0} stonith create {1} {2} {3}".format(module.params['pcs_util'],
+    cmd = "{0} stonith create {1} {2} {3}".format(pcs_base_cmd(module),
                                                   module.params['name'],
                                                   module.params['agent'],
                                                   options)
     module.warn(str(cmd))
-    rc, out, err = module.run_command(cmd)
+    rc, out, err = run_pcs_command(module, cmd)
     if rc == 0:
         status = True
     else:
-        module.fail_json(msg="Failed creating the fence {0}: {1}".format(module.params['name'],
-                                                                         err + " : " + out))
+        pcs_fail_json(module, msg="Failed creating the fence {0}: {1}".format(module.params['name'],
+                                                                              err + " : " + out))
     return status
 
 
@@ -185,30 +206,31 @@ def main():
 
     try:
         if state == "present" and fence_agent_exists(module) is False:
-            module.fail_json(msg="The configured fence agent does not exist: {0}".format(module.params['agent']))
+            pcs_fail_json(module, msg="The configured fence agent does not exist: {0}".format(module.params['agent']))
         result = {}
-        fence_exists = is_fence_configured(module)
+        cib_xml = get_cib(module, backend_cib=pcsd_get_cib(module, pcsd_tokens_file(), PCS_TIMINGS) or disk_get_cib(module))
+        fence_exists = is_fence_configured(module, parse_cib(cib_xml, ["resources"]))
 
         if state == "present":
             if fence_exists:
-                module.exit_json(changed=False, msg="The fence {0} already exists".format(module.params['name']))
+                pcs_exit_json(module, changed=False, msg="The fence {0} already exists".format(module.params['name']))
             else:
                 if module.check_mode is False:
                     create_fence(module)
-                module.exit_json(changed=True, msg="The fence {0} was successfully created".format(module.params['name']))
+                pcs_exit_json(module, changed=True, msg="The fence {0} was successfully created".format(module.params['name']))
         elif state == "absent":
             if fence_exists is False:
-                module.exit_json(changed=False, msg="The fence {0} does not exist".format(module.params['name']))
+                pcs_exit_json(module, changed=False, msg="The fence {0} does not exist".format(module.params['name']))
             else:
                 if module.check_mode is False:
                     delete_fence(module)
-                module.exit_json(changed=True, msg="The fence {0} was successfully deleted".format(module.params['name']))
+                pcs_exit_json(module, changed=True, msg="The fence {0} was successfully deleted".format(module.params['name']))
     except Exception as excep:
         if module.params["debug"]:
             excep = traceback.format_exc()
-        module.fail_json(msg='Error: %s' % to_native(excep))
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
 
-    module.exit_json(**result)  # TODO Remove this or set result dict values above?
+    pcs_exit_json(module, **result)  # TODO Remove this or set result dict values above?
 
 
 if __name__ == '__main__':
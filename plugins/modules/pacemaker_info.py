@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Rhys Campbell (@rhysmeister) <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: pacemaker_info
+
+short_description: Gather information about a Pacemaker cluster.
+
+description:
+  - Gather information about a Pacemaker cluster.
+  - The configuration is read with a single cibadmin query and the current state with a single crm_mon call.
+  - Returns the nodes, resources with their current role and location, constraints, fencing devices, properties and the CIB epoch.
+  - Register the result once and reuse it in later tasks instead of calling pcs status.
+
+author: Rhys Campbell (@rhysmeister)
+version_added: "1.1.0"
+
+extends_documentation_fragment:
+  - community.pacemaker.pacemaker_options
+
+options:
+  local:
+    description:
+      - Read the configuration from the copy of the CIB held by this node, with cibadmin --query --local, instead of asking the DC.
+      - No other node and no pcsd is contacted, so the information can still be gathered when the DC is slow or unreachable.
+      - The copy may lag behind the DC by the changes not yet synchronised to this node.
+      - The current state is read with crm_mon on this node either way, and with I(backend=disk) the CIB is always read locally.
+    type: bool
+    default: false
+
+notes:
+    - Requires the cibadmin and crm_mon utilities, from the pacemaker-cli-utils package, on the remote host. The pcs utility is not used.
+'''
+
+EXAMPLES = r'''
+- name: Gather cluster information
+  community.pacemaker.pacemaker_info:
+  register: cluster
+
+- name: Show where the httpd resource runs
+  ansible.builtin.debug:
+    msg: "httpd is {{ cluster.resources.httpd.role }} on {{ cluster.resources.httpd.nodes | join(', ') }}"
+
+- name: Only run on the designated controller
+  ansible.builtin.debug:
+    msg: "This is the DC"
+  when: cluster.dc == inventory_hostname
+
+- name: Gather cluster information from the CIB of this node, e.g. while the DC is unreachable
+  community.pacemaker.pacemaker_info:
+    local: true
+  register: local_cluster
+'''
+
+RETURN = r'''
+changed:
+  description: If the module caused a change.
+  returned: on success
+  type: bool
+msg:
+  description: Status message.
+  returned: always
+  type: str
+epoch:
+  description: The admin_epoch, epoch and num_updates of the CIB.
+  returned: on success
+  type: dict
+  sample: {"admin_epoch": 0, "epoch": 42, "num_updates": 7}
+dc:
+  description: The name of the designated controller node.
+  returned: on success
+  type: str
+  sample: node1
+properties:
+  description: The cluster properties set in the CIB.
+  returned: on success
+  type: dict
+  sample: {"stonith-enabled": "false"}
+nodes:
+  description: The cluster nodes keyed by name, including their online, standby and dc state.
+  returned: on success
+  type: dict
+resources:
+  description: The resources keyed by id, including their configuration, current role and the nodes they run on.
+  returned: on success
+  type: dict
+stonith:
+  description: The fencing devices keyed by id, including their configuration, current role and the nodes they run on.
+  returned: on success
+  type: dict
+groups:
+  description: The resource groups keyed by id.
+  returned: on success
+  type: dict
+clones:
+  description: The clones, promotable clones and bundles keyed by id.
+  returned: on success
+  type: dict
+constraints:
+  description: The constraints keyed by id.
+  returned: on success
+  type: dict
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_options import (
+    pacemaker_common_argument_spec
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
+    get_cib,
+    pcsd_tokens_file,
+    get_crm_mon,
+    pcs_exit_json,
+    pcs_fail_json,
+    PCS_TIMINGS
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    pcsd_get_cib
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    parse_cib,
+    parse_crm_mon,
+    build_cluster_info,
+    disk_get_cib
+)
+
+import traceback
+
+
+def main():
+    argument_spec = pacemaker_common_argument_spec()
+    argument_spec.update(
+        local=dict(type='bool', default=False),
+    )
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True,
+    )
+    result = {}
+
+    try:
+        cib = parse_cib(get_cib(module, backend_cib=pcsd_get_cib(module, pcsd_tokens_file(), PCS_TIMINGS) or disk_get_cib(module)))
+        status = parse_crm_mon(get_crm_mon(module))
+        result = build_cluster_info(cib, status)
+        result['changed'] = False
+        result['msg'] = "Gathered information for {0} nodes and {1} resources".format(len(result['nodes']),
+                                                                                      len(result['resources']))
+    except Exception as excep:
+        if module.params["debug"]:
+            excep = traceback.format_exc()
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
+
+    pcs_exit_json(module, **result)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,7 @@ options:
   property_name:
     description:
       - The property to manage.
+      - Required unless I(properties) is provided.
     type: str
   property_value:
     description:
@@ -34,6 +35,14 @@ options:
         For example yaml boolean would be transformed by Ansible into False and\
         the following error would result "invalid property format".
     type: str
+  properties:
+    description:
+      - Manage many properties in a single task.
+      - Supply as key value pairs. The values are ignored when the state is absent or default.
+      - The properties are compared against a single read of the CIB and all changed values are set with a single pcs property set.
+      - Mutually exclusive with property_name.
+    type: dict
+    version_added: "1.1.0"
   state:
     description:
       - The desired state of the property.
@@ -45,8 +54,9 @@ options:
     default: "present"
   local:
     description:
-      - Execute cmd with the --local flag.
-      - Only perform auth on the local node.
+      - Read the cluster state from the CIB of this node only, with cibadmin --local.
+      - The existence and idempotency checks then don't contact the DC, other nodes or pcsd.
+      - Changes are still made through pcs as usual.
     type: bool
     default: false
 
@@ -65,6 +75,14 @@ EXAMPLES = r'''
   community.pacemaker.pacemaker_property:
     property_name: "symmetic-cluster"
     state: "default"
+
+- name: Set many properties at once
+  community.pacemaker.pacemaker_property:
+    properties:
+      stonith-enabled: "false"
+      no-quorum-policy: "ignore"
+      cluster-recheck-interval: "5min"
+    state: "present"
 '''
 
 RETURN = r'''
@@ -76,6 +94,17 @@ msg:
   description: Status message.
   returned: always
   type: str
+properties:
+  description: The properties that were changed and their new values. An empty value means the property was unset.
+  returned: when properties is provided
+  type: dict
+  sample: {"stonith-enabled": "false", "no-quorum-policy": "ignore"}
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
@@ -85,19 +114,42 @@ from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_opti
     pacemaker_common_argument_spec
 )
 
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
+    get_cib,
+    pcsd_tokens_file,
+    pcs_base_cmd,
+    run_pcs_command,
+    pcs_exit_json,
+    pcs_fail_json,
+    PCS_TIMINGS
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    pcsd_get_cib
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    parse_cib,
+    disk_get_cib
+)
+
 import traceback
 
 
 # TODO Refactor to common code and add unit tests
-def show_property(module, default):
+def list_properties(module, default):
+    """
+    Returns a dict of the cluster properties from a single pcs property list
+    @default - List the default values of the properties
+    """
     cluster_properties = {}
     flag = "all"
     if default:
         flag = "default"
-    cmd = "{0} property list --{1}".format(module.params['pcs_util'], flag)
-    (rc, out, err) = module.run_command(cmd)
+    cmd = "{0} property list --{1}".format(pcs_base_cmd(module), flag)
+    (rc, out, err) = run_pcs_command(module, cmd)
     if rc != 0:
-        module.fail_json(msg="Failed listing cluster properties: {0}".format(err))
+        pcs_fail_json(module, msg="Failed listing cluster properties: {0}".format(err))
     else:
         k, v = None, None
         try:
@@ -110,41 +162,96 @@ def show_property(module, default):
                     cluster_properties[k.strip()] = v.strip()
         except Exception as e:
             if module.params['debug']:
-                module.fail_json(msg="Failed parsing cluster properties: {0}, {1}, Current kv pair: {2} {3}".format(e, cluster_properties, k, v))
-            module.fail_json(msg="Failed parsing cluster properties: {0}".format(e))
-    return cluster_properties[module.params.get('property_name', None)]
+                pcs_fail_json(module, msg="Failed parsing cluster properties: {0}, {1}, Current kv pair: {2} {3}".format(e, cluster_properties, k, v))
+            pcs_fail_json(module, msg="Failed parsing cluster properties: {0}".format(e))
+    return cluster_properties
+
+
+def show_property(module, default):
+    return list_properties(module, default)[module.params.get('property_name', None)]
 
 
 def set_property(module, default):
-    cmd = "{0} property set {1}=".format(module.params['pcs_util'],
+    cmd = "{0} property set {1}=".format(pcs_base_cmd(module),
                                          module.params['property_name'])
     if default is False:
         cmd = "{0}{1}".format(cmd, module.params['property_value'])
-    (rc, out, err) = module.run_command(cmd)
+    (rc, out, err) = run_pcs_command(module, cmd)
     if rc != 0:
-        module.fail_json(msg="Failed setting cluster property: {0}".format(err))
+        pcs_fail_json(module, msg="Failed setting cluster property: {0}".format(err))
     return True
 
 
 def unset_property(module):
-    cmd = "{0} property unset {1}".format(module.params['pcs_util'],
+    cmd = "{0} property unset {1}".format(pcs_base_cmd(module),
                                           module.params['property_name'])
-    (rc, out, err) = module.run_command(cmd)
+    (rc, out, err) = run_pcs_command(module, cmd)
     if rc != 0:
-        module.fail_json(msg="Failed unsetting cluster property: {0}".format(err))
+        pcs_fail_json(module, msg="Failed unsetting cluster property: {0}".format(err))
     return True
 
 
-def is_property_defined(module):
-    cmd = " {0} property show {1}".format(module.params['pcs_util'],
-                                          module.params['property_name'])
-    (rc, out, err) = module.run_command(cmd)
+def is_property_defined(module, cib):
+    """
+    Returns true if the property is explicitly set in the cluster configuration
+    @cib - The parsed CIB model
+    """
+    return module.params['property_name'] in cib['properties']
+
+
+def get_property_value(module, cib):
+    """
+    Returns the current value of the property. Properties that are not set in
+    the CIB have their default value.
+    @cib - The parsed CIB model
+    """
+    if is_property_defined(module, cib):
+        return cib['properties'][module.params['property_name']]
+    return show_property(module, True)
+
+
+def set_properties(module, properties):
+    """
+    Set many properties with a single pcs property set.
+    An empty value removes the property from the cluster configuration.
+    @properties - dict of property names and values
+    """
+    cmd = "{0} property set {1}".format(pcs_base_cmd(module),
+                                        " ".join("{0}={1}".format(k, v) for k, v in properties.items()))
+    (rc, out, err) = run_pcs_command(module, cmd)
     if rc != 0:
-        module.fail_json(msg="Failed checking cluster property: {0}".format(err))
-    if module.params['property_name'] in out:
-        return True
-    else:
-        return False
+        pcs_fail_json(module, msg="Failed setting cluster properties: {0}".format(err))
+    return True
+
+
+def manage_properties(module, cib):
+    """
+    Compare the properties option against the CIB and set all the changed
+    properties at once. The defaults are only listed when they are needed.
+    Returns a dict of the changed properties and their new values.
+    @cib - The parsed CIB model
+    """
+    state = module.params['state']
+    properties = module.params['properties']
+    defaults = None
+    if state == "present" and not set(properties.keys()).issubset(cib['properties'].keys()) or \
+            state == "default" and set(properties.keys()).intersection(cib['properties'].keys()):
+        defaults = list_properties(module, True)
+    changes = {}
+    for name, value in properties.items():
+        if isinstance(value, bool):  # Ansible turns yaml booleans into True and False
+            value = str(value).lower()
+        value = str(value)
+        if state == "present":
+            current_value = cib['properties'][name] if name in cib['properties'] else defaults.get(name)
+            if current_value != value:
+                changes[name] = value
+        elif name in cib['properties']:
+            if state == "absent" or cib['properties'][name] != defaults.get(name):
+                changes[name] = ""
+    if len(changes) > 0 and module.check_mode is False:
+        set_properties(module, changes)
+    return changes
 
 
 def main():
@@ -152,11 +259,14 @@ def main():
     argument_spec.update(
         property_name=dict(type='str'),
         property_value=dict(type='str'),
+        properties=dict(type='dict'),
         state=dict(type='str', choices=["present", "absent", "default"], default="present"),
         local=dict(type='bool', default=False),
     )
     module = AnsibleModule(
         argument_spec=argument_spec,
+        required_one_of=[['property_name', 'properties']],
+        mutually_exclusive=[['property_name', 'properties']],
         supports_check_mode=True,
     )
     rc, out, err = None, None, None
@@ -165,8 +275,15 @@ def main():
 
     try:
         result = {}
-        current_value = show_property(module, False)
+        cib = parse_cib(get_cib(module, backend_cib=pcsd_get_cib(module, pcsd_tokens_file(), PCS_TIMINGS) or disk_get_cib(module)), ["properties"])
+        if module.params['properties'] is not None:
+            result['properties'] = manage_properties(module, cib)
+            result['changed'] = len(result['properties']) > 0
+            result['msg'] = "{0} of {1} properties changed".format(len(result['properties']),
+                                                                   len(module.params['properties']))
+            pcs_exit_json(module, **result)
         if state == "present":
+            current_value = get_property_value(module, cib)
             if current_value == module.params['property_value']:
                 result['changed'] = False
                 result['msg'] = "{0} is already set to {1}".format(module.params['property_name'],
@@ -178,7 +295,7 @@ def main():
                 result['msg'] = "{0} has been set to {1}".format(module.params['property_name'],
                                                                  module.params['property_value'])
         elif state == "absent":
-            if is_property_defined(module) is False:
+            if is_property_defined(module, cib) is False:
                 result['changed'] = False
                 result['msg'] = "{0} is not set in the cluster configuration".format(module.params['property_name'])
             else:
@@ -188,6 +305,7 @@ def main():
                 result['msg'] = "{0} has been unset in the cluster configuration".format(module.params['property_name'])
         elif state == "default":
             default_value = show_property(module, True)
+            current_value = cib['properties'].get(module.params['property_name'], default_value)
             if default_value == current_value:
                 result['changed'] = False
                 result['msg'] = "{0} is already set to the default: {1}".format(module.params['property_name'],
@@ -201,9 +319,9 @@ def main():
     except Exception as excep:
         if module.params["debug"]:
             excep = traceback.format_exc()
-        module.fail_json(msg='Error: %s' % to_native(excep))
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
 
-    module.exit_json(**result)
+    pcs_exit_json(module, **result)
 
 
 if __name__ == '__main__':
@@ -15,8 +15,9 @@ short_description: Create and manage resources within a Pacemaker cluster.
 
 description:
   - Create and manage resources within a Pacemaker cluster.
-  - This module does not check resource configuration for changes.
-  - To update a resource you can delete it before recreating.
+  - When a resource exists its instance and meta attributes are compared with I(resource_config) and I(resource_meta).
+  - Only the attributes that differ are changed, in place, with pcs resource update. Attributes that are not supplied are left alone.
+  - The resource type and group are not checked. To change them you can delete the resource before recreating.
 
 author: Rhys Campbell (@rhysmeister)
 version_added: "1.0.0"
@@ -28,8 +29,9 @@ options:
   resource_name:
     description:
       - The name of the resource.
+      - Required unless I(resources) is provided.
+      - Mutually exclusive with resources.
     type: str
-    required: true
   resource_type:
     description:
       - The type of resource.
@@ -41,6 +43,12 @@ options:
       - Supply as key value pairs.
       - Required when state is present.
     type: dict
+  resource_meta:
+    description:
+      - The meta attributes of the resource.
+      - Supply as key value pairs.
+    type: dict
+    version_added: "1.1.0"
   resource_group:
     description:
       - The group to add the resource to.
@@ -58,6 +66,50 @@ options:
       - "move"
       - "debug-start"
     default: "present"
+  resources:
+    description:
+      - Manage many resources in a single task.
+      - The resources are compared against a single read of the CIB and only the required creates and deletes are run.
+      - When more than one change is required they are pushed to the cluster together with a single cib-push.
+      - Only the present and absent states are supported.
+      - Mutually exclusive with resource_name.
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - The name of the resource.
+        type: str
+        required: true
+      type:
+        description:
+          - The type of resource.
+          - Required when state is present.
+        type: str
+      config:
+        description:
+          - The configuration of the resource.
+          - Supply as key value pairs.
+        type: dict
+      meta:
+        description:
+          - The meta attributes of the resource.
+          - Supply as key value pairs.
+        type: dict
+      group:
+        description:
+          - The group to add the resource to.
+          - Will be created if it does not exist.
+        type: str
+      state:
+        description:
+          - The desired state of the resource.
+          - Defaults to the value of the state option.
+        type: str
+        choices:
+          - "present"
+          - "absent"
+    version_added: "1.1.0"
   member:
     description:
       - Member nominated for the move command.
@@ -65,10 +117,21 @@ options:
     type: str
   local:
     description:
-      - Execute cmd with the --local flag.
-      - Only perform auth on the local node.
+      - Read the cluster state from the CIB of this node only, with cibadmin --local.
+      - The existence and idempotency checks then don't contact the DC, other nodes or pcsd.
+      - Changes are still made through pcs as usual.
+    type: bool
+    default: false
+  simulate:
+    description:
+      - In check mode, apply the changes to a copy of the CIB and run crm_simulate against it.
+      - The transition the cluster would run is returned in I(transition), i.e. the resources that would start, stop or move and where.
+      - The copy is changed locally with pcs -f, nothing is sent to the cluster.
+      - The CIB read with I(backend=disk) has no status section, so the prediction then assumes every resource is stopped.
+      - Ignored when not in check mode.
     type: bool
     default: false
+    version_added: "1.1.0"
 
 notes:
     - Requires the pcs utility on the remote host.
@@ -105,11 +168,47 @@ EXAMPLES = r'''
     resource_group: apache
     state: present
 
+- name: Change the ip of the floating ip resource without recreating it
+  community.pacemaker.pacemaker_resource:
+    resource_name: ClusterIP
+    resource_type: ocf:heartbeat:IPaddr2
+    resource_config:
+      ip: 192.168.122.121
+    resource_meta:
+      migration-threshold: 3
+    resource_group: apache
+    state: present
+
 - name: Delete a resource
   community.pacemaker.pacemaker_resource:
     resource_name: website
     state: absent
 
+- name: Create many resources with a single task
+  community.pacemaker.pacemaker_resource:
+    resources:
+      - name: ClusterIP
+        type: ocf:heartbeat:IPaddr2
+        config:
+          ip: 192.168.122.120
+        group: apache
+      - name: website
+        type: ocf:heartbeat:apache
+        config:
+          configfile: /etc/httpd/conf/httpd.conf
+        group: apache
+      - name: oldWebsite
+        state: absent
+
+- name: Show what moving myFS would disrupt, without changing the cluster
+  community.pacemaker.pacemaker_resource:
+    resource_name: myFS
+    state: "move"
+    member: pacemaker-2
+    simulate: true
+  check_mode: true
+  register: move
+
 - name: Move myFS resource
   community.pacemaker.pacemaker_resource:
     resource_name: myFS
@@ -127,108 +226,283 @@ msg:
   description: Status message.
   returned: always
   type: str
+config_diff:
+  description: The instance and meta attributes that were changed on an existing resource.
+  returned: when state is present and the resource exists
+  type: dict
+  sample: {"instance_attributes": {"ip": {"before": "192.168.122.120", "after": "192.168.122.121"}}, "meta_attributes": {}}
+resources:
+  description: The result for each resource when the resources option is used.
+  returned: when resources is provided
+  type: list
+  elements: dict
+  sample: [{"resource_name": "ClusterIP", "changed": true, "msg": "Successfully created the resource ClusterIP", "config_diff": {}}]
+transition:
+  description:
+    - The transition predicted by crm_simulate, the actions in the order of the Transition Summary and the number of each action.
+    - I(node) is where the resource runs after the action, I(from_node) the node a moved resource leaves.
+  returned: in check mode when simulate is true and a change is required
+  type: dict
+  sample: {"actions": [{"action": "move", "resource": "ClusterIP", "node": "node2", "from_node": "node1", "reason": null},
+                       {"action": "restart", "resource": "website", "node": "node2", "from_node": null, "reason": "required by ClusterIP start"}],
+           "counts": {"move": 1, "restart": 1}}
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
+from ansible.module_utils.six.moves import shlex_quote
 
 from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_options import (
     pacemaker_common_argument_spec
 )
 
 from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
-    get_cluster_resources
+    get_cib,
+    pcsd_tokens_file,
+    get_cluster_resources,
+    pcs_base_cmd,
+    run_cib_commands,
+    run_pcs_command,
+    simulate_cib_commands,
+    pcs_exit_json,
+    pcs_fail_json,
+    PCS_TIMINGS
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_pcsd import (
+    pcsd_get_cib
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_cib import (
+    parse_cib,
+    parse_crm_simulate,
+    resource_config_diff,
+    disk_get_cib
 )
 
 import traceback
 
 
+def attribute_args(attributes):
+    """
+    Return name=value pcs arguments for the attributes, each quoted so values with spaces
+    or quotes are passed to pcs as a single argument
+    @attributes - dict of attribute names and values
+    """
+    return [shlex_quote("{0}={1}".format(k, v)) for k, v in attributes.items()]
+
+
+def build_resource_create_cmd(resource_name, resource_type, resource_config, resource_group, resource_meta=None):
+    """
+    Build the pcs arguments to create a resource, without the pcs command itself
+    """
+    args = ["resource", "create", shlex_quote(resource_name), shlex_quote(resource_type)]
+    args += attribute_args(resource_config or {})
+    if resource_meta:
+        args += ["meta"] + attribute_args(resource_meta)
+    if resource_group is not None:
+        args += ["--group", shlex_quote(resource_group)]
+    return " ".join(args)
+
+
+def build_resource_update_cmd(resource_name, config_diff):
+    """
+    Build the pcs arguments to update only the changed attributes of a resource,
+    without the pcs command itself
+    @config_diff - as returned by resource_config_diff
+    """
+    args = ["resource", "update", shlex_quote(resource_name)]
+    args += attribute_args(dict((k, v['after']) for k, v in config_diff['instance_attributes'].items()))
+    if len(config_diff['meta_attributes']) > 0:
+        args += ["meta"] + attribute_args(dict((k, v['after']) for k, v in config_diff['meta_attributes'].items()))
+    return " ".join(args)
+
+
+def config_changed(config_diff):
+    return len(config_diff['instance_attributes']) > 0 or len(config_diff['meta_attributes']) > 0
+
+
+def manage_resources(module, cib):
+    """
+    Compare the resources option against the CIB and run only the required
+    creates, updates and deletes as a single batch.
+    Returns a list with the result for each resource and the pcs arguments of the batch.
+    @cib - The parsed CIB model
+    """
+    results = []
+    cmds = []
+    for spec in module.params['resources']:
+        state = spec['state'] or module.params['state']
+        exists = spec['name'] in cib['resources']
+        resource_result = {"resource_name": spec['name'], "changed": False}
+        if state == "present":
+            if exists:
+                config_diff = resource_config_diff(cib['resources'][spec['name']], spec['config'], spec['meta'])
+                resource_result["config_diff"] = config_diff
+                if config_changed(config_diff):
+                    cmds.append(build_resource_update_cmd(spec['name'], config_diff))
+                    resource_result["changed"] = True
+                    resource_result["msg"] = "The resource {0} was updated".format(spec['name'])
+                else:
+                    resource_result["msg"] = "The resource {0} already exists in the cluster".format(spec['name'])
+            else:
+                cmds.append(build_resource_create_cmd(spec['name'], spec['type'], spec['config'], spec['group'], spec['meta']))
+                resource_result["changed"] = True
+                resource_result["msg"] = "Successfully created the resource {0}".format(spec['name'])
+        else:
+            if exists:
+                cmds.append("resource delete {0}".format(spec['name']))
+                resource_result["changed"] = True
+                resource_result["msg"] = "The resource {0} was deleted from the cluster".format(spec['name'])
+            else:
+                resource_result["msg"] = "The resource {0} does not exist in the cluster".format(spec['name'])
+        results.append(resource_result)
+    if len(cmds) > 0 and module.check_mode is False:
+        run_cib_commands(module, cmds)
+    return results, cmds
+
+
 def main():
     argument_spec = pacemaker_common_argument_spec()
     argument_spec.update(
-        resource_name=dict(type='str', required=True),
+        resource_name=dict(type='str'),
         resource_type=dict(type='str'),
         resource_config=dict(type='dict'),
+        resource_meta=dict(type='dict'),
         resource_group=dict(type='str'),
         state=dict(type='str', choices=["present", "absent", "enabled", "disabled", "move", "debug-start"], default="present"),
+        resources=dict(type='list', elements='dict', options=dict(
+            name=dict(type='str', required=True),
+            type=dict(type='str'),
+            config=dict(type='dict'),
+            meta=dict(type='dict'),
+            group=dict(type='str'),
+            state=dict(type='str', choices=["present", "absent"]),
+        )),
         member=dict(type='str'),
         local=dict(type='bool', default=False),
+        simulate=dict(type='bool', default=False),
     )
     module = AnsibleModule(
         argument_spec=argument_spec,
+        required_one_of=[['resource_name', 'resources']],
+        mutually_exclusive=[['resource_name', 'resources']],
         supports_check_mode=True,
     )
     rc, out, err = None, None, None
     result = {}
     state = module.params["state"]
 
-    if state == "present" and (module.params['resource_type'] is None or module.params['resource_config'] is None):
-        module.fail_json(msg="resource_type and resource_config parameters are required when state is present")
+    if module.params['resources'] is not None:
+        if state not in ["present", "absent"]:
+            pcs_fail_json(module, msg="Only the present and absent states are supported with the resources parameter")
+        for spec in module.params['resources']:
+            if (spec['state'] or state) == "present" and spec['type'] is None:
+                pcs_fail_json(module, msg="type is required for the resource {0} when state is present".format(spec['name']))
+    elif state == "present" and (module.params['resource_type'] is None or module.params['resource_config'] is None):
+        pcs_fail_json(module, msg="resource_type and resource_config parameters are required when state is present")
     if state == "move" and module.params['member'] is None:
-        module.fail_json(msg="The member parameter is required when state is move")
+        pcs_fail_json(module, msg="The member parameter is required when state is move")
 
     try:
         result = {}
         rc, out, err = None, None, None
         myResource = None
+        cib_cmds = []
 
-        # Get cluster resource
-        resources = get_cluster_resources(module, None)
-        # module.warn(str(resources))
-        for resource in resources:
-            if resource['resource_name'] == module.params['resource_name']:
-                myResource = resource
+        # Get cluster resource from a single CIB query
+        cib_xml = get_cib(module, backend_cib=pcsd_get_cib(module, pcsd_tokens_file(), PCS_TIMINGS) or disk_get_cib(module))
+        cib = parse_cib(cib_xml, ["resources"])
+        if module.params['resources'] is not None:
+            result["resources"], cib_cmds = manage_resources(module, cib)
+            result["changed"] = any(r["changed"] for r in result["resources"])
+            result["msg"] = "{0} of {1} resources changed".format(len([r for r in result["resources"] if r["changed"]]),
+                                                                  len(result["resources"]))
+            simulation = simulate_cib_commands(module, cib_xml, cib_cmds)
+            if simulation is not None:
+                result["transition"] = parse_crm_simulate(simulation)
+            pcs_exit_json(module, **result)
+        if module.params['resource_name'] in cib['resources']:
+            resource = cib['resources'][module.params['resource_name']]
+            myResource = {"resource_name": resource['id'],
+                          "resource_type": resource['type'],
+                          "resource_state": None}
+        if myResource is not None and state == "debug-start":
+            # The run state is not part of the configuration so we ask pcs for it
+            for resource in get_cluster_resources(module, None):
+                if resource['resource_name'] == myResource['resource_name']:
+                    myResource['resource_state'] = resource['resource_state']
 
         # TODO Refector this code
         if state == "present":
             if myResource is None:
-                cmd = "{0} resource create {1} {2} ".format(module.params["pcs_util"],
-                                                            module.params['resource_name'],
-                                                            module.params['resource_type'])
-                for k, v in module.params['resource_config'].items():
-                    cmd += "{0}={1} ".format(k, v)
-                if module.params['resource_group'] is not None:
-                    cmd = "{0} --group {1}".format(cmd, module.params['resource_group'])
+                cib_cmds.append(build_resource_create_cmd(module.params['resource_name'],
+                                                          module.params['resource_type'],
+                                                          module.params['resource_config'],
+                                                          module.params['resource_group'],
+                                                          module.params['resource_meta']))
+                cmd = "{0} {1}".format(pcs_base_cmd(module), cib_cmds[0])
                 if module.check_mode is False:
-                    rc, out, err = module.run_command(cmd)
+                    rc, out, err = run_pcs_command(module, cmd)
                     if rc != 0:
                         module.warn(str(myResource))
-                        module.fail_json(msg="Failed creating the resource {0}: {1}".format(module.params['resource_name'],
-                                                                                            err))
+                        pcs_fail_json(module, msg="Failed creating the resource {0}: {1}".format(module.params['resource_name'],
+                                                                                                 err))
                 result["changed"] = True
                 result["msg"] = "Successfully created the resource {0}".format(module.params['resource_name'])
             else:
-                module.exit_json(changed=False, msg="The resource {0} already exists in the cluster".format(module.params['resource_name']))
+                config_diff = resource_config_diff(cib['resources'][myResource['resource_name']],
+                                                   module.params['resource_config'],
+                                                   module.params['resource_meta'])
+                result["config_diff"] = config_diff
+                if config_changed(config_diff) is False:
+                    pcs_exit_json(module, changed=False,
+                                  msg="The resource {0} already exists in the cluster".format(module.params['resource_name']),
+                                  **result)
+                cib_cmds.append(build_resource_update_cmd(myResource['resource_name'], config_diff))
+                cmd = "{0} {1}".format(pcs_base_cmd(module), cib_cmds[0])
+                if module.check_mode is False:
+                    rc, out, err = run_pcs_command(module, cmd)
+                    if rc != 0:
+                        pcs_fail_json(module, msg="Failed updating the resource {0}: {1}".format(myResource['resource_name'],
+                                                                                                 err))
+                result["changed"] = True
+                result["msg"] = "The resource {0} was updated".format(myResource['resource_name'])
         elif state == "absent":
             if myResource is None:
-                module.exit_json(changed=False, msg="The resource {0} does not exist in the cluster".format(module.params['resource_name']))
+                pcs_exit_json(module, changed=False, msg="The resource {0} does not exist in the cluster".format(module.params['resource_name']))
             else:
-                cmd = "{0} resource delete {1}".format(module.params["pcs_util"],
-                                                       myResource['resource_name'])
+                cib_cmds.append("resource delete {0}".format(myResource['resource_name']))
+                cmd = "{0} {1}".format(pcs_base_cmd(module), cib_cmds[0])
                 if module.check_mode is False:
-                    rc, out, err = module.run_command(cmd)
+                    rc, out, err = run_pcs_command(module, cmd)
                     if rc != 0:
-                        module.fail_json(msg="failed deleting the resource {0}: {1}".format(myResource['resource_name'],
-                                                                                            err))
+                        pcs_fail_json(module, msg="failed deleting the resource {0}: {1}".format(myResource['resource_name'],
+                                                                                                 err))
                 result["changed"] = True
                 result["msg"] = "The resource {0} was deleted from the cluster".format(myResource['resource_name'])
         elif state == "enabled":
-            cmd = "{0} resource enable {1}".format(module.params["pcs_util"],
+            cmd = "{0} resource enable {1}".format(pcs_base_cmd(module),
                                                    myResource['resource_name'])
-            module.fail_json(msg="This feature is not yet implemented")
+            pcs_fail_json(module, msg="This feature is not yet implemented")
         elif state == "disabled":
-            cmd = "{0} resource disable {1}".format(module.params["pcs_util"],
+            cmd = "{0} resource disable {1}".format(pcs_base_cmd(module),
                                                     myResource['resource_name'])
-            module.fail_json(msg="This feature is not yet implemented")
+            pcs_fail_json(module, msg="This feature is not yet implemented")
         elif state == "move":
-            cmd = "{0} resource move {1} {2}".format(module.params["pcs_util"],
-                                                     myResource['resource_name'],
-                                                     module.params['member'])
+            cib_cmds.append("resource move {0} {1}".format(myResource['resource_name'], module.params['member']))
+            cmd = "{0} {1}".format(pcs_base_cmd(module), cib_cmds[0])
             if module.check_mode is False:
-                rc, out, err = module.run_command(cmd)
+                rc, out, err = run_pcs_command(module, cmd)
                 if rc != 0:
-                    module.fail_json(msg="failed starting the resource {0}: {1}".format(myResource['resource_name'],
-                                                                                        err))
+                    pcs_fail_json(module, msg="failed starting the resource {0}: {1}".format(myResource['resource_name'],
+                                                                                             err))
             result["changed"] = True
             result["msg"] = "The resource {0} has been moved".format(myResource['resource_name'])
         elif state == "debug-start":
@@ -236,10 +510,10 @@ def main():
                 cmd = "{0} resource debug-start {1}".format(module.params["pcs_util"],
                                                             myResource['resource_name'])
                 if module.check_mode is False:
-                    rc, out, err = module.run_command(cmd)
+                    rc, out, err = run_pcs_command(module, cmd)
                     if rc != 0:
-                        module.fail_json(msg="failed starting the resource {0} in debug mode: {1}".format(myResource['resource_name'],
-                                                                                                          err))
+                        pcs_fail_json(module, msg="failed starting the resource {0} in debug mode: {1}".format(myResource['resource_name'],
+                                                                                                               err))
                 result["changed"] = True
                 result["msg"] = "The resource {0} has been started in debug mode".format(myResource['resource_name'])
             else:
@@ -247,12 +521,15 @@ def main():
                 msg = "The resource {0} is already started. Stop the resource first before starting it in debug mode"
                 result["msg"] = msg.format(myResource['resource_name'])
 
+        simulation = simulate_cib_commands(module, cib_xml, cib_cmds)
+        if simulation is not None:
+            result["transition"] = parse_crm_simulate(simulation)
     except Exception as excep:
         if module.params["debug"]:
             excep = traceback.format_exc()
-        module.fail_json(msg='Error: %s' % to_native(excep))
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
 
-    module.exit_json(**result)
+    pcs_exit_json(module, **result)
 
 
 if __name__ == '__main__':
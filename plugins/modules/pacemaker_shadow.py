@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, Rhys Campbell (@rhysmeister) <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: pacemaker_shadow
+
+short_description: Batch changes to a Pacemaker cluster in a shadow CIB.
+
+description:
+  - Create a shadow copy of the CIB, and push the changes made to it to the cluster with a single cib-push.
+  - Other modules in this collection modify the shadow CIB when their I(file) option is set to the same path.
+  - Only the difference to the CIB at the time the shadow was created is pushed, so the cluster computes a single transition for all of the changes.
+
+author: Rhys Campbell (@rhysmeister)
+version_added: "1.1.0"
+
+extends_documentation_fragment:
+  - community.pacemaker.pacemaker_options
+
+options:
+  file:
+    description:
+      - Path to the shadow CIB.
+      - A copy of the original CIB is kept alongside it in <file>.orig.
+    type: str
+    required: true
+  state:
+    description:
+      - The desired state of the shadow CIB.
+      - When the state is set to "present" the shadow CIB is created from the active CIB unless it already exists.
+      - When the state is set to "pushed" the changes in the shadow CIB are pushed to the cluster and the shadow CIB is removed.
+      - When the state is set to "absent" the shadow CIB is removed without pushing any changes.
+    type: str
+    choices:
+      - "present"
+      - "pushed"
+      - "absent"
+    default: "present"
+  wait:
+    description:
+      - Wait up to 'n' seconds for the pushed changes to be applied.
+    type: int
+
+notes:
+    - Requires the pcs utility on the remote host.
+'''
+
+EXAMPLES = r'''
+- name: Create a shadow CIB
+  community.pacemaker.pacemaker_shadow:
+    file: /tmp/rollout.xml
+    state: present
+
+- name: Create the resources in the shadow CIB
+  community.pacemaker.pacemaker_resource:
+    resource_name: "{{ item.name }}"
+    resource_type: ocf:heartbeat:IPaddr2
+    resource_config:
+      ip: "{{ item.ip }}"
+    file: /tmp/rollout.xml
+  loop: "{{ virtual_ips }}"
+
+- name: Push all the changes to the cluster at once
+  community.pacemaker.pacemaker_shadow:
+    file: /tmp/rollout.xml
+    state: pushed
+    wait: 60
+'''
+
+RETURN = r'''
+changed:
+  description: If the module caused a change.
+  returned: on success
+  type: bool
+msg:
+  description: Status message.
+  returned: always
+  type: str
+pcs_timings:
+  description:
+    - The commands and pcsd requests run by the module, with their duration, exit code and output size, and the totals.
+    - See the I(profile) option for the fields.
+  returned: when profile is true, also on failure
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_native
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_options import (
+    pacemaker_common_argument_spec
+)
+
+from ansible_collections.community.pacemaker.plugins.module_utils.pacemaker_common import (
+    file_exists,
+    create_shadow_cib,
+    shadow_cib_changed,
+    push_shadow_cib,
+    remove_shadow_cib,
+    pcs_exit_json,
+    pcs_fail_json
+)
+
+import traceback
+
+
+def main():
+    argument_spec = pacemaker_common_argument_spec()
+    argument_spec.update(
+        file=dict(type='str', required=True),
+        state=dict(type='str', choices=["present", "pushed", "absent"], default="present"),
+        wait=dict(type='int', default=None),
+    )
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True,
+    )
+    result = {}
+    state = module.params["state"]
+    shadow_file = module.params["file"]
+
+    try:
+        shadow_exists = file_exists(shadow_file)
+
+        if state == "present":
+            if shadow_exists:
+                result["changed"] = False
+                result["msg"] = "The shadow CIB {0} already exists".format(shadow_file)
+            else:
+                if module.check_mode is False:
+                    create_shadow_cib(module, shadow_file)
+                result["changed"] = True
+                result["msg"] = "The shadow CIB {0} was created".format(shadow_file)
+        elif state == "pushed":
+            if shadow_exists is False:
+                pcs_fail_json(module, msg="The shadow CIB {0} does not exist".format(shadow_file))
+            if shadow_cib_changed(shadow_file):
+                if module.check_mode is False:
+                    push_shadow_cib(module, shadow_file, module.params["wait"])
+                    remove_shadow_cib(shadow_file)
+                result["changed"] = True
+                result["msg"] = "The shadow CIB {0} was pushed to the cluster".format(shadow_file)
+            else:
+                if module.check_mode is False:
+                    remove_shadow_cib(shadow_file)
+                result["changed"] = False
+                result["msg"] = "The shadow CIB {0} contains no changes".format(shadow_file)
+        elif state == "absent":
+            if shadow_exists:
+                if module.check_mode is False:
+                    remove_shadow_cib(shadow_file)
+                result["changed"] = True
+                result["msg"] = "The shadow CIB {0} was removed".format(shadow_file)
+            else:
+                result["changed"] = False
+                result["msg"] = "The shadow CIB {0} does not exist".format(shadow_file)
+    except Exception as excep:
+        if module.params["debug"]:
+            excep = traceback.format_exc()
+        pcs_fail_json(module, msg='Error: %s' % to_native(excep))
+
+    pcs_exit_json(module, **result)
+
+
+if __name__ == '__main__':
+    main()
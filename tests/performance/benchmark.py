@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# Copyright 2023, Rhys Campbell <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""
+Run every module in plugins/modules against fake pcs, cibadmin and crm_mon tools
+serving synthetic clusters of several sizes, and measure the wall time, the number
+of subprocesses started and the peak RSS of each run.
+Fails when a result is over the budget stored in budgets.json.
+
+    python tests/performance/benchmark.py
+    python tests/performance/benchmark.py --scales 10 100 1000 10000 --latency 0.05
+    python tests/performance/benchmark.py --update-budgets
+
+Requires ansible-core.
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from generate import node_names
+
+PERFORMANCE_DIR = os.path.dirname(os.path.realpath(__file__))
+COLLECTION_DIR = os.path.realpath(os.path.join(PERFORMANCE_DIR, "..", ".."))
+BUDGETS_FILE = os.path.join(PERFORMANCE_DIR, "budgets.json")
+FAKE_TOOLS = ["pcs", "cibadmin", "crm_mon", "systemctl"]
+DEFAULT_SCALES = [10, 100, 1000]
+NODES = 3
+
+# The module arguments for each module, given the benchmark directory and the number of resources.
+# Every scenario targets an object that already exists so the read path is measured, in check mode.
+# pacemaker_authentication and pacemaker_shadow run no command in check mode, they authenticate a new
+# member and push a changed shadow CIB instead.
+SCENARIOS = {
+    "pacemaker_authentication": lambda d, n: {
+        "members": node_names(NODES + 1),
+        "pcsd_tokens_file": os.path.join(d, "tokens"),
+        "password": "benchmark",
+        "_ansible_check_mode": False,
+    },
+    "pacemaker_cluster": lambda d, n: {
+        "name": "benchmark",
+        "members": node_names(NODES),
+        "corosync_file": os.path.join(d, "corosync.conf"),
+    },
+    "pacemaker_constraint": lambda d, n: {
+        "name": "res1",
+        "type": "location",
+        "resources": ["res1"],
+        "prefers": [{"node2": "INFINITY"}],
+    },
+    "pacemaker_fence": lambda d, n: {
+        "name": "fence-node1",
+        "agent": "fence_dummy",
+        "config": {"pcmk_host_list": "node1"},
+    },
+    "pacemaker_info": lambda d, n: {},
+    "pacemaker_property": lambda d, n: {
+        "property_name": "stonith-enabled",
+        "property_value": "false",
+    },
+    "pacemaker_resource": lambda d, n: {
+        "resource_name": "res{0}".format(n),
+        "resource_type": "ocf:heartbeat:Dummy",
+        "resource_config": {"state": "/run/res{0}.state".format(n)},
+    },
+    "pacemaker_shadow": lambda d, n: {
+        "file": os.path.join(d, "shadow.xml"),
+        "state": "pushed",
+        "_ansible_check_mode": False,
+    },
+}
+
+
+def list_modules():
+    modules_dir = os.path.join(COLLECTION_DIR, "plugins", "modules")
+    return sorted(f[:-3] for f in os.listdir(modules_dir) if f.startswith("pacemaker_") and f.endswith(".py"))
+
+
+def setup_environment(base_dir, resources):
+    """
+    Write the synthetic cluster and the fake tools to base_dir and return the
+    environment the modules are run with
+    """
+    os.makedirs(os.path.join(base_dir, "bin"))
+    os.makedirs(os.path.join(base_dir, "home"))
+    os.makedirs(os.path.join(base_dir, "ansible_collections", "community"))
+    os.symlink(COLLECTION_DIR, os.path.join(base_dir, "ansible_collections", "community", "pacemaker"))
+    for tool in FAKE_TOOLS:
+        os.symlink(os.path.join(PERFORMANCE_DIR, "bin", "fake_pcs.py"), os.path.join(base_dir, "bin", tool))
+    # Generated in a subprocess so the memory used for a large cluster isn't counted in the
+    # peak RSS of the modules, which are forked from this process
+    subprocess.check_call([sys.executable, os.path.join(PERFORMANCE_DIR, "generate.py"), base_dir, str(resources), str(NODES)])
+    env = dict(os.environ)
+    env.update({
+        "PATH": "{0}:{1}".format(os.path.join(base_dir, "bin"), os.environ.get("PATH", "")),
+        "PYTHONPATH": base_dir,
+        "HOME": os.path.join(base_dir, "home"),
+        "FAKE_PCS_DIR": base_dir,
+    })
+    return env
+
+
+def run_module(module_name, args, env, base_dir):
+    """
+    Run a module, in check mode unless the scenario says otherwise, and return its result with the wall time in seconds,
+    the number of subprocesses started and the peak RSS in MB.
+    The commands run by the module are read from the log of the fake tools.
+    """
+    calls_log = os.path.join(base_dir, "calls.log")
+    if os.path.exists(calls_log):
+        os.remove(calls_log)
+    args = dict({"_ansible_check_mode": True}, **args)
+    args_file = os.path.join(base_dir, "args.json")
+    with open(args_file, 'w') as f:
+        json.dump({"ANSIBLE_MODULE_ARGS": args}, f)
+    output_file = os.path.join(base_dir, "output.json")
+    measure = subprocess.check_output([sys.executable, os.path.join(PERFORMANCE_DIR, "measure.py"), output_file,
+                                       sys.executable, "-m",
+                                       "ansible_collections.community.pacemaker.plugins.modules.{0}".format(module_name),
+                                       args_file], env=env)
+    measure = json.loads(measure)
+    with open(output_file, 'r') as f:
+        output = f.read()
+    try:
+        result = json.loads(output)
+    except ValueError:
+        result = {"failed": True, "msg": output}
+    calls = []
+    if os.path.exists(calls_log):
+        with open(calls_log, 'r') as f:
+            calls = [json.loads(line) for line in f]
+    return {
+        "seconds": round(measure["seconds"], 3),
+        "subprocesses": len(calls),
+        "rss_mb": round(measure["rss_kb"] / 1024.0, 1),
+        "calls": calls,
+        "result": result,
+    }
+
+
+def check_budget(module_name, scale, measured, budgets, latency=0.0):
+    """
+    Return the list of the measurements that are over the budget.
+    The budgets are measured without latency, so the latency of each command is added to the time budget.
+    A scenario that runs no command measures nothing and fails.
+    """
+    over = []
+    if measured["subprocesses"] < 1:
+        over.append("no command run")
+    budget = budgets.get(module_name, {}).get(str(scale))
+    if budget is None:
+        return ["no budget"]
+    budget = dict(budget, seconds=budget["seconds"] + latency * budget["subprocesses"])
+    for key in ["seconds", "subprocesses", "rss_mb"]:
+        if measured[key] > budget[key]:
+            over.append("{0} {1} > {2}".format(key, measured[key], budget[key]))
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Numbers of resources")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each fake command takes")
+    parser.add_argument("--modules", nargs="+", default=list_modules(), help="Modules to run")
+    parser.add_argument("--budgets", default=BUDGETS_FILE, help="Budgets file")
+    parser.add_argument("--update-budgets", action="store_true",
+                        help="Write the budgets file from this run, with 50%% headroom on time and memory. Use without latency")
+    parser.add_argument("--verbose", action="store_true", help="Show the commands each module ran")
+    options = parser.parse_args(argv)
+
+    budgets = {}
+    if os.path.exists(options.budgets):
+        with open(options.budgets, 'r') as f:
+            budgets = json.load(f)
+    missing = [m for m in list_modules() if m not in SCENARIOS]
+    if missing:
+        print("No benchmark scenario for {0}".format(", ".join(missing)))
+        return 1
+
+    failures = 0
+    print("{0:<26} {1:>7} {2:>9} {3:>6} {4:>8}  {5}".format("module", "scale", "seconds", "procs", "rss_mb", "result"))
+    for scale in options.scales:
+        with tempfile.TemporaryDirectory(prefix="pacemaker_benchmark_") as base_dir:
+            env = setup_environment(base_dir, scale)
+            env["FAKE_PCS_LATENCY"] = str(options.latency)
+            for module_name in options.modules:
+                measured = run_module(module_name, SCENARIOS[module_name](base_dir, scale), env, base_dir)
+                if measured["result"].get("failed"):
+                    status = "FAILED: {0}".format(measured["result"].get("msg"))
+                    failures += 1
+                elif options.update_budgets:
+                    budgets.setdefault(module_name, {})[str(scale)] = {
+                        "seconds": round(max(measured["seconds"] * 1.5, 1.0), 1),
+                        "subprocesses": measured["subprocesses"],
+                        "rss_mb": round(measured["rss_mb"] * 1.5),
+                    }
+                    status = "budget updated"
+                else:
+                    over = check_budget(module_name, scale, measured, budgets, options.latency)
+                    status = "ok" if len(over) == 0 else "OVER BUDGET: {0}".format(", ".join(over))
+                    failures += len(over) > 0
+                print("{0:<26} {1:>7} {2:>9.3f} {3:>6} {4:>8}  {5}".format(module_name, scale, measured["seconds"],
+                                                                           measured["subprocesses"], measured["rss_mb"], status))
+                if options.verbose:
+                    for call in measured["calls"]:
+                        print("    {0}".format(" ".join(call)))
+    if options.update_budgets:
+        with open(options.budgets, 'w') as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
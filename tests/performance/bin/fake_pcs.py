@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# Copyright 2023, Rhys Campbell <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""
+A scriptable stand-in for pcs, cibadmin, crm_mon and systemctl, selected by the name it is called as.
+Output is read from the files generated in FAKE_PCS_DIR, every call sleeps for
+FAKE_PCS_LATENCY seconds and is appended to FAKE_PCS_DIR/calls.log.
+Commands that change the cluster succeed without doing anything.
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+import os
+import shutil
+import sys
+import time
+
+STATE_DIR = os.environ["FAKE_PCS_DIR"]
+LATENCY = float(os.environ.get("FAKE_PCS_LATENCY", 0))
+
+PCS_STATUS = """Cluster name: benchmark
+Cluster Summary:
+  * Stack: corosync
+  * Current DC: node1 (version 2.1.6) - partition with quorum
+
+Daemon Status:
+  corosync: active/enabled
+  pacemaker: active/enabled
+  pcsd: active/enabled
+"""
+
+
+def state_file(name):
+    return os.path.join(STATE_DIR, name)
+
+
+def output(name):
+    with open(state_file(name), 'r') as f:
+        sys.stdout.write(f.read())
+    return 0
+
+
+def pcs(args):
+    if len(args) > 1 and args[0] == "-f":
+        args = args[2:]
+    args = [a for a in args if not a.startswith(("--wait", "--request-timeout")) and a not in ["--force", "--local", "--debug"]]
+    if args[:1] == ["--version"]:
+        print("0.10.8")
+        if "--full" in args:
+            print("pcmk.resource.config.output-formats pcmk.resource.update-meta")
+        return 0
+    if args[:1] == ["status"]:
+        sys.stdout.write(PCS_STATUS)
+        return 0
+    if args[:2] == ["cluster", "status"]:
+        sys.stdout.write(PCS_STATUS)
+        return 0
+    if args[:2] == ["cluster", "cib"] and len(args) > 2:
+        shutil.copy(state_file("cib.xml"), args[2])
+        return 0
+    if args[:2] == ["cluster", "cib"]:
+        return output("cib.xml")
+    if args[:2] in [["resource", "status"], ["resource", "show"]]:
+        return output("resource_status.txt")
+    if args[:2] == ["property", "list"]:
+        return output("property_list.txt")
+    if args[:2] == ["stonith", "describe"]:
+        print("{0} - Fake fence agent".format(args[2]))
+        return 0
+    return 0  # Changes to the cluster
+
+
+def cibadmin(args):
+    if "--query" in args or "-Q" in args:
+        return output("cib.xml")
+    return 0
+
+
+def crm_mon(args):
+    return output("crm_mon.xml")
+
+
+def systemctl(args):
+    if args[:1] == ["show"]:
+        for unit in [a for a in args[1:] if not a.startswith("--")]:
+            print("Id={0}\nActiveState=active\nUnitFileState=enabled\n".format(unit))
+    return 0
+
+
+def main():
+    name = os.path.basename(sys.argv[0]).replace(".py", "")
+    with open(state_file("calls.log"), 'a') as log:
+        log.write(json.dumps([name] + sys.argv[1:]) + "\n")
+    time.sleep(LATENCY)
+    tools = {"pcs": pcs, "cibadmin": cibadmin, "crm_mon": crm_mon, "systemctl": systemctl}
+    if name not in tools:
+        sys.stderr.write("Unknown fake tool {0}\n".format(name))
+        return 127
+    return tools[name](sys.argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
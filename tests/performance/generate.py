@@ -0,0 +1,168 @@
+# Copyright 2023, Rhys Campbell <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""
+Generate synthetic CIB, crm_mon and pcs output for a cluster of a given size.
+Every resource is a ocf:heartbeat:Dummy primitive named res<n>, every tenth resource
+is in a group, every resource has a location constraint and two operations in the
+status section, and every node has a fencing device.
+A shadow CIB with a changed property is written alongside, to be pushed.
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+import os
+import sys
+
+
+def node_names(nodes):
+    return ["node{0}".format(i) for i in range(1, nodes + 1)]
+
+
+def resource_node(i, nodes):
+    return "node{0}".format(i % nodes + 1)
+
+
+def primitive_xml(i):
+    return ('<primitive class="ocf" id="res{0}" provider="heartbeat" type="Dummy">'
+            '<instance_attributes id="res{0}-instance_attributes">'
+            '<nvpair id="res{0}-instance_attributes-state" name="state" value="/run/res{0}.state"/>'
+            '</instance_attributes>'
+            '<operations><op id="res{0}-monitor-interval-10s" interval="10s" name="monitor" timeout="20s"/></operations>'
+            '</primitive>').format(i)
+
+
+def generate_cib(resources, nodes=3, epoch=100):
+    """
+    Return the output of cibadmin --query for the cluster
+    @resources - Number of resources
+    @nodes - Number of nodes
+    """
+    out = ['<cib crm_feature_set="3.16.2" validate-with="pacemaker-3.9" epoch="{0}" num_updates="4" admin_epoch="0" '
+           'have-quorum="1" dc-uuid="1">'.format(epoch)]
+    out.append('<configuration><crm_config><cluster_property_set id="cib-bootstrap-options">'
+               '<nvpair id="cib-bootstrap-options-stonith-enabled" name="stonith-enabled" value="false"/>'
+               '<nvpair id="cib-bootstrap-options-cluster-name" name="cluster-name" value="benchmark"/>'
+               '</cluster_property_set></crm_config>')
+    out.append('<nodes>')
+    for i, node in enumerate(node_names(nodes), 1):
+        out.append('<node id="{0}" uname="{1}"/>'.format(i, node))
+    out.append('</nodes><resources>')
+    for node in node_names(nodes):
+        out.append('<primitive class="stonith" id="fence-{0}" type="fence_dummy">'
+                   '<instance_attributes id="fence-{0}-instance_attributes">'
+                   '<nvpair id="fence-{0}-instance_attributes-pcmk_host_list" name="pcmk_host_list" value="{0}"/>'
+                   '</instance_attributes></primitive>'.format(node))
+    for i in range(1, resources + 1):
+        if i % 10 == 0:
+            out.append('<group id="group{0}">{1}</group>'.format(i, primitive_xml(i)))
+        else:
+            out.append(primitive_xml(i))
+    out.append('</resources><constraints>')
+    for i in range(1, resources + 1):
+        out.append('<rsc_location id="res{0}_location" node="{1}" rsc="res{0}" score="INFINITY"/>'.format(
+            i, resource_node(i, nodes)))
+    out.append('</constraints></configuration><status>')
+    for n, node in enumerate(node_names(nodes)):
+        out.append('<node_state id="{0}" uname="{1}" in_ccm="true" crmd="online" join="member" expected="member">'
+                   '<lrm id="{0}"><lrm_resources>'.format(n + 1, node))
+        for i in range(1, resources + 1):
+            if resource_node(i, nodes) == node:
+                out.append('<lrm_resource id="res{0}" type="Dummy" class="ocf" provider="heartbeat">'
+                           '<lrm_rsc_op id="res{0}_last_0" operation="start" call-id="{0}" rc-code="0" op-status="0"/>'
+                           '<lrm_rsc_op id="res{0}_monitor_10000" operation="monitor" call-id="{1}" rc-code="0" op-status="0"/>'
+                           '</lrm_resource>'.format(i, i + resources))
+        out.append('</lrm_resources></lrm></node_state>')
+    out.append('</status></cib>')
+    return "\n".join(out)
+
+
+def generate_crm_mon(resources, nodes=3):
+    """
+    Return the output of crm_mon --output-as=xml for the cluster
+    @resources - Number of resources
+    @nodes - Number of nodes
+    """
+    out = ['<pacemaker-result api-version="2.30" request="crm_mon --output-as=xml">',
+           '<summary><current_dc present="true" version="2.1.6" name="node1" id="1" with_quorum="true"/>'
+           '<nodes_configured number="{0}"/><resources_configured number="{1}" disabled="0" blocked="0"/>'
+           '</summary>'.format(nodes, resources + nodes),
+           '<nodes>']
+    for i, node in enumerate(node_names(nodes), 1):
+        out.append('<node name="{0}" id="{1}" online="true" standby="false" standby_onfail="false" maintenance="false" '
+                   'pending="false" unclean="false" shutdown="false" expected_up="true" is_dc="{2}" '
+                   'resources_running="{3}" type="member"/>'.format(node, i, str(i == 1).lower(),
+                                                                    len([r for r in range(1, resources + 1) if resource_node(r, nodes) == node])))
+    out.append('</nodes><resources>')
+    for node in node_names(nodes):
+        out.append('<resource id="fence-{0}" resource_agent="stonith:fence_dummy" role="Started" active="true" orphaned="false" '
+                   'blocked="false" managed="true" failed="false" failure_ignored="false" nodes_running_on="1">'
+                   '<node name="{0}" cached="true"/></resource>'.format(node))
+    for i in range(1, resources + 1):
+        resource = ('<resource id="res{0}" resource_agent="ocf:heartbeat:Dummy" role="Started" active="true" orphaned="false" '
+                    'blocked="false" managed="true" failed="false" failure_ignored="false" nodes_running_on="1">'
+                    '<node name="{1}" id="1" cached="true"/></resource>').format(i, resource_node(i, nodes))
+        if i % 10 == 0:
+            resource = '<group id="group{0}" number_resources="1" maintenance="false" managed="true" disabled="false">{1}</group>'.format(
+                i, resource)
+        out.append(resource)
+    out.append('</resources><status code="0" message="OK"/></pacemaker-result>')
+    return "\n".join(out)
+
+
+def generate_resource_status(resources, nodes=3):
+    """
+    Return the output of pcs resource status for the cluster
+    @resources - Number of resources
+    @nodes - Number of nodes
+    """
+    out = []
+    for i in range(1, resources + 1):
+        out.append("  * res{0}\t(ocf:heartbeat:Dummy):\t Started {1}".format(i, resource_node(i, nodes)))
+    return "\n".join(out)
+
+
+def generate_property_list():
+    return "Cluster Properties:\n cluster-name: benchmark\n stonith-enabled: false\n"
+
+
+def generate_corosync_conf(nodes=3, name="benchmark"):
+    out = ["totem {", "    version: 2", "    cluster_name: {0}".format(name), "    transport: knet", "}", "", "nodelist {"]
+    for i, node in enumerate(node_names(nodes), 1):
+        out.extend(["    node {", "        ring0_addr: {0}".format(node), "        name: {0}".format(node),
+                    "        nodeid: {0}".format(i), "    }"])
+    out.extend(["}", "", "quorum {", "    provider: corosync_votequorum", "}"])
+    return "\n".join(out) + "\n"
+
+
+def generate_pcsd_tokens(nodes=3):
+    tokens = {"format_version": 3, "data_version": 1, "tokens": {}, "ports": {}}
+    for node in node_names(nodes):
+        tokens["tokens"][node] = "00000000-0000-0000-0000-{0:012d}".format(int(node[4:]))
+        tokens["ports"][node] = 2224
+    return tokens
+
+
+def write_cluster(base_dir, resources, nodes=3):
+    """
+    Write the output of the tools for the cluster to base_dir, where the fake tools read it
+    """
+    cib = generate_cib(resources, nodes)
+    files = {
+        "cib.xml": cib,
+        # As created by pacemaker_shadow, with a change made to it
+        "shadow.xml": cib.replace('name="stonith-enabled" value="false"', 'name="stonith-enabled" value="true"'),
+        "shadow.xml.orig": cib,
+        "crm_mon.xml": generate_crm_mon(resources, nodes),
+        "resource_status.txt": generate_resource_status(resources, nodes),
+        "property_list.txt": generate_property_list(),
+        "corosync.conf": generate_corosync_conf(nodes),
+        "tokens": json.dumps(generate_pcsd_tokens(nodes)),
+    }
+    for name, content in files.items():
+        with open(os.path.join(base_dir, name), 'w') as f:
+            f.write(content)
+
+
+if __name__ == '__main__':
+    # python generate.py <directory> <resources> [<nodes>]
+    write_cluster(sys.argv[1], int(sys.argv[2]), *[int(n) for n in sys.argv[3:4]])
@@ -0,0 +1,33 @@
+# Copyright 2023, Rhys Campbell <rhyscampbell@bluewin.ch>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""
+Run a command with its output redirected to a file and print its wall time and peak RSS as json.
+
+    python measure.py <output file> <command> [<arg>...]
+
+The peak RSS reported by the kernel includes the peak RSS of the process the command was
+forked from, so the benchmark runs the modules through this small process rather than
+directly, as its own memory grows with the size of the results.
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def main():
+    with open(sys.argv[1], 'wb') as output:
+        start = time.monotonic()
+        process = subprocess.Popen(sys.argv[2:], stdout=output, stderr=subprocess.STDOUT)
+        # wait4 returns the resource usage of the command, including the processes it waited for
+        pid, status, rusage = os.wait4(process.pid, 0)
+        seconds = time.monotonic() - start
+        process.returncode = status
+    print(json.dumps({"seconds": seconds, "rss_kb": rusage.ru_maxrss, "status": status}))
+
+
+if __name__ == '__main__':
+    main()
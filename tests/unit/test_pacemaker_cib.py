@@ -0,0 +1,556 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import unittest
+import hashlib
+import os
+import sys
+import tempfile
+
+path = os.path.dirname(os.path.realpath(__file__))
+fixtures = "{0}/fixtures".format(path)
+path = "{0}/../../plugins/module_utils".format(path)
+sys.path.append(path)
+import pacemaker_cib
+
+cib_data = """
+<cib crm_feature_set="3.16.2" validate-with="pacemaker-3.9" epoch="42" num_updates="7" admin_epoch="0" dc-uuid="1">
+  <configuration>
+    <crm_config>
+      <cluster_property_set id="cib-bootstrap-options">
+        <nvpair id="cib-bootstrap-options-have-watchdog" name="have-watchdog" value="false"/>
+        <nvpair id="cib-bootstrap-options-cluster-name" name="cluster-name" value="debian"/>
+        <nvpair id="cib-bootstrap-options-stonith-enabled" name="stonith-enabled" value="false"/>
+      </cluster_property_set>
+    </crm_config>
+    <nodes>
+      <node id="1" uname="node1"/>
+      <node id="2" uname="node2"/>
+      <node id="3" uname="node3">
+        <instance_attributes id="nodes-3">
+          <nvpair id="nodes-3-standby" name="standby" value="on"/>
+        </instance_attributes>
+      </node>
+    </nodes>
+    <resources>
+      <group id="apache">
+        <primitive id="myFS" class="ocf" provider="heartbeat" type="Filesystem">
+          <instance_attributes id="myFS-instance_attributes">
+            <nvpair id="myFS-instance_attributes-device" name="device" value="nfs_server:/export/www"/>
+            <nvpair id="myFS-instance_attributes-directory" name="directory" value="/www"/>
+            <nvpair id="myFS-instance_attributes-fstype" name="fstype" value="nfs"/>
+          </instance_attributes>
+          <operations>
+            <op id="myFS-monitor-interval-20s" interval="20s" name="monitor" timeout="40s"/>
+          </operations>
+        </primitive>
+        <primitive id="httpd" class="ocf" provider="heartbeat" type="apache">
+          <instance_attributes id="httpd-instance_attributes">
+            <nvpair id="httpd-instance_attributes-configfile" name="configfile" value="/etc/httpd/conf/httpd.conf"/>
+          </instance_attributes>
+          <meta_attributes id="httpd-meta_attributes">
+            <nvpair id="httpd-meta_attributes-target-role" name="target-role" value="Stopped"/>
+          </meta_attributes>
+        </primitive>
+      </group>
+      <primitive id="mysql" class="ocf" provider="heartbeat" type="mysql"/>
+      <clone id="ping-clone">
+        <primitive id="ping" class="ocf" provider="pacemaker" type="ping">
+          <instance_attributes id="ping-instance_attributes">
+            <nvpair id="ping-instance_attributes-host_list" name="host_list" value="192.168.1.1"/>
+          </instance_attributes>
+        </primitive>
+      </clone>
+      <primitive id="fence_node1" class="stonith" type="fence_vbox">
+        <instance_attributes id="fence_node1-instance_attributes">
+          <nvpair id="fence_node1-instance_attributes-pcmk_host_list" name="pcmk_host_list" value="node1"/>
+        </instance_attributes>
+      </primitive>
+    </resources>
+    <constraints>
+      <rsc_location id="myFS_location" rsc="myFS" node="node1" score="100"/>
+      <rsc_order id="web_order2" first="myFS" first-action="start" then="httpd" then-action="start"/>
+      <rsc_order id="resourceSet_order">
+        <resource_set id="resourceSet_order-set">
+          <resource_ref id="myFS"/>
+          <resource_ref id="mysql"/>
+        </resource_set>
+      </rsc_order>
+      <rsc_colocation id="myResource_colocation" rsc="httpd" with-rsc="mysql" score="INFINITY"/>
+    </constraints>
+  </configuration>
+  <status>
+    <node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>
+    <node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member" expected="member"/>
+    <node_state id="3" uname="node3" in_ccm="false" crmd="offline" join="down" expected="down"/>
+  </status>
+</cib>
+"""
+
+crm_mon_data = """
+<pacemaker-result api-version="2.30" request="crm_mon --one-shot --output-as=xml">
+  <summary>
+    <stack type="corosync"/>
+    <current_dc present="true" version="2.1.5" name="node1" id="1" with_quorum="true"/>
+  </summary>
+  <nodes>
+    <node name="node1" id="1" online="true" standby="false" maintenance="false" is_dc="true" resources_running="4" type="member"/>
+    <node name="node2" id="2" online="true" standby="false" maintenance="false" is_dc="false" resources_running="1" type="member"/>
+    <node name="node3" id="3" online="false" standby="true" maintenance="false" is_dc="false" resources_running="0" type="member"/>
+  </nodes>
+  <resources>
+    <group id="apache" number_resources="2" managed="true" disabled="false">
+      <resource id="myFS" resource_agent="ocf:heartbeat:Filesystem" role="Started" active="true" managed="true" failed="false" nodes_running_on="1">
+        <node name="node1" id="1" cached="true"/>
+      </resource>
+      <resource id="httpd" resource_agent="ocf:heartbeat:apache" role="Stopped" active="false" managed="true" failed="false" nodes_running_on="0"/>
+    </group>
+    <resource id="mysql" resource_agent="ocf:heartbeat:mysql" role="Started" active="true" managed="true" failed="true" nodes_running_on="1">
+      <node name="node1" id="1" cached="true"/>
+    </resource>
+    <clone id="ping-clone" multi_state="false" unique="false" managed="true" failed="false">
+      <resource id="ping" resource_agent="ocf:pacemaker:ping" role="Started" active="true" managed="true" failed="false" nodes_running_on="1">
+        <node name="node1" id="1" cached="true"/>
+      </resource>
+      <resource id="ping" resource_agent="ocf:pacemaker:ping" role="Started" active="true" managed="true" failed="false" nodes_running_on="1">
+        <node name="node2" id="2" cached="true"/>
+      </resource>
+    </clone>
+    <resource id="fence_node1" resource_agent="stonith:fence_vbox" role="Started" active="true" managed="true" failed="false" nodes_running_on="1">
+      <node name="node1" id="1" cached="true"/>
+    </resource>
+  </resources>
+</pacemaker-result>
+"""
+
+crm_simulate_out = """Current cluster status:
+  * Node List:
+    * Online: [ node1 node2 ]
+
+  * Full List of Resources:
+    * myFS\t(ocf:heartbeat:Filesystem):\t Started node1
+    * ping\t(ocf:pacemaker:ping):\t Started node2
+
+Transition Summary:
+  * Fence (reboot) node3 'peer is no longer part of the cluster'
+  * Move       myFS       ( node1 -> node2 )
+  * Restart    httpd      ( node2 )  due to required myFS start
+  * Start      mysql      ( node2 )
+  * Stop       ping:1     ( node1 )  due to node availability
+  * Promote    db:0       ( Unpromoted -> Promoted node2 )
+
+Executing Cluster Transition:
+  * Resource action: myFS            stop on node1
+  * Resource action: myFS            start on node2
+"""
+
+# Pacemaker 1.1
+crm_simulate_out_old = """
+Transition Summary:
+ * Move       myFS\t(Started node1 -> node2)
+ * Start      mysql\t(node2)
+
+Executing cluster transition:
+ * Resource action: myFS            stop on node1
+"""
+
+
+def lrm(resources):
+    """
+    Return the operation history of a node for its node_state
+    @resources - [(id, [(operation, call-id, rc-code[, op-status]), ...]), ...]
+    """
+    return '<lrm><lrm_resources>{0}</lrm_resources></lrm>'.format("".join(
+        '<lrm_resource id="{0}">{1}</lrm_resource>'.format(id, "".join(
+            '<lrm_rsc_op id="{0}_{1}_{2}" operation="{1}" call-id="{2}" rc-code="{3}" op-status="{4}"/>'.format(id, *(op + (0,))[:4])
+            for op in ops))
+        for id, ops in resources))
+
+
+class TestPacemakerCibMethods(unittest.TestCase):
+
+    def test_new_cib_model(self):
+        cib = pacemaker_cib.new_cib_model()
+        for section in ["properties", "nodes", "resources", "stonith", "groups", "clones", "constraints"]:
+            self.assertEqual(cib[section], {})
+
+    def test_parse_cib_epoch(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        self.assertEqual(cib['epoch'], {"admin_epoch": 0, "epoch": 42, "num_updates": 7})
+        self.assertEqual(cib['dc_uuid'], "1")
+
+    def test_parse_cib_properties(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        self.assertEqual(cib['properties']['stonith-enabled'], "false")
+        self.assertEqual(cib['properties']['cluster-name'], "debian")
+        self.assertTrue("symmetric-cluster" not in cib['properties'])
+
+    def test_parse_cib_nodes(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        self.assertEqual(sorted(cib['nodes'].keys()), ["node1", "node2", "node3"])
+        self.assertTrue(cib['nodes']['node1']['online'])
+        self.assertFalse(cib['nodes']['node3']['online'])
+        self.assertEqual(cib['nodes']['node3']['attributes']['standby'], "on")
+
+    def test_parse_cib_node_states(self):
+        data = cib_data.replace('<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                                '<node_state id="2" uname="node2" in_ccm="1700000000" crmd="1700000001" join="member"/>'
+                                '<node_state id="remote1" uname="remote1" remote_node="true" in_ccm="true"/>'
+                                '<node_state id="guest1" uname="guest1" remote_node="true" in_ccm="false"/>')
+        cib = pacemaker_cib.parse_cib(data)
+        self.assertTrue(cib['nodes']['node2']['online'])  # Pacemaker 2.1.7+ timestamps
+        self.assertTrue(cib['nodes']['remote1']['online'])
+        self.assertEqual(cib['nodes']['guest1']['type'], "remote")
+        self.assertFalse(cib['nodes']['guest1']['online'])
+        # Remote nodes are only added with the nodes section
+        self.assertEqual(pacemaker_cib.parse_cib(data, sections=["resources"])['nodes'], {})
+
+    def test_cib_node_states(self):
+        nodes = pacemaker_cib.cib_node_states(pacemaker_cib.parse_cib(cib_data))
+        self.assertEqual(nodes['node1'], {"id": "1", "type": "member", "online": True, "standby": False,
+                                          "maintenance": False, "dc": True})
+        self.assertTrue(nodes['node3']['standby'])
+        self.assertFalse(nodes['node3']['online'])
+        self.assertFalse(nodes['node2']['dc'])
+        self.assertEqual(pacemaker_cib.cib_node_states(pacemaker_cib.parse_cib('<cib epoch="1"/>')), {})
+
+    def test_parse_cib_resources(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        self.assertEqual(sorted(cib['resources'].keys()), ["httpd", "myFS", "mysql", "ping"])
+        self.assertEqual(cib['resources']['myFS']['parent'], "apache")
+        self.assertEqual(cib['resources']['myFS']['instance_attributes']['fstype'], "nfs")
+        self.assertEqual(cib['resources']['httpd']['meta_attributes']['target-role'], "Stopped")
+        self.assertEqual(cib['resources']['mysql']['parent'], None)
+        self.assertEqual(cib['groups']['apache']['members'], ["myFS", "httpd"])
+        self.assertEqual(cib['clones']['ping-clone']['resource'], "ping")
+        self.assertEqual(cib['resources']['ping']['parent'], "ping-clone")
+
+    def test_parse_cib_stonith(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        self.assertEqual(list(cib['stonith'].keys()), ["fence_node1"])
+        self.assertTrue("fence_node1" not in cib['resources'])
+        self.assertEqual(cib['stonith']['fence_node1']['type'], "fence_vbox")
+
+    def test_parse_cib_constraints(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        self.assertEqual(cib['constraints']['myFS_location']['type'], "location")
+        self.assertEqual(cib['constraints']['myFS_location']['score'], "100")
+        self.assertEqual(cib['constraints']['myResource_colocation']['with-rsc'], "mysql")
+        self.assertEqual(cib['constraints']['resourceSet_order']['resource_sets'], [["myFS", "mysql"]])
+        # Lookups are by id so there are no partial matches
+        self.assertTrue("web_order2" in cib['constraints'])
+        self.assertTrue("web_order" not in cib['constraints'])
+
+    def test_parse_cib_empty(self):
+        cib = pacemaker_cib.parse_cib('<cib epoch="1" num_updates="0" admin_epoch="0"/>')
+        self.assertEqual(cib['resources'], {})
+        self.assertEqual(cib['epoch']['epoch'], 1)
+
+    def test_parse_crm_mon(self):
+        status = pacemaker_cib.parse_crm_mon(crm_mon_data)
+        self.assertEqual(status['dc'], "node1")
+        self.assertTrue(status['quorate'])
+        self.assertTrue(status['nodes']['node1']['is_dc'])
+        self.assertTrue(status['nodes']['node3']['standby'])
+        self.assertFalse(status['nodes']['node3']['online'])
+        self.assertEqual(status['resources']['myFS']['nodes'], ["node1"])
+        self.assertEqual(status['resources']['httpd']['role'], "Stopped")
+        self.assertTrue(status['resources']['mysql']['failed'])
+        self.assertEqual(status['resources']['ping']['nodes'], ["node1", "node2"])
+        self.assertEqual(len(status['resources']['ping']['instances']), 2)
+
+    def test_parse_crm_simulate(self):
+        transition = pacemaker_cib.parse_crm_simulate(crm_simulate_out)
+        self.assertEqual(len(transition['actions']), 6)
+        self.assertEqual(transition['actions'][0], {"action": "fence", "resource": None, "node": "node3", "from_node": None,
+                                                    "reason": "peer is no longer part of the cluster"})
+        self.assertEqual(transition['actions'][1], {"action": "move", "resource": "myFS", "node": "node2", "from_node": "node1",
+                                                    "reason": None})
+        self.assertEqual(transition['actions'][2]['reason'], "required myFS start")
+        self.assertEqual(transition['actions'][4]['node'], "node1")
+        self.assertEqual(transition['actions'][5]['node'], "node2")
+        self.assertIsNone(transition['actions'][5]['from_node'])
+        self.assertEqual(transition['counts'], {"fence": 1, "move": 1, "restart": 1, "start": 1, "stop": 1, "promote": 1})
+        transition = pacemaker_cib.parse_crm_simulate(crm_simulate_out_old)
+        self.assertEqual(transition['actions'][0]['from_node'], "node1")
+        self.assertEqual(transition['counts'], {"move": 1, "start": 1})
+        self.assertEqual(pacemaker_cib.parse_crm_simulate("Transition Summary:\n\nExecuting Cluster Transition:\n"),
+                         {"actions": [], "counts": {}})
+
+    def test_build_cluster_status(self):
+        services = {"corosync": {"active": True, "enabled": True},
+                    "pacemaker": {"active": True, "enabled": False},
+                    "pcsd": {"active": True, "enabled": True}}
+        corosync = {"cluster_name": "AMZ",
+                    "nodes": [{"name": "node1", "nodeid": 1, "addrs": ["node1"]}, {"name": "node3", "nodeid": 3, "addrs": ["node3"]}]}
+        status = pacemaker_cib.build_cluster_status(services, corosync, crm_mon_data)
+        self.assertTrue(status['configured'])
+        self.assertTrue(status['started'])
+        self.assertFalse(status['enabled'])
+        self.assertEqual(status['cluster_name'], "AMZ")
+        self.assertEqual(status['nodes'], ["node1", "node3"])
+        self.assertNotIn("node3", status['online_nodes'])
+        self.assertTrue(status['quorate'])
+        self.assertEqual(status['dc'], "node1")
+        services['pacemaker']['active'] = False
+        status = pacemaker_cib.build_cluster_status(services)
+        self.assertFalse(status['configured'])
+        self.assertFalse(status['started'])
+        self.assertIsNone(status['quorate'])
+        self.assertEqual(status['online_nodes'], [])
+
+    def test_build_cluster_info(self):
+        info = pacemaker_cib.build_cluster_info(pacemaker_cib.parse_cib(cib_data),
+                                                pacemaker_cib.parse_crm_mon(crm_mon_data))
+        self.assertEqual(info['dc'], "node1")
+        self.assertEqual(info['epoch']['epoch'], 42)
+        self.assertEqual(info['resources']['myFS']['role'], "Started")
+        self.assertEqual(info['resources']['myFS']['parent'], "apache")
+        self.assertEqual(info['resources']['myFS']['instance_attributes']['fstype'], "nfs")
+        self.assertEqual(info['stonith']['fence_node1']['nodes'], ["node1"])
+        self.assertTrue(info['nodes']['node1']['is_dc'])
+        self.assertEqual(info['nodes']['node3']['attributes']['standby'], "on")
+        self.assertTrue("myFS_location" in info['constraints'])
+
+    def test_parse_cib_sections(self):
+        cib = pacemaker_cib.parse_cib(cib_data, ["constraints"])
+        self.assertTrue("myFS_location" in cib['constraints'])
+        self.assertEqual(cib['resources'], {})
+        self.assertEqual(cib['properties'], {})
+        self.assertEqual(cib['nodes'], {})
+        self.assertTrue("history" not in cib)
+
+    def test_parse_cib_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cib_file = os.path.join(tmpdir, "cib.xml")
+            with open(cib_file, "w") as f:
+                f.write(cib_data)
+            for mode in ["r", "rb"]:
+                with open(cib_file, mode) as f:
+                    cib = pacemaker_cib.parse_cib(f)
+                self.assertEqual(cib['epoch']['epoch'], 42)
+                self.assertEqual(cib['groups']['apache']['members'], ["myFS", "httpd"])
+
+    def test_parse_cib_history(self):
+        ops = "".join('<lrm_rsc_op id="myFS_monitor_{0}" operation="monitor" call-id="{0}" rc-code="0"/>'.format(i) for i in range(1, 1000))
+        ops = '<lrm_rsc_op id="myFS_start_0" operation="start" call-id="0" rc-code="1"/>' + ops
+        data = cib_data.replace('<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                                '<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member">'
+                                '<lrm id="1"><lrm_resources><lrm_resource id="myFS" type="Filesystem" class="ocf" provider="heartbeat">'
+                                '{0}</lrm_resource></lrm_resources></lrm></node_state>'.format(ops))
+        cib = pacemaker_cib.parse_cib(data, pacemaker_cib.CIB_SECTIONS + ["history"])
+        self.assertTrue(cib['nodes']['node1']['online'])
+        history = cib['history']['myFS']['node1']
+        self.assertEqual(history['operations'], 1000)
+        self.assertEqual(history['failures'], 1)
+        self.assertEqual(history['last_operation'], "monitor")
+        self.assertEqual(history['last_call_id'], 999)
+
+    def test_cib_status(self):
+        data = cib_data.replace('<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                                '<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member">{0}</node_state>'.format(lrm([
+                                    ("myFS", [("start", 5, 0), ("monitor", 6, 0)]),
+                                    ("httpd", [("start", 7, 0), ("stop", 8, 0)]),
+                                    ("mysql", [("start", 9, 1)]),
+                                    ("ping", [("start", 10, 0), ("monitor", 11, 0)]),
+                                ])))
+        data = data.replace('<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                            '<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member">{0}</node_state>'.format(lrm([
+                                ("myFS", [("monitor", 3, 7)]),
+                                ("ping", [("start", 4, 0), ("monitor", 5, 0)]),
+                                ("fence_node1", [("start", 6, 0)]),
+                            ])))
+        data = data.replace('<node_state id="3" uname="node3" in_ccm="false" crmd="offline" join="down" expected="down"/>',
+                            '<node_state id="3" uname="node3" in_ccm="false" crmd="offline" join="down">{0}</node_state>'.format(lrm([
+                                ("ping", [("start", 4, 0)]),  # stale, the node is offline
+                            ])))
+        cib = pacemaker_cib.parse_cib(data, pacemaker_cib.CIB_SECTIONS + ["history"])
+        status = pacemaker_cib.cib_status(cib)
+        self.assertEqual(status['dc'], "node1")
+        self.assertTrue(status['nodes']['node1']['is_dc'])
+        self.assertTrue(status['nodes']['node3']['standby'])
+        self.assertEqual(status['resources']['myFS']['nodes'], ["node1"])
+        self.assertEqual(status['resources']['myFS']['role'], "Started")
+        self.assertEqual(status['resources']['myFS']['agent'], "ocf:heartbeat:Filesystem")
+        self.assertEqual(status['resources']['httpd']['role'], "Stopped")
+        self.assertFalse(status['resources']['httpd']['active'])
+        self.assertTrue(status['resources']['mysql']['failed'])
+        self.assertEqual(status['resources']['mysql']['nodes'], ["node1"])  # until it is stopped
+        self.assertEqual(status['resources']['ping']['nodes'], ["node1", "node2"])
+        self.assertEqual(len(status['resources']['ping']['instances']), 2)
+        self.assertEqual(status['resources']['fence_node1']['nodes'], ["node2"])
+        self.assertEqual(status['nodes']['node1']['resources_running'], 3)
+        # The same model as with crm_mon
+        info = pacemaker_cib.build_cluster_info(cib, status)
+        self.assertEqual(info['dc'], "node1")
+        self.assertEqual(info['resources']['myFS']['nodes'], ["node1"])
+        self.assertEqual(info['stonith']['fence_node1']['role'], "Started")
+
+    def test_cib_status_failed(self):
+        data = cib_data.replace('<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                                '<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member">{0}</node_state>'.format(lrm([
+                                    ("myFS", [("start", 5, 0), ("monitor", 6, 1)]),  # failed monitor
+                                    ("httpd", [("start", 7, 0), ("stop", 8, 1)]),  # failed stop
+                                    ("mysql", [("monitor", 9, 5)]),  # not installed
+                                    ("fence_node1", [("start", 10, 0, 2)]),  # timed out
+                                ])))
+        data = data.replace('<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                            '<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member">{0}</node_state>'.format(lrm([
+                                ("myFS", [("start", 3, 0), ("monitor", 4, 7)]),
+                                ("mysql", [("monitor", 5, 0)]),
+                                ("fence_node1", [("monitor", 6, 7)]),
+                            ])))
+        cib = pacemaker_cib.parse_cib(data, pacemaker_cib.CIB_SECTIONS + ["history"])
+        self.assertEqual(cib['history']['fence_node1']['node1']['failures'], 1)
+        status = pacemaker_cib.cib_status(cib)
+        for id in ["myFS", "httpd", "fence_node1"]:
+            self.assertTrue(status['resources'][id]['failed'], id)
+            self.assertEqual(status['resources'][id]['nodes'], ["node1"], id)
+            self.assertEqual(status['resources'][id]['role'], "Started", id)
+        self.assertTrue(status['resources']['mysql']['failed'])
+        self.assertEqual(status['resources']['mysql']['nodes'], ["node2"])
+        self.assertEqual(status['nodes']['node1']['resources_running'], 3)
+
+    def test_cib_status_pending(self):
+        data = cib_data.replace('<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                                '<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member">{0}</node_state>'.format(lrm([
+                                    ("myFS", [("start", -1, 0, -1)]),  # starting
+                                    ("httpd", [("start", 3, 0), ("monitor", 4, 0), ("stop", -1, 0, -1)]),  # stopping
+                                    ("mysql", [("start", 5, 0), ("stop", 6, 0), ("monitor", 7, 0, 1)]),  # monitor cancelled by the stop
+                                    ("fence_node1", [("monitor", -1, 0, -1)]),  # probing
+                                ])))
+        cib = pacemaker_cib.parse_cib(data, pacemaker_cib.CIB_SECTIONS + ["history"])
+        history = cib['history']['httpd']['node1']
+        self.assertEqual((history['pending'], history['last_operation'], history['operations']), ("stop", "monitor", 2))
+        status = pacemaker_cib.cib_status(cib)
+        self.assertEqual(status['resources']['myFS']['nodes'], ["node1"])
+        self.assertEqual(status['resources']['httpd']['nodes'], ["node1"])
+        self.assertEqual(status['resources']['mysql']['role'], "Stopped")
+        self.assertEqual(status['resources']['fence_node1']['role'], "Stopped")
+        self.assertFalse(any(resource['failed'] for resource in status['resources'].values()))
+
+    def test_cib_status_promotable(self):
+        data = cib_data.replace('<clone id="ping-clone">',
+                                '<clone id="ping-clone"><meta_attributes id="m"><nvpair id="p" name="promotable" value="true"/></meta_attributes>')
+        data = data.replace('<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                            '<node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member"><lrm><lrm_resources>'
+                            '<lrm_resource id="ping"><lrm_rsc_op id="ping_monitor_10000" operation="monitor" call-id="9" rc-code="8"/>'
+                            '</lrm_resource></lrm_resources></lrm></node_state>')
+        data = data.replace('<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member" expected="member"/>',
+                            '<node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member"><lrm><lrm_resources>'
+                            '<lrm_resource id="ping"><lrm_rsc_op id="ping_monitor_11000" operation="monitor" call-id="9" rc-code="0"/>'
+                            '</lrm_resource></lrm_resources></lrm></node_state>')
+        cib = pacemaker_cib.parse_cib(data, pacemaker_cib.CIB_SECTIONS + ["history"])
+        status = pacemaker_cib.cib_status(cib)
+        self.assertEqual(status['resources']['ping']['instances'], [{"role": "Promoted", "nodes": ["node1"]},
+                                                                    {"role": "Unpromoted", "nodes": ["node2"]}])
+        # A failed monitor of the promoted instance, it stays promoted until it is recovered
+        cib = pacemaker_cib.parse_cib(data.replace('call-id="9" rc-code="8"', 'call-id="9" rc-code="9"'),
+                                      pacemaker_cib.CIB_SECTIONS + ["history"])
+        status = pacemaker_cib.cib_status(cib)
+        self.assertTrue(status['resources']['ping']['failed'])
+        self.assertEqual(status['resources']['ping']['instances'][0], {"role": "Promoted", "nodes": ["node1"]})
+        self.assertTrue(pacemaker_cib.is_promotable(cib, "ping"))
+        self.assertFalse(pacemaker_cib.is_promotable(cib, "myFS"))
+
+    def test_resource_config_diff(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        diff = pacemaker_cib.resource_config_diff(cib['resources']['myFS'],
+                                                  {"device": "nfs_server:/export/www", "directory": "/var/www"},
+                                                  {"target-role": "Started"})
+        self.assertEqual(diff['instance_attributes'], {"directory": {"before": "/www", "after": "/var/www"}})
+        self.assertEqual(diff['meta_attributes'], {"target-role": {"before": None, "after": "Started"}})
+
+    def test_resource_config_diff_unchanged(self):
+        cib = pacemaker_cib.parse_cib(cib_data)
+        diff = pacemaker_cib.resource_config_diff(cib['resources']['httpd'], {}, {"target-role": "Stopped"})
+        self.assertEqual(diff, {"instance_attributes": {}, "meta_attributes": {}})
+        diff = pacemaker_cib.resource_config_diff(cib['resources']['mysql'], None, None)
+        self.assertEqual(diff, {"instance_attributes": {}, "meta_attributes": {}})
+
+    def write_disk_cib(self, tmpdir, data, signature=None, manager="pacemaker-based"):
+        cib_file = os.path.join(tmpdir, "cib.xml")
+        with open(cib_file, 'w') as f:
+            f.write(data)
+        with open("{0}.sig".format(cib_file), 'w') as f:
+            f.write(signature or pacemaker_cib.cib_digests(data)[0])
+        os.makedirs(os.path.join(tmpdir, "proc", "1"))
+        os.makedirs(os.path.join(tmpdir, "proc", "self"))
+        with open(os.path.join(tmpdir, "proc", "1", "comm"), 'w') as f:
+            f.write("{0}\n".format(manager))
+        return cib_file
+
+    def test_cib_digest(self):
+        data = '<cib epoch="1" num_updates="0" admin_epoch="0"><configuration><crm_config/>' \
+               '<nodes><node id="1" uname="a&amp;b"/></nodes></configuration><status/></cib>'
+        self.assertEqual(pacemaker_cib.cib_digests(data), [hashlib.md5(data.encode('utf-8')).hexdigest()] * 2)
+        pretty = """<cib epoch="1" num_updates="0" admin_epoch="0">
+  <configuration>
+    <crm_config/>
+    <nodes>
+      <node id="1" uname="a&amp;b"></node>
+    </nodes>
+  </configuration>
+  <status/>
+</cib>
+"""
+        self.assertEqual(pacemaker_cib.cib_digests(pretty), pacemaker_cib.cib_digests(data))
+        self.assertNotEqual(pacemaker_cib.cib_digests(data.replace('epoch="1"', 'epoch="2"')), pacemaker_cib.cib_digests(data))
+
+    def test_cib_digest_fixtures(self):
+        # cib.xml as written by Pacemaker 2.1.7 and later, and by earlier versions which escape differently
+        for name, index in [("cib.xml", 0), ("cib-2.1.6.xml", 1)]:
+            with open(os.path.join(fixtures, "{0}.sig".format(name)), 'r') as f:
+                signature = f.read().strip()
+            with open(os.path.join(fixtures, name), 'rb') as f:
+                self.assertEqual(pacemaker_cib.cib_digests(f)[index], signature, name)
+
+    def test_xml_escape(self):
+        value = "a&b <c> \"d\" it's\n\te\x01"
+        self.assertEqual(pacemaker_cib.xml_escape(value), "a&amp;b &lt;c&gt; &quot;d&quot; it's&#x0A;&#x09;e&#x01;")
+        self.assertEqual(pacemaker_cib.xml_escape(value, legacy=True), "a&amp;b &lt;c&gt; &quot;d&quot; it&apos;s\\n    e\\001")
+        self.assertEqual(pacemaker_cib.xml_escape("plain"), "plain")
+
+    def test_read_disk_cib(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cib_file = self.write_disk_cib(tmpdir, cib_data)
+            data = pacemaker_cib.read_disk_cib(cib_file, os.path.join(tmpdir, "proc"))
+            self.assertEqual(data, cib_data)
+            self.assertEqual(pacemaker_cib.parse_cib(data)['epoch']['epoch'], 42)
+        for name in ["cib.xml", "cib-2.1.6.xml"]:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                with open(os.path.join(fixtures, name), 'r') as f:
+                    data = f.read()
+                with open(os.path.join(fixtures, "{0}.sig".format(name)), 'r') as f:
+                    cib_file = self.write_disk_cib(tmpdir, data, signature=f.read())
+                self.assertEqual(pacemaker_cib.read_disk_cib(cib_file, os.path.join(tmpdir, "proc")), data)
+
+    def test_read_disk_cib_invalid(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cib_file = self.write_disk_cib(tmpdir, cib_data, signature="0" * 32)
+            with self.assertRaisesRegex(ValueError, "signature"):
+                pacemaker_cib.read_disk_cib(cib_file, os.path.join(tmpdir, "proc"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cib_file = self.write_disk_cib(tmpdir, cib_data, manager="bash")
+            with self.assertRaisesRegex(ValueError, "not running"):
+                pacemaker_cib.read_disk_cib(cib_file, os.path.join(tmpdir, "proc"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cib_file = self.write_disk_cib(tmpdir, cib_data)
+            os.remove("{0}.sig".format(cib_file))
+            with self.assertRaisesRegex(ValueError, "read"):
+                pacemaker_cib.read_disk_cib(cib_file, os.path.join(tmpdir, "proc"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cib_file = self.write_disk_cib(tmpdir, '<cib admin_epoch="0"><configuration/></cib>')
+            with self.assertRaisesRegex(ValueError, "epoch"):
+                pacemaker_cib.read_disk_cib(cib_file, os.path.join(tmpdir, "proc"))
+
+    def test_disk_get_cib(self):
+
+        class FakeAnsibleModule:
+
+            def __init__(self, params):
+                self.params = params
+
+        module = FakeAnsibleModule({"backend": "pcs", "file": None})
+        self.assertIsNone(pacemaker_cib.disk_get_cib(module, "/nonexistent/cib.xml"))
+        module = FakeAnsibleModule({"backend": "disk", "file": None})
+        self.assertIsNone(pacemaker_cib.disk_get_cib(module, "/nonexistent/cib.xml"))
@@ -5,6 +5,13 @@ import pathlib
 import os
 import sys
 import json
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from unittest import mock
 
 path = os.path.dirname(os.path.realpath(__file__))
 path = "{0}/../../plugins/module_utils".format(path)
@@ -140,26 +147,87 @@ quorum {
 }
 """
 
+corosync_nodelist_data = """
+totem {
+    version: 2
+    cluster_name: AMZ
+    transport: knet
+    token: 10000
+    crypto_cipher: aes256
+}
 
-class FakeAnsinbleModule:
-
-    params = {
-        "pcs_util": "pcs",
-        "local": True,
-        "force": True,
-        "name": "debian",
-        "state": "started",
-        "enabled": True,
-        "wait": None
+nodelist {
+    node {
+        ring0_addr: amazonlinux1.pacemaker
+        ring1_addr: fd00::1
+        name: node1
+        nodeid: 1
+    }
+    node {
+        ring0_addr: amazonlinux2.pacemaker
+        nodeid: 2
     }
+}
+
+quorum {
+    provider: corosync_votequorum
+    two_node: 1
+}
+"""
+
+
+DEFAULT_PARAMS = {
+    "pcs_util": "pcs",
+    "local": True,
+    "force": True,
+    "name": "debian",
+    "state": "started",
+    "enabled": True,
+    "wait": None
+}
+
+
+class FailJson(Exception):
+    pass
+
 
-    def __init__(self):
-        self.msg = ""
-        self.warning = ""
+class FakeAnsibleModule:
+    """
+    Records the commands run and answers them with the scripted responses, a list of
+    (rc, out, err) returned in turn, or a function of the command. (0, "", "") once the list runs out.
+    """
+
+    def __init__(self, params=None, check_mode=False, responses=None, tmpdir="/tmp"):
+        self.params = dict(DEFAULT_PARAMS if params is None else params)
+        self.check_mode = check_mode
+        self.responses = responses if callable(responses) else list(responses or [])
+        self.tmpdir = tmpdir
+        self.no_log_values = set()
+        self.cmds = []
+        self.result = None
+
+    def get_bin_path(self, arg, required=False):
+        return arg if os.path.isabs(arg) else "/usr/bin/{0}".format(arg)
+
+    def run_command(self, cmd):
+        self.cmds.append(cmd)
+        if callable(self.responses):
+            return self.responses(cmd)
+        if len(self.responses) > 0:
+            return self.responses.pop(0)
+        return 0, "", ""
+
+    def fail_json(self, **result):
+        self.result = result
+        raise FailJson(result['msg'])
 
 
 class TestPacemakerCommonMethods(unittest.TestCase):
 
+    def setUp(self):
+        pacemaker_common.PCS_CACHE.clear()
+        pacemaker_common.PCS_CACHE_STATS['hits'] = 0
+
     def test_file_exists(self):
         test_file = "/tmp/random_file_4nbdcfgsadfuarz23r.txt"
         pathlib.Path(test_file).touch()
@@ -185,22 +253,8 @@ class TestPacemakerCommonMethods(unittest.TestCase):
         self.assertTrue(pacemaker_common.pcsd_tokens_file() == "~/.pcs/tokens")
 
     def test_build_cluster_auth_cmd_test1(self):
-
-        class FakeAnsinbleModule:
-
-            params = {
-                "pcs_util": "pcs",
-                "username": "hacluster",
-                "password": "mysecretpassword",
-                "local": True,
-                "force": True,
-            }
-
-            def __init__(self):
-                self.msg = ""
-                self.warning = ""
-
-        module = FakeAnsinbleModule()
+        module = FakeAnsibleModule({"pcs_util": "pcs", "username": "hacluster", "password": "mysecretpassword",
+                                    "local": True, "force": True})
         members_without_port = ["server1", "server2", "server3"]
         port = None
         cmd = pacemaker_common.build_cluster_auth_cmd(module, members_without_port, port)
@@ -215,22 +269,8 @@ class TestPacemakerCommonMethods(unittest.TestCase):
         self.assertTrue("mysecretpassword" in cmd)
 
     def test_build_cluster_auth_cmd_test2(self):
-
-        class FakeAnsinbleModule:
-
-            params = {
-                "pcs_util": "/usr/bin/pcs",
-                "username": "hacluster",
-                "password": "mysecretpassword",
-                "local": False,
-                "force": False,
-            }
-
-            def __init__(self):
-                self.msg = ""
-                self.warning = ""
-
-        module = FakeAnsinbleModule()
+        module = FakeAnsibleModule({"pcs_util": "/usr/bin/pcs", "username": "hacluster", "password": "mysecretpassword",
+                                    "local": False, "force": False})
         members_without_port = ["server1", "server2", "server3"]
         port = 1234
         cmd = pacemaker_common.build_cluster_auth_cmd(module, members_without_port, port)
@@ -245,8 +285,7 @@ class TestPacemakerCommonMethods(unittest.TestCase):
         self.assertTrue("mysecretpassword" in cmd)
 
     def test_build_cluster_setup_cmd_test1(self):
-
-        module = FakeAnsinbleModule()
+        module = FakeAnsibleModule()
         members_without_port = ["server1", "server2", "server3"]
         cmd = pacemaker_common.build_cluster_setup_cmd(module, members_without_port)
         self.assertTrue(cmd.startswith("pcs cluster setup"))
@@ -259,6 +298,19 @@ class TestPacemakerCommonMethods(unittest.TestCase):
         self.assertTrue("--enable" in cmd)
         self.assertTrue("--name" in cmd)
 
+    def test_build_cluster_node_cmds(self):
+        module = FakeAnsibleModule()
+        diff = {"add": ["server4", "server5"], "remove": ["server1", "server2"]}
+        cmds = pacemaker_common.build_cluster_node_cmds(module, diff, {"version": [0, 10, 8]})
+        self.assertEqual(cmds, ["pcs cluster node add server4 --start --enable",
+                                "pcs cluster node add server5 --start --enable",
+                                "pcs cluster node remove server1 server2"])
+        module.params = dict(module.params, enabled=False, wait=60)
+        cmds = pacemaker_common.build_cluster_node_cmds(module, diff, {"version": [0, 9, 169]})
+        self.assertEqual(cmds[0], "pcs cluster node add server4 --start --wait=60")
+        self.assertEqual(cmds[2:], ["pcs cluster node remove server1", "pcs cluster node remove server2"])
+        self.assertEqual(pacemaker_common.build_cluster_node_cmds(module, {"add": [], "remove": []}, {"version": [0, 10]}), [])
+
     def test_get_cluster_name(self):
         corosync_file = "/tmp/corosync.conf.test.1hcsdf6wq4rghbsdjc"
         with open(corosync_file, "w") as file:
@@ -267,9 +319,455 @@ class TestPacemakerCommonMethods(unittest.TestCase):
         self.assertTrue(cluster_name == "debian")
 
     def test_get_cluster_resources(self):
-        module = FakeAnsinbleModule()
+        module = FakeAnsibleModule()
         data = "VirtualIP	(ocf::heartbeat:IPaddr2):	Started\nWebSite	(ocf::heartbeat:apache):	Started\n"
         results = pacemaker_common.get_cluster_resources(module, data)
         self.assertIsInstance(results, list)
         self.assertIsInstance(results[0], dict)
         self.assertTrue(results[0]['resource_name'] == "VirtualIP")
+
+    def test_get_cib(self):
+        module = FakeAnsibleModule()
+        data = "\n<cib epoch=\"1\" num_updates=\"0\" admin_epoch=\"0\"/>\n"
+        self.assertTrue(pacemaker_common.get_cib(module, data=data).startswith("<cib"))
+        # The CIB read by the pcsd or disk backend is used as is
+        self.assertEqual(pacemaker_common.get_cib(module, backend_cib=data), data)
+
+    def test_pcs_base_cmd(self):
+        module = FakeAnsibleModule()
+        self.assertEqual(pacemaker_common.pcs_base_cmd(module), "pcs")
+        module.params = dict(module.params, file="/tmp/shadow.xml")
+        self.assertEqual(pacemaker_common.pcs_base_cmd(module), "pcs -f /tmp/shadow.xml")
+
+    def test_get_cib_from_file(self):
+        shadow_file = "/tmp/shadow_cib_test_7tgsd63hdgf.xml"
+        with open(shadow_file, "w") as f:
+            f.write("<cib epoch=\"2\" num_updates=\"0\" admin_epoch=\"0\"/>")
+        module = FakeAnsibleModule()
+        module.params = dict(module.params, file=shadow_file)
+        self.assertTrue("epoch=\"2\"" in pacemaker_common.get_cib(module))
+        os.remove(shadow_file)
+
+    def test_shadow_cib(self):
+        shadow_file = "/tmp/shadow_cib_test_0hdf63jsdfg.xml"
+        original = pacemaker_common.shadow_cib_original(shadow_file)
+        self.assertEqual(original, "{0}.orig".format(shadow_file))
+        for f in [shadow_file, original]:
+            with open(f, "w") as cib:
+                cib.write("<cib epoch=\"1\" num_updates=\"0\" admin_epoch=\"0\"/>")
+        self.assertFalse(pacemaker_common.shadow_cib_changed(shadow_file))
+        with open(shadow_file, "w") as cib:
+            cib.write("<cib epoch=\"2\" num_updates=\"0\" admin_epoch=\"0\"/>")
+        self.assertTrue(pacemaker_common.shadow_cib_changed(shadow_file))
+        pacemaker_common.remove_shadow_cib(shadow_file)
+        self.assertFalse(pacemaker_common.file_exists(shadow_file))
+        self.assertFalse(pacemaker_common.file_exists(original))
+
+    def test_run_cib_commands(self):
+
+        def run_command(cmd):
+            if cmd.startswith("pcs cluster cib /"):
+                with open(cmd.split(" ")[-1], "w") as f:
+                    f.write("<cib/>")
+            return 0, "", ""
+
+        module = FakeAnsibleModule({"pcs_util": "pcs", "file": None}, responses=run_command)
+        pacemaker_common.run_cib_commands(module, ["resource delete myFS"])
+        self.assertEqual(module.cmds, ["pcs resource delete myFS"])
+
+        module = FakeAnsibleModule({"pcs_util": "pcs", "file": None}, responses=run_command)
+        pacemaker_common.run_cib_commands(module, ["resource delete myFS", "resource delete httpd"])
+        self.assertEqual(module.cmds, ["pcs cluster cib /tmp/cib-batch.xml",
+                                       "pcs -f /tmp/cib-batch.xml resource delete myFS",
+                                       "pcs -f /tmp/cib-batch.xml resource delete httpd",
+                                       "pcs cluster cib-push /tmp/cib-batch.xml diff-against=/tmp/cib-batch.xml.orig"])
+        self.assertFalse(pacemaker_common.file_exists("/tmp/cib-batch.xml"))
+
+    def test_get_crm_mon(self):
+        module = FakeAnsibleModule()
+        data = "\n<crm_mon version=\"1.1.23\"/>\n"
+        self.assertTrue(pacemaker_common.get_crm_mon(module, data).startswith("<crm_mon"))
+
+    def test_parse_pcs_version(self):
+        capabilities = pacemaker_common.parse_pcs_version("0.9.169\n")
+        self.assertEqual(capabilities['version'], [0, 9, 169])
+        self.assertEqual(capabilities['capabilities'], [])
+        self.assertFalse(pacemaker_common.pcs_version_at_least(capabilities, [0, 10]))
+        capabilities = pacemaker_common.parse_pcs_version("0.11.5\n"
+                                                          "booth booth.enable-authfile.set booth.enable-authfile.unset\n"
+                                                          "pcmk.resource.config.output-formats\n")
+        self.assertEqual(capabilities['version'], [0, 11, 5])
+        self.assertTrue(pacemaker_common.pcs_version_at_least(capabilities, [0, 10]))
+        self.assertTrue(pacemaker_common.pcs_has_capability(capabilities, "pcmk.resource.config.output-formats"))
+        self.assertFalse(pacemaker_common.pcs_has_capability(capabilities, "pcmk.resource.status.output-formats"))
+
+    def test_get_pcs_capabilities(self):
+        pcs_file = "/tmp/fake_pcs_test_6sdfg73hdfs"
+        cache_file = "/tmp/fake_pcs_test_cache_dir_7shdf/pcs_capabilities.json"
+        pathlib.Path(pcs_file).touch()
+
+        module = FakeAnsibleModule({"pcs_util": pcs_file},
+                                   responses=lambda cmd: (0, "0.10.8\npcmk.resource.config.output-formats\n", ""))
+        capabilities = pacemaker_common.get_pcs_capabilities(module, cache_file)
+        self.assertEqual(capabilities['version'], [0, 10, 8])
+        self.assertEqual(len(module.cmds), 1)
+        # Served from the cache
+        capabilities = pacemaker_common.get_pcs_capabilities(module, cache_file)
+        self.assertEqual(capabilities['version'], [0, 10, 8])
+        self.assertEqual(len(module.cmds), 1)
+        # A new pcs binary invalidates the cache
+        os.utime(pcs_file, (0, 0))
+        pacemaker_common.get_pcs_capabilities(module, cache_file)
+        self.assertEqual(len(module.cmds), 2)
+        os.remove(pcs_file)
+        os.remove(cache_file)
+        os.rmdir(os.path.dirname(cache_file))
+
+    def test_update_pcsd_tokens_file(self):
+        tokens_file = "/tmp/fake_pcsd_tokens_dir_8sdf6/tokens"
+        json_data = pacemaker_common.update_pcsd_tokens_file(tokens_file, {"node1": {"token": "abc", "port": 2224}})
+        self.assertEqual(json_data["tokens"], {"node1": "abc"})
+        self.assertEqual(json_data["data_version"], 1)
+        self.assertTrue(pacemaker_common.valid_pcsd_tokens_data(pacemaker_common.get_json_file(tokens_file)))
+        json_data = pacemaker_common.update_pcsd_tokens_file(tokens_file,
+                                                             {"node2": {"token": "def", "port": 2225}},
+                                                             ["node1"])
+        self.assertEqual(json_data["tokens"], {"node2": "def"})
+        self.assertEqual(json_data["ports"], {"node2": 2225})
+        self.assertEqual(pacemaker_common.get_json_file(tokens_file), json_data)
+        self.assertEqual(os.stat(tokens_file).st_mode & 0o777, 0o600)
+        os.remove(tokens_file)
+        os.remove("{0}.lock".format(tokens_file))
+        os.rmdir(os.path.dirname(tokens_file))
+
+    def test_update_pcsd_tokens_file_known_hosts(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tokens_file = os.path.join(tmpdir, "tokens")
+            known_hosts_file = pacemaker_common.pcsd_known_hosts_file(tokens_file)
+            self.assertEqual(known_hosts_file, os.path.join(tmpdir, "known-hosts"))
+            json_data = pacemaker_common.update_pcsd_tokens_file(tokens_file, {"node1": {"token": "abc", "port": 2224}},
+                                                                 known_hosts=True)
+            self.assertEqual(json_data["known_hosts"], {"node1": {"dest_list": [{"addr": "node1", "port": 2224}], "token": "abc"}})
+            self.assertFalse(os.path.exists(tokens_file))
+            # The known-hosts file is updated by default once it exists
+            json_data = pacemaker_common.update_pcsd_tokens_file(tokens_file, {"node2": {"token": "def", "port": 2225}}, ["node1"])
+            self.assertEqual(list(json_data["known_hosts"].keys()), ["node2"])
+            self.assertEqual(json_data["data_version"], 2)
+            self.assertEqual(pacemaker_common.get_json_file(known_hosts_file), json_data)
+            self.assertFalse(os.path.exists(tokens_file))
+
+    def test_update_pcsd_tokens_file_concurrent(self):
+        tokens_file = "/tmp/fake_pcsd_tokens_dir_3hfd7/tokens"
+        threads = []
+        for i in range(20):
+            threads.append(threading.Thread(target=pacemaker_common.update_pcsd_tokens_file,
+                                            args=(tokens_file, {"node{0}".format(i): {"token": str(i), "port": 2224}})))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        json_data = pacemaker_common.get_json_file(tokens_file)
+        self.assertEqual(len(json_data["tokens"]), 20)  # No update was lost
+        self.assertEqual(json_data["data_version"], 20)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(tokens_file))), ["tokens", "tokens.lock"])
+        os.remove(tokens_file)
+        os.remove("{0}.lock".format(tokens_file))
+        os.rmdir(os.path.dirname(tokens_file))
+
+    def test_run_pcs_command(self):
+        module = FakeAnsibleModule({"profile": True}, responses=lambda cmd: (0, "Cluster Properties:\n", ""))
+        module.no_log_values.add("S3cr3t")
+        del pacemaker_common.PCS_TIMINGS[:]
+        rc, out, err = pacemaker_common.run_pcs_command(module, "pcs cluster auth node1 -u hacluster -p S3cr3t")
+        self.assertEqual(rc, 0)
+        pacemaker_common.run_pcs_command(module, ["pcs", "property", "list"])
+        timings = pacemaker_common.pcs_timings()
+        self.assertEqual(timings['total_commands'], 2)
+        self.assertEqual(timings['commands'][0]['cmd'], "pcs cluster auth node1 -u hacluster -p ********")
+        self.assertEqual(timings['commands'][1]['cmd'], "pcs property list")
+        self.assertEqual(timings['commands'][1]['rc'], 0)
+        self.assertEqual(timings['commands'][1]['stdout_bytes'], len(out))
+        self.assertEqual(timings['total_stdout_bytes'], 2 * len(out))
+        self.assertGreaterEqual(timings['total_seconds'], 0)
+        module.params = {"profile": False}
+        pacemaker_common.run_pcs_command(module, "pcs status")
+        self.assertEqual(pacemaker_common.pcs_timings()['total_commands'], 2)
+        del pacemaker_common.PCS_TIMINGS[:]
+
+    def test_pcs_fail_json(self):
+        module = FakeAnsibleModule({"profile": True}, responses=[(1, "", "Error: unable to get cib")])
+        del pacemaker_common.PCS_TIMINGS[:]
+        pacemaker_common.run_pcs_command(module, "cibadmin --query")
+        with self.assertRaises(FailJson):
+            pacemaker_common.pcs_fail_json(module, msg="Failed")
+        self.assertEqual(module.result['pcs_timings']['commands'][0]['rc'], 1)
+        module.params = {"profile": False}
+        with self.assertRaises(FailJson):
+            pacemaker_common.pcs_fail_json(module, msg="Failed")
+        self.assertEqual(module.result, {"msg": "Failed"})
+        del pacemaker_common.PCS_TIMINGS[:]
+
+    def test_pcs_subcommand(self):
+        self.assertEqual(pacemaker_common.pcs_subcommand(["pcs", "-f", "cib.xml", "cluster", "auth", "node1"]), "cluster auth")
+        self.assertEqual(pacemaker_common.pcs_subcommand(["pcs", "--force", "property", "list", "--all"]), "property list")
+        self.assertEqual(pacemaker_common.pcs_subcommand(["pcs", "--version"]), "")
+
+    def test_command_with_deadline(self):
+        module = FakeAnsibleModule({"pcs_util": "/usr/sbin/pcs", "request_timeout": 60})
+        self.assertEqual(pacemaker_common.command_with_deadline(module, "/usr/sbin/pcs property list"),
+                         "/usr/sbin/pcs property list")
+        self.assertEqual(pacemaker_common.command_with_deadline(module, "/usr/sbin/pcs cluster auth node1 -u hacluster"),
+                         ["/usr/sbin/pcs", "--request-timeout=60", "cluster", "auth", "node1", "-u", "hacluster"])
+        self.assertEqual(pacemaker_common.command_with_deadline(module, "pcs cluster stop --all", 30.5),
+                         ["/usr/bin/timeout", "--kill-after=5", "30.5", "pcs", "--request-timeout=30", "cluster", "stop", "--all"])
+        self.assertEqual(pacemaker_common.command_with_deadline(module, ["cibadmin", "--query"], 10),
+                         ["/usr/bin/timeout", "--kill-after=5", "10.0", "cibadmin", "--query"])
+
+    def test_run_pcs_command_retries(self):
+        busy = (1, "", "Call cib_replace failed (-11): Resource temporarily unavailable")
+        backoff = pacemaker_common.RETRY_BACKOFF
+        pacemaker_common.RETRY_BACKOFF = 0.01
+        try:
+            module = FakeAnsibleModule({"retries": 2}, responses=[busy, (0, "ok", "")])
+            self.assertEqual(pacemaker_common.run_pcs_command(module, "cibadmin --query"), (0, "ok", ""))
+            self.assertEqual(len(module.cmds), 2)
+            module = FakeAnsibleModule({"retries": 2}, responses=[busy, busy, busy, (0, "ok", "")])
+            self.assertEqual(pacemaker_common.run_pcs_command(module, "pcs cluster start --all"), busy)
+            self.assertEqual(len(module.cmds), 3)
+            # Commands that may have been applied before they failed are not retried
+            for cmd in ["cibadmin --replace", "pcs resource create res1 ocf:heartbeat:Dummy", "pcs cluster node add node4"]:
+                module = FakeAnsibleModule({"retries": 2}, responses=[busy, (0, "ok", "")])
+                self.assertEqual(pacemaker_common.run_pcs_command(module, cmd), busy)
+                self.assertEqual(len(module.cmds), 1)
+            # Other errors are not retried
+            module = FakeAnsibleModule({"retries": 2}, responses=[(1, "", "Error: unable to find resource 'res1'"), (0, "ok", "")])
+            self.assertEqual(pacemaker_common.run_pcs_command(module, "pcs resource delete res1")[0], 1)
+            self.assertEqual(len(module.cmds), 1)
+        finally:
+            pacemaker_common.RETRY_BACKOFF = backoff
+
+    def test_run_pcs_command_task_timeout(self):
+
+        def run_command(cmd):
+            cmd = [shutil.which(cmd[0])] + cmd[1:]
+            process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            return process.returncode, process.stdout, process.stderr
+
+        module = FakeAnsibleModule({"task_timeout": 1, "request_timeout": 60}, responses=run_command)
+        task_start = pacemaker_common.TASK_START
+        pacemaker_common.TASK_START = time.time()
+        try:
+            start = time.time()
+            rc, out, err = pacemaker_common.run_pcs_command(module, "sleep 10")
+            self.assertLess(time.time() - start, 5)
+            self.assertEqual(rc, 124)
+            self.assertIn("task_timeout", err)
+            # The next command has no time left
+            with self.assertRaises(FailJson):
+                pacemaker_common.run_pcs_command(module, "true")
+        finally:
+            pacemaker_common.TASK_START = task_start
+
+    def test_get_cib_local(self):
+        module = FakeAnsibleModule({"file": None, "local": True},
+                                   responses=lambda cmd: (0, "<cib epoch=\"1\" num_updates=\"0\" admin_epoch=\"0\"/>", ""))
+        pacemaker_common.get_cib(module)
+        self.assertEqual(module.cmds, ["cibadmin --query --local"])
+        module.params = dict(module.params, local=False)
+        pacemaker_common.get_cib(module)
+        self.assertEqual(module.cmds[1], "cibadmin --query")
+
+    def test_read_only_cache_key(self):
+        module = FakeAnsibleModule({"pcs_util": "/usr/sbin/pcs"})
+        for cmd in ["/usr/sbin/pcs -f /tmp/shadow.xml property list --all", "pcs status", "cibadmin --query --local",
+                    ["cibadmin", "-Q"], "crm_mon --output-as=xml", "pcs resource config res1"]:
+            self.assertIsNotNone(pacemaker_common.read_only_cache_key(module, cmd, {}), cmd)
+        for cmd in ["pcs property set stonith-enabled=false", "pcs cluster cib /tmp/shadow.xml", "cibadmin --replace",
+                    "pcs resource create res1 ocf:heartbeat:Dummy", "pcs --version", "pcs cluster stop --all"]:
+            self.assertIsNone(pacemaker_common.read_only_cache_key(module, cmd, {}), cmd)
+        self.assertNotEqual(pacemaker_common.read_only_cache_key(module, "pcs status", {}),
+                            pacemaker_common.read_only_cache_key(module, "pcs status", {"check_rc": True}))
+
+    def test_run_pcs_command_cache(self):
+
+        def run_command(cmd):
+            if cmd == "pcs status nodes":
+                return 1, "", "Error: cluster is not running"
+            return 0, "<cib epoch=\"{0}\" num_updates=\"0\" admin_epoch=\"0\"/>".format(len(module.cmds)), ""
+
+        module = FakeAnsibleModule({"pcs_util": "pcs", "file": None, "profile": True}, responses=run_command)
+        del pacemaker_common.PCS_TIMINGS[:]
+        # Checking then changing a resource reads the CIB and the state once each
+        cib = pacemaker_common.get_cib(module)
+        pacemaker_common.get_crm_mon(module)
+        self.assertEqual(pacemaker_common.get_cib(module), cib)
+        pacemaker_common.get_crm_mon(module)
+        self.assertEqual(len(module.cmds), 2)
+        pacemaker_common.run_pcs_command(module, "pcs resource create res1 ocf:heartbeat:Dummy")
+        # The change invalidates the cache
+        self.assertNotEqual(pacemaker_common.get_cib(module), cib)
+        self.assertEqual(len(module.cmds), 4)
+        # Failures aren't cached
+        pacemaker_common.run_pcs_command(module, "pcs status nodes")
+        pacemaker_common.run_pcs_command(module, "pcs status nodes")
+        self.assertEqual(len(module.cmds), 6)
+        timings = pacemaker_common.pcs_timings()
+        self.assertEqual(timings['total_commands'], 6)
+        self.assertEqual(timings['cache_hits'], 2)
+        del pacemaker_common.PCS_TIMINGS[:]
+
+    def test_simulate_cib_commands(self):
+
+        def run_command(cmd):
+            if cmd.startswith("crm_simulate"):
+                with open(cmd.split()[-1]) as f:
+                    return 0, "Transition Summary:\n  * Start      res1     ( node1 )\n# {0}".format(f.read()), ""
+            return 0, "", ""
+
+        def fake_module(tmpdir, check_mode, simulate):
+            return FakeAnsibleModule({"pcs_util": "pcs", "file": None, "simulate": simulate}, check_mode, run_command, tmpdir)
+
+        cib_xml = "<cib epoch=\"1\" num_updates=\"0\" admin_epoch=\"0\"/>"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            module = fake_module(tmpdir, False, True)
+            self.assertIsNone(pacemaker_common.simulate_cib_commands(module, cib_xml, ["resource delete res1"]))
+            module = fake_module(tmpdir, True, False)
+            self.assertIsNone(pacemaker_common.simulate_cib_commands(module, cib_xml, ["resource delete res1"]))
+            module = fake_module(tmpdir, True, True)
+            self.assertIsNone(pacemaker_common.simulate_cib_commands(module, cib_xml, []))
+            self.assertEqual(module.cmds, [])
+            shadow_file = os.path.join(tmpdir, "cib-simulate.xml")
+            out = pacemaker_common.simulate_cib_commands(module, cib_xml, ["resource create res1 ocf:heartbeat:Dummy"])
+            self.assertIn(cib_xml, out)
+            self.assertEqual(module.cmds, ["pcs -f {0} resource create res1 ocf:heartbeat:Dummy".format(shadow_file),
+                                           "crm_simulate --simulate --xml-file {0}".format(shadow_file)])
+            self.assertFalse(os.path.exists(shadow_file))
+
+    def test_parse_corosync_conf(self):
+        conf = pacemaker_common.parse_corosync_conf(corosync_data)
+        self.assertEqual(conf['totem']['cluster_name'], "debian")
+        self.assertEqual(conf['totem']['interface'][0]['bindnetaddr'], "127.0.0.1")
+        self.assertEqual(conf['logging']['logger_subsys'], [{"subsys": "QUORUM", "debug": "off"}])
+        self.assertNotIn("logfile", conf['logging'])
+        self.assertEqual(conf['quorum']['expected_votes'], "2")
+        with self.assertRaises(ValueError):
+            pacemaker_common.parse_corosync_conf("totem {\n    version: 2\n")
+        with self.assertRaises(ValueError):
+            pacemaker_common.parse_corosync_conf("}\n")
+
+    def test_corosync_cluster_info(self):
+        info = pacemaker_common.corosync_cluster_info(pacemaker_common.parse_corosync_conf(corosync_nodelist_data))
+        self.assertEqual(info['cluster_name'], "AMZ")
+        self.assertEqual(info['transport'], "knet")
+        self.assertEqual(info['timings'], {"token": 10000})
+        self.assertEqual(info['nodes'], [
+            {"name": "node1", "nodeid": 1, "addrs": ["amazonlinux1.pacemaker", "fd00::1"]},
+            {"name": "amazonlinux2.pacemaker", "nodeid": 2, "addrs": ["amazonlinux2.pacemaker"]},
+        ])
+        self.assertEqual(info['quorum']['two_node'], "1")
+        info = pacemaker_common.corosync_cluster_info(pacemaker_common.parse_corosync_conf(corosync_data))
+        self.assertEqual(info['timings'], {"token": 3000, "token_retransmits_before_loss_const": 10})
+        self.assertEqual(info['nodes'], [])
+
+    def test_corosync_nodes_diff(self):
+        info = pacemaker_common.corosync_cluster_info(pacemaker_common.parse_corosync_conf(corosync_nodelist_data))
+        self.assertEqual(pacemaker_common.corosync_nodes_diff(info, ["node1", "amazonlinux2.pacemaker"]), {"add": [], "remove": []})
+        self.assertEqual(pacemaker_common.corosync_nodes_diff(info, ["amazonlinux1.pacemaker", "node3"]),
+                         {"add": ["node3"], "remove": ["amazonlinux2.pacemaker"]})
+
+    def test_corosync_nodes_diff_names(self):
+        info = {"nodes": [{"name": "node1.example.com", "nodeid": 1, "addrs": ["node1.example.com"]},
+                          {"name": "node2", "nodeid": 2, "addrs": ["node2"]},
+                          {"name": "node3", "nodeid": 3, "addrs": ["node3"]}]}
+        addresses = {"node3": "10.0.0.3", "10.0.0.3": "10.0.0.3", "node4": "10.0.0.4"}
+
+        def getaddrinfo(host, port):
+            if host not in addresses:
+                raise socket.gaierror("Name or service not known")
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (addresses[host], 0))]
+
+        with mock.patch.object(pacemaker_common.socket, "getaddrinfo", getaddrinfo):
+            # Short and fully qualified names, in any case, and an address the node name resolves to
+            self.assertEqual(pacemaker_common.corosync_nodes_diff(info, ["NODE1", "node2.example.com", "10.0.0.3"]),
+                             {"add": [], "remove": []})
+            self.assertEqual(pacemaker_common.corosync_nodes_diff(info, ["node1.other.com", "node2", "node4"]),
+                             {"add": ["node1.other.com", "node4"], "remove": ["node1.example.com", "node3"]})
+        self.assertTrue(pacemaker_common.node_names_match("node1", "Node1.example.com"))
+        self.assertFalse(pacemaker_common.node_names_match("10", "10.0.0.1"))
+        self.assertFalse(pacemaker_common.node_names_match("node1.a.com", "node1.b.com"))
+
+    def test_load_corosync_conf(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            corosync_file = os.path.join(tmpdir, "corosync.conf")
+            with open(corosync_file, "w") as f:
+                f.write(corosync_nodelist_data)
+            conf = pacemaker_common.load_corosync_conf(corosync_file)
+            # Served from the cache while the file is unchanged
+            self.assertIs(pacemaker_common.load_corosync_conf(corosync_file), conf)
+            with open(corosync_file, "w") as f:
+                f.write(corosync_data)
+            os.utime(corosync_file, (0, 0))
+            self.assertEqual(pacemaker_common.load_corosync_conf(corosync_file)['totem']['cluster_name'], "debian")
+            self.assertEqual(pacemaker_common.get_cluster_name(corosync_file), "debian")
+
+    def test_parse_systemctl_show(self):
+        out = "Id=corosync.service\nActiveState=active\nUnitFileState=enabled\n\n" \
+              "Id=pacemaker.service\nActiveState=failed\nUnitFileState=disabled\n\n" \
+              "Id=pcsd.service\nActiveState=inactive\nUnitFileState=\n"
+        services = pacemaker_common.parse_systemctl_show(out)
+        self.assertEqual(services, {"corosync": {"active": True, "enabled": True},
+                                    "pacemaker": {"active": False, "enabled": False},
+                                    "pcsd": {"active": False, "enabled": False}})
+        self.assertEqual(pacemaker_common.parse_systemctl_show("")['corosync'], {"active": False, "enabled": False})
+
+    def test_get_cluster_services(self):
+        module = FakeAnsibleModule({}, responses=lambda cmd: (
+            0, "".join("Id={0}\nActiveState=active\nUnitFileState=enabled\n\n".format(u) for u in cmd[3:]), ""))
+        services = pacemaker_common.get_cluster_services(module)
+        self.assertEqual(len(module.cmds), 1)
+        self.assertEqual(module.cmds[0][:3], ["/usr/bin/systemctl", "show", "--property=Id,ActiveState,UnitFileState"])
+        self.assertTrue(all(s['active'] and s['enabled'] for s in services.values()))
+
+    def test_node_batches(self):
+        nodes = ["node1", "node2", "node3", "node4", "node5"]
+        self.assertEqual(pacemaker_common.node_batches(nodes), [nodes])
+        self.assertEqual(pacemaker_common.node_batches(nodes, 2), [["node1", "node2"], ["node3", "node4"], ["node5"]])
+        self.assertEqual(pacemaker_common.node_batches(nodes, 3, ["node5", "node9", "node2"]),
+                         [["node5", "node2", "node1"], ["node3", "node4"]])
+        self.assertEqual(pacemaker_common.node_batches([], 2), [])
+
+    def test_online_corosync_nodes(self):
+        # corosync.conf names the nodes by address or fully qualified name, crm_mon by their uname
+        info = {"nodes": [{"name": "192.168.0.1", "nodeid": 1, "addrs": ["192.168.0.1"]},
+                          {"name": "node2.example.com", "nodeid": None, "addrs": ["192.168.0.2"]},
+                          {"name": "node3.example.com", "nodeid": 3, "addrs": ["192.168.0.3"]},
+                          {"name": "node4", "nodeid": 4, "addrs": ["192.168.0.4"]}]}
+        crm_mon_nodes = {"node1": {"id": "1", "online": True},
+                         "node2": {"id": "2", "online": True},
+                         "node3": {"id": "3", "online": False},
+                         "NODE4.example.com": {"id": "4", "online": True}}
+        self.assertEqual(pacemaker_common.online_corosync_nodes(info, crm_mon_nodes), ["192.168.0.1", "node2.example.com", "node4"])
+        self.assertEqual(pacemaker_common.online_corosync_nodes(info, {}), [])
+        # The nodeid wins over a matching name
+        crm_mon_nodes = {"node2": {"id": "3", "online": False}, "node3": {"id": "2", "online": True}}
+        info = {"nodes": [{"name": "node2", "nodeid": 3, "addrs": []}]}
+        self.assertEqual(pacemaker_common.online_corosync_nodes(info, crm_mon_nodes), [])
+
+    def test_local_corosync_node(self):
+        info = {"nodes": [{"name": "node1", "nodeid": 1, "addrs": ["10.0.0.1"]},
+                          {"name": "node2", "nodeid": 2, "addrs": [socket.gethostname()]}]}
+        self.assertEqual(pacemaker_common.local_corosync_node(info), "node2")
+        self.assertIsNone(pacemaker_common.local_corosync_node({"nodes": info['nodes'][:1]}))
+        # By address, e.g. the node of a single node cluster set up with localhost
+        info = {"nodes": [{"name": "node1", "nodeid": 1, "addrs": ["10.0.0.1"]},
+                          {"name": "localhost", "nodeid": 2, "addrs": ["localhost"]}]}
+        self.assertEqual(pacemaker_common.local_corosync_node(info), "localhost")
+
+    def test_run_pcs_command_use_cache(self):
+        module = FakeAnsibleModule({}, responses=lambda cmd: (0, "<crm_mon/>", ""))
+        pacemaker_common.get_crm_mon(module)
+        pacemaker_common.get_crm_mon(module)
+        self.assertEqual(len(module.cmds), 1)
+        # Polling reads the state again
+        pacemaker_common.get_crm_mon(module, use_cache=False)
+        self.assertEqual(len(module.cmds), 2)
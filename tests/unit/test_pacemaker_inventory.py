@@ -0,0 +1,170 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import unittest
+import os
+import tempfile
+from unittest import mock
+
+from ansible.errors import AnsibleError
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import init_plugin_loader, inventory_loader
+
+path = os.path.dirname(os.path.realpath(__file__))
+try:
+    from ansible_collections.community.pacemaker.plugins.inventory import pacemaker
+except ImportError:  # Not run by ansible-test, load the checkout as the collection
+    collections = tempfile.mkdtemp()
+    os.makedirs(os.path.join(collections, "ansible_collections", "community"))
+    os.symlink(os.path.realpath("{0}/../..".format(path)), os.path.join(collections, "ansible_collections", "community", "pacemaker"))
+    init_plugin_loader([collections])
+    from ansible_collections.community.pacemaker.plugins.inventory import pacemaker
+
+cib_data = """
+<cib epoch="3" num_updates="1" admin_epoch="0" dc-uuid="2">
+  <configuration>
+    <crm_config>
+      <cluster_property_set id="cib-bootstrap-options">
+        <nvpair id="cib-bootstrap-options-cluster-name" name="cluster-name" value="web-prod"/>
+      </cluster_property_set>
+    </crm_config>
+    <nodes>
+      <node id="1" uname="node1"/>
+      <node id="2" uname="node2"/>
+      <node id="3" uname="node3">
+        <instance_attributes id="nodes-3">
+          <nvpair id="nodes-3-standby" name="standby" value="on"/>
+        </instance_attributes>
+      </node>
+      <node id="remote1" type="remote" uname="remote1"/>
+    </nodes>
+    <resources/>
+    <constraints/>
+  </configuration>
+  <status>
+    <node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>
+    <node_state id="2" uname="node2" in_ccm="true" crmd="online" join="member" expected="member"/>
+    <node_state id="3" uname="node3" in_ccm="false" crmd="offline" join="down" expected="down"/>
+    <node_state id="remote1" uname="remote1" remote_node="true" in_ccm="true"/>
+  </status>
+</cib>
+"""
+
+
+class FakePcsdClient(object):
+    """
+    Answers get_cib for the hosts in cibs and fails like an unreachable pcsd for the others
+    """
+    cibs = {}
+    clients = []
+
+    def __init__(self, addr, token, port=2224, timeout=60, **kwargs):
+        self.addr = addr
+        self.token = token
+        self.port = port
+        self.kwargs = kwargs
+        FakePcsdClient.clients.append(self)
+
+    def auth(self, username, password):
+        self.token = "new-token"
+        return self.token
+
+    def get_cib(self):
+        if self.addr not in FakePcsdClient.cibs:
+            raise pacemaker.PcsdError("Request to pcsd on {0}:{1} failed: Connection refused".format(self.addr, self.port))
+        return FakePcsdClient.cibs[self.addr]
+
+
+class TestPacemakerInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        FakePcsdClient.cibs = {"node2": cib_data}
+        FakePcsdClient.clients = []
+        patcher = mock.patch.object(pacemaker, "PcsdClient", FakePcsdClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_config(self, config):
+        config_file = os.path.join(self.tmpdir.name, "cluster.pacemaker.yml")
+        with open(config_file, "w") as f:
+            f.write("plugin: community.pacemaker.pacemaker\n{0}".format(config))
+        return config_file
+
+    def parse(self, config, cache=True):
+        plugin = inventory_loader.get(pacemaker.InventoryModule.NAME)
+        inventory = InventoryData()
+        plugin.parse(inventory, DataLoader(), self.write_config(config), cache)
+        if plugin.get_option('cache'):
+            plugin.update_cache_if_changed()  # as done by the inventory manager
+        return inventory
+
+    def group_hosts(self, inventory, group):
+        return sorted(host.name for host in inventory.groups[group].get_hosts())
+
+    def test_verify_file(self):
+        plugin = pacemaker.InventoryModule()
+        self.assertTrue(plugin.verify_file(self.write_config("")))
+        other = os.path.join(self.tmpdir.name, "hosts.yml")
+        with open(other, "w") as f:
+            f.write("all: {}")
+        self.assertFalse(plugin.verify_file(other))
+
+    def test_groups(self):
+        inventory = self.parse("clusters:\n  - seeds: [node2]\ntoken: abc\n")
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod"), ["node1", "node2", "node3", "remote1"])
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_dc"), ["node2"])
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_online"), ["node1", "node2", "remote1"])
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_offline"), ["node3"])
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_standby"), ["node3"])
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_remote"), ["remote1"])
+        hostvars = inventory.get_host("node2").get_vars()
+        self.assertEqual(hostvars["pacemaker_cluster"], "web-prod")
+        self.assertTrue(hostvars["pacemaker_dc"])
+        self.assertEqual(inventory.get_host("remote1").get_vars()["pacemaker_node_type"], "remote")
+        # The certificate is verified by default
+        self.assertEqual(FakePcsdClient.clients[0].kwargs, {"validate_certs": True, "ca_path": None})
+
+    def test_cluster_options(self):
+        inventory = self.parse("clusters:\n  - seeds: [node2]\n    name: db\n    port: 2225\ngroup_prefix: ha_\n"
+                               "password: secret\nvalidate_certs: false\nca_path: /etc/pcsd.crt\n"
+                               "keyed_groups:\n  - key: pacemaker_node_type\n    prefix: type\n")
+        self.assertEqual(self.group_hosts(inventory, "ha_db_dc"), ["node2"])
+        self.assertEqual(self.group_hosts(inventory, "type_remote"), ["remote1"])
+        client = FakePcsdClient.clients[0]
+        self.assertEqual((client.port, client.token), (2225, "new-token"))
+        self.assertEqual(client.kwargs, {"validate_certs": False, "ca_path": "/etc/pcsd.crt"})
+
+    def test_seed_fallback(self):
+        inventory = self.parse("clusters:\n  - seeds: [node1, node2, node3]\ntoken: abc\n")
+        self.assertEqual([client.addr for client in FakePcsdClient.clients], ["node1", "node2"])
+        self.assertIn("node1", inventory.hosts)
+        with self.assertRaises(AnsibleError) as context:
+            self.parse("clusters:\n  - seeds: [node1, node3]\ntoken: abc\n")
+        self.assertIn("node1, node3", str(context.exception))
+        with self.assertRaises(AnsibleError):
+            self.parse("clusters:\n  - seeds: [node2]\n")  # neither a token nor a password
+
+    def test_cache(self):
+        config = "clusters:\n  - seeds: [node2]\ntoken: abc\ncache: true\ncache_plugin: ansible.builtin.jsonfile\n" \
+                 "cache_connection: {0}\ncache_timeout: 300\n".format(os.path.join(self.tmpdir.name, "cache"))
+        self.parse(config)  # miss
+        self.assertEqual(len(FakePcsdClient.clients), 1)
+        FakePcsdClient.cibs = {}
+        inventory = self.parse(config)  # hit, pcsd is not contacted
+        self.assertEqual(len(FakePcsdClient.clients), 1)
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_dc"), ["node2"])
+        # A refresh, e.g. --flush-cache, fetches the CIB again
+        FakePcsdClient.cibs = {"node2": cib_data.replace('dc-uuid="2"', 'dc-uuid="1"')}
+        inventory = self.parse(config, cache=False)
+        self.assertEqual(len(FakePcsdClient.clients), 2)
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_dc"), ["node1"])
+        FakePcsdClient.cibs = {}
+        inventory = self.parse(config)  # the refreshed node list was cached
+        self.assertEqual(self.group_hosts(inventory, "pacemaker_web_prod_dc"), ["node1"])
+        # Without the cache pcsd is contacted on every run
+        FakePcsdClient.cibs = {"node2": cib_data}
+        self.parse("clusters:\n  - seeds: [node2]\ntoken: abc\n")
+        self.parse("clusters:\n  - seeds: [node2]\ntoken: abc\n")
+        self.assertEqual(len(FakePcsdClient.clients), 4)
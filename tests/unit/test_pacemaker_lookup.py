@@ -0,0 +1,86 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import unittest
+import os
+import tempfile
+from unittest import mock
+
+from ansible.plugins.loader import init_plugin_loader, lookup_loader
+
+path = os.path.dirname(os.path.realpath(__file__))
+try:
+    from ansible_collections.community.pacemaker.plugins.lookup import pacemaker_cib
+except ImportError:  # Not run by ansible-test, load the checkout as the collection
+    collections = tempfile.mkdtemp()
+    os.makedirs(os.path.join(collections, "ansible_collections", "community"))
+    os.symlink(os.path.realpath("{0}/../..".format(path)), os.path.join(collections, "ansible_collections", "community", "pacemaker"))
+    init_plugin_loader([collections])
+    from ansible_collections.community.pacemaker.plugins.lookup import pacemaker_cib
+
+cib_data = """
+<cib epoch="3" num_updates="1" admin_epoch="0" dc-uuid="1">
+  <configuration>
+    <crm_config>
+      <cluster_property_set id="cib-bootstrap-options">
+        <nvpair id="cib-bootstrap-options-stonith-enabled" name="stonith-enabled" value="false"/>
+      </cluster_property_set>
+    </crm_config>
+    <nodes>
+      <node id="1" uname="node1"/>
+    </nodes>
+    <resources/>
+    <constraints/>
+  </configuration>
+  <status>
+    <node_state id="1" uname="node1" in_ccm="true" crmd="online" join="member" expected="member"/>
+  </status>
+</cib>
+"""
+
+
+class FakePcsdClient(object):
+    """
+    Counts the fetches of the CIB
+    """
+    fetches = 0
+
+    def __init__(self, addr, token, port=2224, timeout=60, **kwargs):
+        pass
+
+    def get_cib(self):
+        FakePcsdClient.fetches += 1
+        return cib_data
+
+
+class TestPacemakerCibLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        FakePcsdClient.fetches = 0
+        pacemaker_cib.CIB_MODELS.clear()
+        patcher = mock.patch.object(pacemaker_cib, "PcsdClient", FakePcsdClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def lookup(self, play, *terms, **kwargs):
+        variables = {"ansible_play_name": play, "ansible_play_hosts_all": ["node1", "node2"]}
+        kwargs = dict({"host": "node1", "token": "abc", "cache": True, "cache_connection": self.tmpdir.name}, **kwargs)
+        return lookup_loader.get("community.pacemaker.pacemaker_cib").run(list(terms), variables, **kwargs)
+
+    def test_query(self):
+        self.assertEqual(self.lookup("play1", "property:stonith-enabled", "dc", "constraint:none"), ["false", "node1", False])
+
+    def test_cache_scoped_to_play(self):
+        self.lookup("play1", "dc")
+        pacemaker_cib.CIB_MODELS.clear()  # as in the worker process of the next task
+        self.lookup("play1", "dc")
+        self.assertEqual(FakePcsdClient.fetches, 1)
+        self.lookup("play2", "dc")
+        self.assertEqual(FakePcsdClient.fetches, 2)
+        self.lookup("play2", "dc", refresh=True)
+        self.assertEqual(FakePcsdClient.fetches, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
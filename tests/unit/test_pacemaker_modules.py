@@ -0,0 +1,149 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import unittest
+import io
+import json
+import os
+import shlex
+import tempfile
+from unittest import mock
+
+from ansible.module_utils import basic
+from ansible.module_utils.testing import patch_module_args
+
+path = os.path.dirname(os.path.realpath(__file__))
+try:
+    from ansible_collections.community.pacemaker.plugins.modules import pacemaker_resource
+except ImportError:  # Not run by ansible-test, load the checkout as the collection
+    from ansible.plugins.loader import init_plugin_loader
+    collections = tempfile.mkdtemp()
+    os.makedirs(os.path.join(collections, "ansible_collections", "community"))
+    os.symlink(os.path.realpath("{0}/../..".format(path)), os.path.join(collections, "ansible_collections", "community", "pacemaker"))
+    init_plugin_loader([collections])
+    from ansible_collections.community.pacemaker.plugins.modules import pacemaker_resource
+from ansible_collections.community.pacemaker.plugins.modules import pacemaker_constraint, pacemaker_property
+from ansible_collections.community.pacemaker.plugins.module_utils import pacemaker_common
+
+cib_data = """
+<cib epoch="3" num_updates="1" admin_epoch="0">
+  <configuration>
+    <crm_config>
+      <cluster_property_set id="cib-bootstrap-options">
+        <nvpair id="cib-bootstrap-options-cluster-name" name="cluster-name" value="web-prod"/>
+        <nvpair id="cib-bootstrap-options-stonith-enabled" name="stonith-enabled" value="false"/>
+      </cluster_property_set>
+    </crm_config>
+    <nodes>
+      <node id="1" uname="node1"/>
+    </nodes>
+    <resources>
+      <primitive id="res1" class="ocf" provider="heartbeat" type="Dummy">
+        <instance_attributes id="res1-instance_attributes">
+          <nvpair id="res1-instance_attributes-fake" name="fake" value="a"/>
+        </instance_attributes>
+      </primitive>
+    </resources>
+    <constraints>
+      <rsc_location id="res1_location" rsc="res1" node="node1" score="100"/>
+    </constraints>
+  </configuration>
+  <status/>
+</cib>
+"""
+
+
+def run_module(module, args):
+    """
+    Run the main function of a module with args, answering cibadmin --query with cib_data
+    and every other command with success.
+    Returns the result and the commands run, each as a list of arguments.
+    """
+    pacemaker_common.PCS_CACHE.clear()
+    del pacemaker_common.PCS_TIMINGS[:]
+    cmds = []
+
+    def run_command(self, cmd, **kwargs):
+        cmds.append(shlex.split(cmd) if not isinstance(cmd, list) else cmd)
+        return 0, cib_data if cmds[-1][0] == "cibadmin" else "", ""
+
+    stdout = io.StringIO()
+    with patch_module_args(args), mock.patch.object(basic.AnsibleModule, "run_command", run_command), mock.patch("sys.stdout", stdout):
+        try:
+            module.main()
+        except SystemExit:
+            pass
+    return json.loads(stdout.getvalue()), cmds
+
+
+class TestPacemakerModules(unittest.TestCase):
+
+    def test_property_absent(self):
+        result, cmds = run_module(pacemaker_property, {"property_name": "stonith-enabled", "state": "absent"})
+        self.assertTrue(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"], ["pcs", "property", "unset", "stonith-enabled"]])
+        result, cmds = run_module(pacemaker_property, {"property_name": "maintenance-mode", "state": "absent"})
+        self.assertFalse(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"]])
+
+    def test_resource_present(self):
+        result, cmds = run_module(pacemaker_resource, {"resource_name": "res2", "resource_type": "ocf:heartbeat:Dummy",
+                                                       "resource_config": {"fake": "a b"}, "state": "present"})
+        self.assertTrue(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"], ["pcs", "resource", "create", "res2", "ocf:heartbeat:Dummy", "fake=a b"]])
+        result, cmds = run_module(pacemaker_resource, {"resource_name": "res1", "resource_type": "ocf:heartbeat:Dummy",
+                                                       "resource_config": {"fake": "a"}, "state": "present"})
+        self.assertFalse(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"]])
+        result, cmds = run_module(pacemaker_resource, {"resource_name": "res1", "resource_type": "ocf:heartbeat:Dummy",
+                                                       "resource_config": {"fake": "b"}, "resource_meta": {"target-role": "Stopped"},
+                                                       "state": "present"})
+        self.assertTrue(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"], ["pcs", "resource", "update", "res1", "fake=b", "meta", "target-role=Stopped"]])
+        result, cmds = run_module(pacemaker_resource, {"resources": [{"name": "res1", "type": "ocf:heartbeat:Dummy", "config": {"fake": "a"}},
+                                                                     {"name": "res2", "type": "ocf:heartbeat:Dummy", "config": {"fake": "a"}}]})
+        self.assertEqual([r['changed'] for r in result['resources']], [False, True])
+        self.assertEqual(cmds, [["cibadmin", "--query"], ["pcs", "resource", "create", "res2", "ocf:heartbeat:Dummy", "fake=a"]])
+
+    def test_constraint_present(self):
+        result, cmds = run_module(pacemaker_constraint, {"name": "res1", "type": "location", "prefers": [{"node1": 100}]})
+        self.assertFalse(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"]])
+        result, cmds = run_module(pacemaker_constraint, {"name": "res1", "type": "colocation", "resources": ["res1", "res2"]})
+        self.assertTrue(result['changed'])
+        self.assertEqual(cmds, [["cibadmin", "--query"], ["pcs", "constraint", "colocation", "add", "res1", "with", "res2", "id=res1_colocation"]])
+        result, cmds = run_module(pacemaker_constraint, {"constraints": [{"name": "res1", "type": "location", "prefers": [{"node1": 100}]},
+                                                                         {"name": "res2", "type": "location", "avoids": [{"node1": 50}]}]})
+        self.assertEqual([c['changed'] for c in result['constraints']], [False, True])
+        self.assertEqual(cmds, [["cibadmin", "--query"], ["pcs", "constraint", "location", "add", "res2_location", "res2", "node1", "-50"]])
+
+    def test_constraint_duplicate_ids(self):
+        result, cmds = run_module(pacemaker_constraint, {"constraints": [{"name": "res1", "type": "location", "prefers": [{"node1": 100}]},
+                                                                         {"name": "res2", "type": "location", "avoids": [{"node1": 50}]},
+                                                                         {"name": "res1", "type": "location", "avoids": [{"node1": 50}]}]})
+        self.assertTrue(result['failed'])
+        self.assertIn("more than one constraint with the id res1_location", result['msg'])
+        self.assertEqual(cmds, [])
+
+
+class TestPacemakerResource(unittest.TestCase):
+
+    def test_build_resource_create_cmd(self):
+        cmd = pacemaker_resource.build_resource_create_cmd("res1", "ocf:heartbeat:Dummy", {"fake": "a b", "state": "it's"}, "grp1",
+                                                           {"description": 'say "hi"'})
+        self.assertEqual(shlex.split(cmd), ["resource", "create", "res1", "ocf:heartbeat:Dummy", "fake=a b", "state=it's",
+                                            "meta", 'description=say "hi"', "--group", "grp1"])
+        cmd = pacemaker_resource.build_resource_create_cmd("res1", "ocf:heartbeat:Dummy", None, None)
+        self.assertEqual(cmd, "resource create res1 ocf:heartbeat:Dummy")
+
+    def test_build_resource_update_cmd(self):
+        config_diff = {"instance_attributes": {"fake": {"before": "a", "after": "a b"}},
+                       "meta_attributes": {"description": {"before": None, "after": "it's \"new\""}}}
+        cmd = pacemaker_resource.build_resource_update_cmd("res1", config_diff)
+        self.assertEqual(shlex.split(cmd), ["resource", "update", "res1", "fake=a b", "meta", "description=it's \"new\""])
+        cmd = pacemaker_resource.build_resource_update_cmd("res1", {"instance_attributes": {"fake": {"before": "a", "after": "b"}},
+                                                                    "meta_attributes": {}})
+        self.assertEqual(cmd, "resource update res1 fake=b")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,326 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import unittest
+import os
+import sys
+import json
+import socket
+import ssl
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+path = os.path.dirname(os.path.realpath(__file__))
+path = "{0}/../../plugins/module_utils".format(path)
+sys.path.append(path)
+import pacemaker_pcsd
+
+TOKEN = "bff36ce9-13f4-4589-943e-dfaea6c3d98c"
+
+tokens_data = {
+    "format_version": 3,
+    "data_version": 2,
+    "tokens": {
+        "amazonlinux1.pacemaker": TOKEN,
+        "amazonlinux2.pacemaker": "28287431-4879-47bd-96d3-6a07726820a2"
+    },
+    "ports": {
+        "amazonlinux1.pacemaker": 2224,
+        "amazonlinux2.pacemaker": 2225
+    }
+}
+
+known_hosts_data = {
+    "format_version": 1,
+    "data_version": 1,
+    "known_hosts": {
+        "node1": {
+            "dest_list": [{"addr": "192.168.0.1", "port": 2224}],
+            "token": TOKEN
+        },
+        "node2": {
+            "dest_list": [],
+            "token": "28287431-4879-47bd-96d3-6a07726820a2"
+        }
+    }
+}
+
+PASSWORD = "ChangeToVaultP@55w0rd_&="
+
+# A self signed certificate for localhost and 127.0.0.1, as pcsd uses by default
+fixtures = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+PCSD_CERT = os.path.join(fixtures, "pcsd.crt")
+PCSD_KEY = os.path.join(fixtures, "pcsd.key")
+
+cib_xml = '<cib epoch="1" num_updates="0" admin_epoch="0"><configuration/></cib>'
+
+
+class FakePcsdHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address[1]))
+        if self.headers.get("Cookie") != "token={0}".format(TOKEN):
+            status, body = 401, '{"notauthorized":"true"}'
+        elif self.path == "/remote/check_auth":
+            status, body = 200, '{"success":true}'
+        elif self.path == "/remote/get_cib":
+            status, body = 200, cib_xml
+        else:
+            status, body = 404, "not found"
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.requests.append((self.path, self.client_address[1]))
+        time.sleep(self.server.delay)
+        length = int(self.headers.get("Content-Length", 0))
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        body = ""
+        if self.path == "/remote/auth" and params.get("username") == ["hacluster"] and params.get("password") == [PASSWORD]:
+            body = TOKEN
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeModule(object):
+
+    def __init__(self, params):
+        self.params = params
+        self.warnings = []
+
+    def warn(self, msg):
+        self.warnings.append(msg)
+
+
+class TestPacemakerPcsd(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FakePcsdHandler)
+        self.server.requests = []
+        self.server.delay = 0
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_load_pcsd_tokens(self):
+        tokens = pacemaker_pcsd.load_pcsd_tokens(tokens_data)
+        self.assertEqual(tokens["amazonlinux1.pacemaker"], {"token": TOKEN, "addr": "amazonlinux1.pacemaker", "port": 2224})
+        self.assertEqual(tokens["amazonlinux2.pacemaker"]["port"], 2225)
+
+    def test_load_pcsd_known_hosts(self):
+        tokens = pacemaker_pcsd.load_pcsd_tokens(known_hosts_data)
+        self.assertEqual(tokens["node1"], {"token": TOKEN, "addr": "192.168.0.1", "port": 2224})
+        self.assertEqual(tokens["node2"]["addr"], "node2")
+        self.assertEqual(tokens["node2"]["port"], 2224)
+
+    def test_read_pcsd_tokens(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tokens_file = os.path.join(tmpdir, "tokens")
+            self.assertEqual(pacemaker_pcsd.read_pcsd_tokens(tokens_file), {})
+            with open(tokens_file, 'w') as f:
+                json.dump(tokens_data, f)
+            self.assertIn("amazonlinux1.pacemaker", pacemaker_pcsd.read_pcsd_tokens(tokens_file))
+            with open(os.path.join(tmpdir, "known-hosts"), 'w') as f:
+                json.dump(known_hosts_data, f)
+            self.assertIn("node1", pacemaker_pcsd.read_pcsd_tokens(tokens_file))
+
+    def test_client_get_cib(self):
+        client = pacemaker_pcsd.PcsdClient("127.0.0.1", TOKEN, self.port, timeout=5, use_ssl=False)
+        self.assertTrue(client.check_auth())
+        self.assertEqual(client.get_cib(), cib_xml)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_client_timings(self):
+        timings = []
+        client = pacemaker_pcsd.PcsdClient("127.0.0.1", TOKEN, self.port, timeout=5, use_ssl=False, timings=timings)
+        client.get_cib()
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(timings[0]['cmd'], "GET http://127.0.0.1:{0}/remote/get_cib".format(self.port))
+        self.assertEqual((timings[0]['rc'], timings[0]['stdout_bytes']), (200, len(cib_xml)))
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(pacemaker_pcsd.PcsdError):
+            client.get_cib()
+        self.assertIsNone(timings[1]['rc'])  # pcsd not reached
+        self.assertGreater(timings[1]['stderr_bytes'], 0)
+
+    def test_client_bad_token(self):
+        client = pacemaker_pcsd.PcsdClient("127.0.0.1", "bad", self.port, timeout=5, use_ssl=False)
+        self.assertFalse(client.check_auth())
+        with self.assertRaises(pacemaker_pcsd.PcsdError):
+            client.get_cib()
+
+    def test_client_validate_certs(self):
+        server = HTTPServer(("127.0.0.1", 0), FakePcsdHandler)
+        server.requests = []
+        server.delay = 0
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(PCSD_CERT, PCSD_KEY)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        port = server.server_address[1]
+        try:
+            # The token is not sent to a pcsd whose certificate can't be verified
+            client = pacemaker_pcsd.PcsdClient("127.0.0.1", TOKEN, port, timeout=5)
+            with self.assertRaises(pacemaker_pcsd.PcsdError):
+                client.get_cib()
+            self.assertEqual(server.requests, [])
+            client = pacemaker_pcsd.PcsdClient("127.0.0.1", TOKEN, port, timeout=5, ca_path=PCSD_CERT)
+            self.assertEqual(client.get_cib(), cib_xml)
+            client = pacemaker_pcsd.PcsdClient("127.0.0.1", TOKEN, port, timeout=5, validate_certs=False)
+            self.assertEqual(client.get_cib(), cib_xml)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_client_connection_refused(self):
+        self.server.shutdown()
+        self.server.server_close()
+        client = pacemaker_pcsd.PcsdClient("127.0.0.1", TOKEN, self.port, timeout=5, use_ssl=False)
+        with self.assertRaises(pacemaker_pcsd.PcsdError):
+            client.get_cib()
+
+    def test_pcsd_get_cib_fallback(self):
+        module = FakeModule({"backend": "pcs", "file": None, "request_timeout": 5})
+        self.assertIsNone(pacemaker_pcsd.pcsd_get_cib(module, "/nonexistent/tokens"))
+        module = FakeModule({"backend": "pcsd", "file": "/tmp/shadow.xml", "request_timeout": 5})
+        self.assertIsNone(pacemaker_pcsd.pcsd_get_cib(module, "/nonexistent/tokens"))
+        module = FakeModule({"backend": "pcsd", "file": None, "local": True, "request_timeout": 5})
+        self.assertIsNone(pacemaker_pcsd.pcsd_get_cib(module, "/nonexistent/tokens"))
+        self.assertEqual(module.warnings, [])
+        module = FakeModule({"backend": "pcsd", "file": None, "request_timeout": 5})
+        self.assertIsNone(pacemaker_pcsd.pcsd_get_cib(module, "/nonexistent/tokens"))
+        self.assertEqual(len(module.warnings), 1)
+
+    def test_pcsd_get_cib(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tokens_file = os.path.join(tmpdir, "tokens")
+            with open(os.path.join(tmpdir, "known-hosts"), 'w') as f:
+                json.dump({"known_hosts": {socket.gethostname(): {
+                    "dest_list": [{"addr": "127.0.0.1", "port": self.port}],
+                    "token": TOKEN}}}, f)
+            cert_file = os.path.join(tmpdir, "pcsd.crt")
+            clients = []
+
+            class HttpPcsdClient(pacemaker_pcsd.PcsdClient):
+
+                def __init__(self, *args, **kwargs):
+                    super(HttpPcsdClient, self).__init__(*args, use_ssl=False, **kwargs)
+                    clients.append(self)
+
+            module = FakeModule({"backend": "pcsd", "file": None, "request_timeout": 5})
+            with mock.patch.object(pacemaker_pcsd, "PcsdClient", HttpPcsdClient):
+                self.assertEqual(pacemaker_pcsd.pcsd_get_cib(module, tokens_file, cert_file=cert_file), cib_xml)
+                self.assertEqual(module.warnings, [])
+                self.assertIsNone(clients[0].ca_path)
+                # The certificate pcsd created on the node is used by default, ca_path overrides it
+                with open(cert_file, 'w') as f:
+                    f.write("")
+                pacemaker_pcsd.pcsd_get_cib(module, tokens_file, cert_file=cert_file)
+                self.assertEqual(clients[1].ca_path, cert_file)
+                module = FakeModule({"backend": "pcsd", "file": None, "request_timeout": 5, "ca_path": "/etc/ca.crt"})
+                pacemaker_pcsd.pcsd_get_cib(module, tokens_file, cert_file=cert_file)
+                self.assertEqual(clients[2].ca_path, "/etc/ca.crt")
+            # The request is recorded with the commands when profiling, the reason of the fallback is a warning
+            timings = []
+            module = FakeModule({"backend": "pcsd", "file": None, "request_timeout": 5, "profile": True})
+            self.assertIsNone(pacemaker_pcsd.pcsd_get_cib(module, tokens_file, timings, cert_file=cert_file))  # over https
+            self.assertEqual(len(timings), 1)
+            self.assertIn("falling back to the command line", module.warnings[0])
+
+    def test_client_auth(self):
+        client = pacemaker_pcsd.PcsdClient("127.0.0.1", None, self.port, timeout=5, use_ssl=False)
+        self.assertEqual(client.auth("hacluster", PASSWORD), TOKEN)
+        self.assertEqual(client.get_cib(), cib_xml)
+        client = pacemaker_pcsd.PcsdClient("127.0.0.1", None, self.port, timeout=5, use_ssl=False)
+        with self.assertRaises(pacemaker_pcsd.PcsdError):
+            client.auth("hacluster", "wrong")
+
+    def test_auth_nodes(self):
+        results = pacemaker_pcsd.auth_nodes(["127.0.0.1", "localhost"], "hacluster", PASSWORD,
+                                            self.port, timeout=5, use_ssl=False)
+        self.assertEqual(sorted(results.keys()), ["127.0.0.1", "localhost"])
+        for result in results.values():
+            self.assertEqual(result["token"], TOKEN)
+            self.assertEqual(result["port"], self.port)
+            self.assertIsNone(result["error"])
+            self.assertGreaterEqual(result["latency"], 0)
+        self.assertEqual(pacemaker_pcsd.auth_nodes([], "hacluster", PASSWORD), {})
+
+    def test_auth_nodes_timeout(self):
+        slow = HTTPServer(("127.0.0.1", 0), FakePcsdHandler)
+        slow.requests = []
+        slow.delay = 2
+        thread = threading.Thread(target=slow.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            start = time.time()
+            # the slow node times out without holding up the other nodes
+            results = pacemaker_pcsd.auth_nodes(["127.0.0.1", "localhost"], "hacluster", PASSWORD,
+                                                slow.server_address[1], timeout=0.5, use_ssl=False)
+            self.assertLess(time.time() - start, 1.5)
+            for result in results.values():
+                self.assertIsNone(result["token"])
+                self.assertIn("failed", result["error"])
+            results = pacemaker_pcsd.auth_nodes(["127.0.0.1"], "hacluster", "wrong", self.port, timeout=5, use_ssl=False)
+            self.assertIn("rejected", results["127.0.0.1"]["error"])
+        finally:
+            slow.shutdown()
+            slow.server_close()
+
+    def test_run_on_nodes(self):
+        running = []
+        peak = []
+
+        def func(node):
+            running.append(node)
+            peak.append(len(running))
+            time.sleep(0.05)
+            running.remove(node)
+            if node == "bad":
+                raise ValueError(node)
+            return node.upper()
+
+        nodes = ["node{0}".format(i) for i in range(8)]
+        self.assertEqual(pacemaker_pcsd.run_on_nodes(func, nodes, forks=3), dict((n, n.upper()) for n in nodes))
+        self.assertLessEqual(max(peak), 3)
+        self.assertGreater(max(peak), 1)
+        self.assertEqual(pacemaker_pcsd.run_on_nodes(func, []), {})
+        with self.assertRaises(ValueError):
+            pacemaker_pcsd.run_on_nodes(func, ["node1", "bad", "node2"])
+
+    def test_check_tokens(self):
+        tokens = {
+            "127.0.0.1": {"token": TOKEN, "port": self.port},
+            "localhost": {"token": "stale", "port": self.port},
+        }
+        results = pacemaker_pcsd.check_tokens(tokens, timeout=5, use_ssl=False)
+        self.assertTrue(results["127.0.0.1"]["valid"])
+        self.assertFalse(results["localhost"]["valid"])
+        self.assertIsNone(results["localhost"]["error"])
+        self.server.shutdown()
+        self.server.server_close()
+        results = pacemaker_pcsd.check_tokens(tokens, timeout=5, use_ssl=False)
+        self.assertIsNone(results["127.0.0.1"]["valid"])
+        self.assertIsNotNone(results["127.0.0.1"]["error"])